@@ -0,0 +1,5 @@
+from src.cli import EntryPoint
+
+
+if __name__ == '__main__':
+    EntryPoint().main()
@@ -0,0 +1,265 @@
+"""
+Local stand-in of an analysis server: an SSH server with SFTP and exec, built on paramiko
+
+The remote root /home/{user}/RNAapp is mapped into a local temporary home, which has
+    - a .profile which activates nothing
+    - a stub rna_seq_analysis-bench/ which prints a few lines of progress and exits
+    - bin/screen and bin/python stand-ins, so neither GNU screen nor a conda env is needed
+
+Paths in commands, SFTP requests and helper requests are translated between /home/{user} and the local home
+
+Run from the repo root, it prints the port once listening:
+    python -m benchmark.standin --user me --home /tmp/standin
+"""
+import os
+import sys
+import stat
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+import paramiko
+
+
+PASSWORD = 'bench'
+PROGRAM = 'rna_seq_analysis-bench'
+STUB_PROGRAM = '''\
+import sys
+import time
+print('Stub rna_seq_analysis:', ' '.join(sys.argv[1:]), flush=True)
+for step in ['Normalization', 'Differential analysis', 'GSEA']:
+    time.sleep(0.1)
+    print(step, flush=True)
+print('Done', flush=True)
+'''
+STUB_SCREEN = '''\
+#!/bin/sh
+# stand-in of GNU screen: "-ls" lists no session, "-dm -S name cmd..." runs cmd detached
+if [ "$1" = "-ls" ]; then
+    exit 1
+fi
+shift 3
+nohup "$@" > /dev/null 2>&1 &
+'''
+STUB_PYTHON = f'''\
+#!/bin/sh
+exec "{sys.executable}" "$@"
+'''
+
+
+def set_up_home(home: str):
+    os.makedirs(f'{home}/RNAapp/{PROGRAM}', exist_ok=True)
+    os.makedirs(f'{home}/bin', exist_ok=True)
+    files = {
+        f'{home}/RNAapp/.profile': 'true\n',
+        f'{home}/RNAapp/{PROGRAM}/__main__.py': STUB_PROGRAM,
+        f'{home}/bin/screen': STUB_SCREEN,
+        f'{home}/bin/python': STUB_PYTHON,
+        f'{home}/bin/python3': STUB_PYTHON,
+    }
+    for path, text in files.items():
+        with open(path, 'w') as fh:
+            fh.write(text)
+    for name in ['screen', 'python', 'python3']:
+        os.chmod(f'{home}/bin/{name}', 0o755)
+
+
+class PathMap:
+
+    remote: str
+    local: str
+
+    def __init__(self, user: str, home: str):
+        self.remote = f'/home/{user}'
+        self.local = os.path.abspath(home)
+
+    def to_local(self, text: str) -> str:
+        return text.replace(self.remote, self.local)
+
+    def to_remote(self, text: str) -> str:
+        return text.replace(self.local, self.remote)
+
+
+class Server(paramiko.ServerInterface):
+
+    path_map: PathMap
+
+    def __init__(self, path_map: PathMap):
+        self.path_map = path_map
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if password == PASSWORD else paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def exec(self, channel: paramiko.Channel, command: str):
+        home = self.path_map.local
+        env = dict(os.environ, HOME=home, PATH=f'{home}/bin:{os.environ["PATH"]}')
+        proc = subprocess.Popen(
+            ['bash', '-c', self.path_map.to_local(command)],
+            cwd=home, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        threading.Thread(target=self.forward_stdin, args=(channel, proc), daemon=True).start()
+        for line in proc.stdout:
+            channel.sendall(self.path_map.to_remote(line.decode()).encode())
+        channel.sendall_stderr(proc.stderr.read())
+        channel.send_exit_status(proc.wait())
+        channel.close()
+
+    def forward_stdin(self, channel: paramiko.Channel, proc: subprocess.Popen):
+        """
+        Helper requests are small JSON, so read whole to translate the paths in it
+        A command which does not read stdin never waits for it
+        """
+        stdin = b''
+        while True:
+            data = channel.recv(65536)
+            if len(data) == 0:
+                break
+            stdin += data
+        try:
+            proc.stdin.write(self.path_map.to_local(stdin.decode()).encode())
+            proc.stdin.close()
+        except OSError:
+            pass  # exited already
+
+
+class SFTPHandle(paramiko.SFTPHandle):
+
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return paramiko.SFTP_OK
+
+
+class SFTPServer(paramiko.SFTPServerInterface):
+
+    path_map: PathMap
+
+    def __init__(self, server: Server, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.path_map = server.path_map
+
+    def local(self, path: str) -> str:
+        return self.path_map.to_local(self.canonicalize(path))
+
+    def canonicalize(self, path: str) -> str:
+        if not path.startswith('/'):
+            path = f'{self.path_map.remote}/{path}'
+        return os.path.normpath(path)
+
+    def list_folder(self, path):
+        try:
+            local = self.local(path)
+            return [
+                paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(local, name)), filename=name)
+                for name in os.listdir(local)
+            ]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self.local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.lstat(self.local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        local = self.local(path)
+        try:
+            fd = os.open(local, flags, 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        f = os.fdopen(fd, mode)
+        handle = SFTPHandle(flags)
+        handle.filename = local
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        return self.__call(os.remove, self.local(path))
+
+    def rename(self, oldpath, newpath):
+        return self.__call(os.rename, self.local(oldpath), self.local(newpath))
+
+    def posix_rename(self, oldpath, newpath):
+        return self.__call(os.replace, self.local(oldpath), self.local(newpath))
+
+    def mkdir(self, path, attr):
+        return self.__call(os.mkdir, self.local(path))
+
+    def rmdir(self, path):
+        return self.__call(os.rmdir, self.local(path))
+
+    def chattr(self, path, attr):
+        if attr.st_mode is not None:
+            return self.__call(os.chmod, self.local(path), stat.S_IMODE(attr.st_mode))
+        return paramiko.SFTP_OK
+
+    def __call(self, fn, *args):
+        try:
+            fn(*args)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+def serve(user: str, home: str, port: int = 0):
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)  # clients hanging up are not errors here
+    set_up_home(home)
+    path_map = PathMap(user=user, home=home)
+    host_key = paramiko.RSAKey.generate(2048)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', port))
+    sock.listen(16)
+    print(sock.getsockname()[1], flush=True)
+
+    while True:
+        client, _ = sock.accept()
+        transport = paramiko.Transport(client)
+        transport.add_server_key(host_key)
+        transport.set_subsystem_handler('sftp', paramiko.SFTPServer, SFTPServer)
+        transport.start_server(server=Server(path_map=path_map))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local SSH/SFTP stand-in of an analysis server')
+    parser.add_argument('--user', required=True, help='remote user, whose /home/{user} is mapped to --home')
+    parser.add_argument('--home', required=True, help='local directory standing in for the home of the user')
+    parser.add_argument('--port', type=int, default=0, help='default: any free port')
+    args = parser.parse_args()
+    serve(user=args.user, home=args.home, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
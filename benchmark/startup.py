@@ -0,0 +1,69 @@
+"""
+Cold-start time of the GUI, from process launch to the first paint of the main window
+
+Run from the repo root:
+    python -m benchmark.startup --runs 5
+    python -m benchmark.startup --exe dist/RNAapp/RNAapp.exe --max-seconds 3
+
+Exits with 1 if the median time to first paint exceeds --max-seconds, so it can guard against regressions
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, Any, List
+from src import STARTUP_TIMING_ENV
+
+
+def launch(cmd: List[str], timeout: float) -> Dict[str, Any]:
+    env = dict(os.environ, **{STARTUP_TIMING_ENV: '1'})
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env, universal_newlines=True)
+    try:
+        for line in proc.stdout:
+            if line.startswith('{'):
+                timing = json.loads(line)
+                timing['wall_seconds'] = round(time.perf_counter() - start, 4)
+                return timing
+        raise RuntimeError(f'{cmd} exited without reporting its startup timing')
+    finally:
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the time to first paint of the GUI')
+    parser.add_argument('--exe', default='', help='frozen executable to launch (default: python RNAapp.py)')
+    parser.add_argument('--runs', type=int, default=5, help='number of launches (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=60., help='seconds per launch (default: %(default)s)')
+    parser.add_argument('--max-seconds', type=float, default=0., help='fail if the median exceeds it, 0 = no limit')
+    args = parser.parse_args()
+
+    cmd = [args.exe] if args.exe else [sys.executable, 'RNAapp.py']
+
+    timings = []
+    for i in range(args.runs):
+        t = launch(cmd=cmd, timeout=args.timeout)
+        timings.append(t)
+        print(
+            f'run {i + 1}: first paint {t["wall_seconds"]:.2f} s '
+            f'(imports {t["import_seconds"]:.2f} s, SSH stack loaded: {t["ssh_stack_loaded"]})', flush=True)
+
+    median = statistics.median(t['wall_seconds'] for t in timings)
+    print(f'median time to first paint: {median:.2f} s', flush=True)
+
+    if any(t['ssh_stack_loaded'] for t in timings):
+        print('Warning: fabric/paramiko was imported before the first paint', flush=True)
+
+    if 0 < args.max_seconds < median:
+        print(f'Regression: {median:.2f} s > {args.max_seconds:.2f} s', flush=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+End-to-end benchmark of job submission against the local stand-in server (benchmark/standin.py)
+
+For each size of synthetic count table, a fresh client process runs the submission workflow
+which ActionSubmit runs in its worker thread, and reports per-phase latency, upload throughput and peak memory.
+Each client has its own temporary HOME, so the hash cache and job registry of the user are untouched.
+
+Run from the repo root (needs paramiko and fabric):
+    python -m benchmark.submit_pipeline --sizes 10,100,1000
+    python -m benchmark.submit_pipeline --sizes 10,100,1000,5000 --save-baseline
+
+Exits with 1 if a phase is slower than the stored baseline by more than --tolerance
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import getpass
+import argparse
+import tempfile
+import subprocess
+from os.path import dirname, abspath, exists
+from typing import Dict, Any, List
+
+
+BASELINE_FILE = f'{dirname(abspath(__file__))}/baselines/submit_pipeline.json'
+SAMPLES = 12
+GENE_INFO_ROWS = 60000
+MIN_SECONDS = 0.05  # phases faster than this are too noisy to compare
+
+
+def write_tables(dir_: str, mb: int) -> Dict[str, str]:
+    """
+    A count table of about mb MB, with matching sample and gene info tables, which pass the preflight
+    """
+    paths = {
+        'count-table': f'{dir_}/count-table.csv',
+        'sample-info-table': f'{dir_}/sample-info-table.csv',
+        'gene-info-table': f'{dir_}/gene-info-table.csv',
+    }
+    samples = [f'S{i + 1}' for i in range(SAMPLES)]
+    with open(paths['sample-info-table'], 'w') as fh:
+        fh.write(',group\n')
+        fh.writelines(f'{s},{"normal" if i % 2 == 0 else "tumor"}\n' for i, s in enumerate(samples))
+
+    target = mb * 10**6
+    written, i, rows = 0, 0, []
+    with open(paths['count-table'], 'w') as fh:
+        fh.write(',' + ','.join(samples) + '\n')
+        while written < target:
+            row = f'GENE{i},' + ','.join(str((i * 7 + j * 13) % 5000) for j in range(SAMPLES)) + '\n'
+            rows.append(row)
+            written += len(row)
+            i += 1
+            if len(rows) == 10000:  # never the whole table in memory
+                fh.writelines(rows)
+                rows = []
+        fh.writelines(rows)
+
+    with open(paths['gene-info-table'], 'w') as fh:
+        fh.write(',gene_name,gene_length\n')
+        fh.writelines(f'GENE{g},G{g},{1000 + g % 3000}\n' for g in range(min(i, GENE_INFO_ROWS)))
+    return paths
+
+
+def run_one(port: int, user: str, tables_dir: str, outdir: str) -> Dict[str, Any]:
+    """
+    In the client process: submits one job, whose phases are timed by the TimingLog of the app
+    """
+    from src.pool import POOL
+    from src.submit import SubmitJob
+    from src.reporter import Reporter
+    from src.timing import TimingLog
+    from src.parameters import split_parameters
+    from benchmark.standin import PASSWORD, PROGRAM
+
+    reporter = Reporter()
+    reporter.timing = TimingLog(action='benchmark')
+
+    ssh_key_values, rna_key_values = split_parameters({
+        'User': user,
+        'Host': '127.0.0.1',
+        'Port': str(port),
+        'RNA-Seq Analysis': PROGRAM,
+        'outdir': outdir,
+        'control-group-name': 'normal',
+        'experimental-group-name': 'tumor',
+    })
+    job = SubmitJob(
+        ssh_key_values=ssh_key_values,
+        ssh_password=PASSWORD,
+        rna_key_values=rna_key_values,
+        count_table_local_path=f'{tables_dir}/count-table.csv',
+        sample_info_table_local_path=f'{tables_dir}/sample-info-table.csv',
+        gene_info_table_local_path=f'{tables_dir}/gene-info-table.csv',
+        gene_sets_gmt_local_path='',
+        reporter=reporter)
+
+    start = time.perf_counter()
+    job.main()
+    total = time.perf_counter() - start
+    POOL.close_all()
+
+    timings = {}
+    for span in reporter.timing.spans:
+        if span['kind'] in ['connect', 'phase']:
+            timings[span['span']] = timings.get(span['span'], 0.) + span['seconds']
+    input_bytes = sum(os.path.getsize(f'{tables_dir}/{n}') for n in os.listdir(tables_dir))
+    return {
+        'phases': {k: round(v, 4) for k, v in timings.items()},
+        'total': round(total, 4),
+        'input_mb': round(input_bytes / 1e6, 1),
+        'upload_mb_per_sec': round(input_bytes / 1e6 / max(timings['upload_inputs'], 1e-9), 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def peak_rss_mb() -> float:
+    import resource  # unix only
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1e6 if sys.platform == 'darwin' else kb / 1e3  # bytes on macOS, KB on Linux
+
+
+def run_client(port: int, user: str, tables_dir: str, outdir: str, home: str) -> Dict[str, Any]:
+    cmd = [
+        sys.executable, '-m', 'benchmark.submit_pipeline', '--client',
+        '--port', str(port), '--tables', tables_dir, '--outdir', outdir,
+    ]
+    out = subprocess.run(
+        cmd, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, check=True, universal_newlines=True,
+        env=dict(os.environ, HOME=home, USER=user)).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get(size)
+        if base is None:
+            continue
+        for phase, seconds in result['phases'].items():
+            b = base['phases'].get(phase)
+            if b is not None and seconds > MIN_SECONDS and seconds > b * (1 + tolerance):
+                regressions.append(f'{size} MB {phase}: {seconds:.2f} s vs. baseline {b:.2f} s')
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(
+                f'{size} MB peak memory: {result["peak_rss_mb"]:.0f} MB vs. baseline {base["peak_rss_mb"]:.0f} MB')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of job submission against a local stand-in')
+    parser.add_argument('--sizes', default='10,100,1000', help='count table sizes in MB (default: %(default)s)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help=f'write the results to {BASELINE_FILE}')
+    parser.add_argument('--client', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--tables', help=argparse.SUPPRESS)
+    parser.add_argument('--outdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    user = getpass.getuser()
+    if args.client:
+        print(json.dumps(run_one(port=args.port, user=user, tables_dir=args.tables, outdir=args.outdir)), flush=True)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='rnaapp_bench_')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmark.standin', '--user', user, '--home', f'{workdir}/server'],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        port = int(server.stdout.readline())
+        results = {}
+        for mb in [int(s) for s in args.sizes.split(',')]:
+            tables_dir = f'{workdir}/tables_{mb}'
+            os.makedirs(tables_dir)
+            write_tables(dir_=tables_dir, mb=mb)
+            r = run_client(
+                port=port, user=user, tables_dir=tables_dir, outdir=f'bench_{mb}', home=f'{workdir}/client_{mb}')
+            results[str(mb)] = r
+            phases = ', '.join(f'{k} {v:.2f} s' for k, v in r['phases'].items())
+            print(
+                f'{r["input_mb"]:,.0f} MB: total {r["total"]:.2f} s, upload {r["upload_mb_per_sec"]:.1f} MB/s, '
+                f'peak memory {r["peak_rss_mb"]:.0f} MB\n    {phases}', flush=True)
+            shutil.rmtree(tables_dir)
+    finally:
+        server.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save_baseline:
+        os.makedirs(dirname(BASELINE_FILE), exist_ok=True)
+        with open(BASELINE_FILE, 'w') as fh:
+            json.dump(results, fh, indent=2)
+        print(f'Baseline saved to {BASELINE_FILE}', flush=True)
+        return
+
+    if exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as fh:
+            regressions = compare(results=results, baseline=json.load(fh), tolerance=args.tolerance)
+        for r in regressions:
+            print(f'Regression: {r}', flush=True)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compares the serial SFTP put, which the submit path used to do, with the ParallelUploader
+
+Run from the repo root:
+    python -m benchmark.upload_streams --host 1.2.3.4 --user me --file count-table.csv
+"""
+import time
+import argparse
+import getpass
+from os.path import getsize, basename
+from fabric import Connection
+from src.transfer import ParallelUploader
+
+
+def serial_put(con: Connection, file: str, remote_dir: str) -> float:
+    start = time.time()
+    con.sftp().put(localpath=file, remotepath=f'{remote_dir}/{basename(file)}')
+    return time.time() - start
+
+
+def parallel_put(con: Connection, file: str, remote_dir: str, streams: int, chunk_size: int) -> float:
+    start = time.time()
+    ParallelUploader(con=con, streams=streams, chunk_size=chunk_size).upload(
+        [(file, f'{remote_dir}/{basename(file)}')])
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of serial vs. multi-stream SFTP upload')
+    parser.add_argument('--host', required=True)
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--file', required=True, help='local file to upload')
+    parser.add_argument('--remote-dir', default='/tmp', help='absolute remote directory (default: %(default)s)')
+    parser.add_argument('--streams', default='1,2,4,8', help='comma-separated stream counts (default: %(default)s)')
+    parser.add_argument('--chunk-mb', type=int, default=64, help='chunk size in MB (default: %(default)s)')
+    args = parser.parse_args()
+
+    con = Connection(
+        host=args.host,
+        user=args.user,
+        port=args.port,
+        connect_kwargs={'password': getpass.getpass()})
+
+    mb = getsize(args.file) / 1e6
+    seconds = serial_put(con=con, file=args.file, remote_dir=args.remote_dir)
+    print(f'serial put: {seconds:.2f} s, {mb / seconds:.1f} MB/s', flush=True)
+
+    for streams in [int(n) for n in args.streams.split(',')]:
+        seconds = parallel_put(
+            con=con, file=args.file, remote_dir=args.remote_dir, streams=streams, chunk_size=args.chunk_mb * 2**20)
+        print(f'{streams} streams: {seconds:.2f} s, {mb / seconds:.1f} MB/s', flush=True)
+
+    con.sftp().remove(f'{args.remote_dir}/{basename(args.file)}')
+    con.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,7 @@
+import os
 import sys
-from PyQt5.QtWidgets import QApplication
-from .io import IO
-from .view import View
-from .controller import Controller
+import json
+import time
 
 
 VERSION = 'v1.3.0-beta'
@@ -11,28 +10,51 @@ RNAapp {VERSION}
 College of Dentistry, National Yang Ming Chiao Tung University (NYCU), Taiwan
 Yu-Cheng Lin, DDS, MS, PhD (ylin@nycu.edu.tw)
 '''
+STARTUP_TIMING_ENV = 'RNAAPP_STARTUP_TIMING'  # if set, print the startup timing as JSON and quit on the first paint
 
 
 class Main:
 
     APP_ID = f'NYCU.Dentistry.RNAapp.{VERSION}'
 
-    io: IO
-    view: View
-    controller: Controller
+    start: float
+    imported: float
 
     def main(self):
+        self.start = time.perf_counter()
+
+        # PyQt5 is only imported here, so that the headless CLI (src.cli) never loads it
+        from PyQt5.QtWidgets import QApplication
+        from .io import IO
+        from .view import View
+        from .controller import Controller
+        from .pool import POOL
+
+        self.imported = time.perf_counter()
         self.config_taskbar_icon()
 
         app = QApplication(sys.argv)
 
         self.io = IO()
         self.view = View()
+        if os.environ.get(STARTUP_TIMING_ENV):
+            self.view.on_first_paint = lambda: self.report_startup_timing(app=app)
         self.controller = Controller(io=self.io, view=self.view)
 
         print(STARTING_MESSAGE, flush=True)
 
-        sys.exit(app.exec_())
+        code = app.exec_()
+        self.controller.stop_watchers()
+        POOL.close_all()
+        sys.exit(code)
+
+    def report_startup_timing(self, app):
+        print(json.dumps({
+            'import_seconds': round(self.imported - self.start, 4),
+            'first_paint_seconds': round(time.perf_counter() - self.start, 4),
+            'ssh_stack_loaded': 'fabric' in sys.modules or 'paramiko' in sys.modules,
+        }), flush=True)
+        app.quit()
 
     def config_taskbar_icon(self):
         try:
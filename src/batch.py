@@ -0,0 +1,188 @@
+from typing import List, Dict, Union, Tuple, Optional
+from .reporter import Reporter
+from .submit import SubmitJob
+from .store import InputStore, HashCache
+from .schema import SchemaCache
+from .pool import POOL, sftp_of
+from .dispatcher import launch, parse_positions
+from .registry import JobRegistry
+from .hosts import choose_host
+from .reuse import find_previous_runs
+
+
+INPUT_KEYS = [  # optional columns of the parameter sheet, local paths overriding the selected input files
+    'count-table',
+    'sample-info-table',
+    'gene-info-table',
+    'gene-sets-gmt',
+]
+TRUE_VALUES = ['true', 'yes', '1']
+FALSE_VALUES = ['false', 'no', '0', '']
+
+
+def expand_rows(
+        base_rna_key_values: Dict[str, Union[str, bool]],
+        base_inputs: Dict[str, str],
+        rows: List[Dict[str, str]]) -> List[Tuple[Dict[str, Union[str, bool]], Dict[str, str]]]:
+    """
+    Each row of the parameter sheet overrides the parameters and inputs of the form
+    An empty cell keeps the value of the form, except for flags where it means False
+
+    Returns [(rna_key_values, inputs), ...], one per job
+    """
+    jobs = []
+    for i, row in enumerate(rows):
+        rna_key_values = dict(base_rna_key_values)
+        inputs = dict(base_inputs)
+
+        for key, val in row.items():
+            if key in INPUT_KEYS:
+                if val != '':
+                    inputs[key] = val
+            elif key not in base_rna_key_values:
+                raise ValueError(f'Unknown parameter "{key}" in the parameter sheet')
+            elif type(base_rna_key_values[key]) is bool:
+                rna_key_values[key] = parse_flag(key=key, val=val)
+            elif val != '':
+                rna_key_values[key] = val
+
+        if 'outdir' not in row or row['outdir'] == '':
+            rna_key_values['outdir'] = f'{base_rna_key_values["outdir"]}_{i + 1}'
+
+        jobs.append((rna_key_values, inputs))
+
+    outdirs = [rna_key_values['outdir'] for rna_key_values, _ in jobs]
+    duplicated = sorted({o for o in outdirs if outdirs.count(o) > 1})
+    if len(duplicated) > 0:
+        raise ValueError(f'Duplicated outdir in the parameter sheet: {", ".join(duplicated)}')
+
+    return jobs
+
+
+def parse_flag(key: str, val: str) -> bool:
+    v = val.lower()
+    if v in TRUE_VALUES:
+        return True
+    if v in FALSE_VALUES:
+        return False
+    raise ValueError(f'Invalid value "{val}" of the flag "{key}", should be one of {TRUE_VALUES + FALSE_VALUES}')
+
+
+class BatchSubmitJob:
+    """
+    Submits many jobs over one connection
+
+    Distinct input files are uploaded once to the input store, and linked into every outdir
+    in the same round trip which makes the outdirs, and all jobs are launched in one round trip,
+    so the cost grows with the number of distinct input files, not the number of jobs
+    The previous runs of all jobs are looked up in one round trip, and reusing them is asked once for the batch
+    """
+
+    jobs: List[SubmitJob]
+    reporter: Reporter
+
+    def __init__(self, jobs: List[SubmitJob], reporter: Optional[Reporter] = None):
+        assert len(jobs) > 0, 'No job in the batch'
+        self.jobs = jobs
+        self.reporter = Reporter() if reporter is None else reporter
+
+    def main(self) -> List[Dict[str, Union[str, int]]]:
+        timing = self.reporter.timing
+        with timing.span('preflight', jobs=len(self.jobs)):
+            hash_cache = HashCache()
+            for job in self.jobs:
+                job.check_outdir()
+                job.preflight()
+                job.set_fingerprint(hash_cache=hash_cache)  # recorded for reuse by later submissions
+
+        first = self.jobs[0]
+        with timing.span('choose_host'):
+            s = choose_host(ssh_key_values=first.ssh_key_values, password=first.ssh_password, reporter=self.reporter)
+        timing.tag(host=s['Host'])
+        for job in self.jobs:  # all on the same host, over one connection
+            job.ssh_key_values = s
+
+        with timing.span('find_previous_run', jobs=len(self.jobs)):
+            self.find_previous_runs()
+        reusable = [job for job in self.jobs if job.previous_outdir is not None]
+        if len(reusable) > 0 and self.reporter.ask(
+                f'{len(reusable)} of the {len(self.jobs)} jobs were already analyzed with the same inputs and parameters, '
+                f'e.g. in "{reusable[0].previous_outdir}"\n'
+                f'Reuse those results instead of running them again?'):
+            with timing.span('reuse_previous_run', jobs=len(reusable)):
+                for job in reusable:
+                    job.reuse_previous_run()
+            to_run = [job for job in self.jobs if job not in reusable]
+        else:
+            to_run = self.jobs
+
+        if len(to_run) > 0:
+            self.submit(jobs=to_run, ssh_key_values=s)
+
+        with timing.span('register'):
+            registry = JobRegistry()
+            for job in self.jobs:
+                job.register(registry=registry)
+
+        return [job.result() for job in self.jobs]
+
+    def find_previous_runs(self):
+        """
+        Of all jobs in one round trip
+        """
+        first = self.jobs[0]
+        s = first.ssh_key_values
+        with POOL.connection(
+                host=s['Host'], user=s['User'], port=int(s['Port']), password=first.ssh_password,
+                timing=self.reporter.timing) as con:
+            previous = find_previous_runs(
+                con=con,
+                remote_root=first.remote_root,
+                jobs=[(job.fingerprint, job.outdir()) for job in self.jobs],
+                timing=self.reporter.timing)
+        for job, outdir in zip(self.jobs, previous):
+            job.previous_outdir = outdir
+
+    def submit(self, jobs: List[SubmitJob], ssh_key_values: Dict[str, str]):
+        timing = self.reporter.timing
+        s = ssh_key_values
+        first = jobs[0]
+        with timing.span('check_capacity'):
+            schema_cache = SchemaCache()
+            for job in jobs:
+                job.check_capacity()
+                job.build_rna_cmd(schema_cache=schema_cache)
+        remote_root = first.remote_root
+
+        self.reporter.message(f'Connecting to {s["Host"]}')
+        with POOL.connection(
+                host=s['Host'], user=s['User'], port=int(s['Port']), password=first.ssh_password, timing=timing) as con:
+            local_remote_paths = []
+            for job in jobs:
+                local_remote_paths += job.local_remote_paths()
+            with timing.span('upload_inputs'):
+                InputStore(
+                    con=con,
+                    remote_root=remote_root,
+                    streams=int(s.get('Upload Streams', '4')),
+                    compression=s.get('Compression', 'auto'),
+                    reporter=self.reporter
+                ).put(local_remote_paths)
+            self.reporter.check_cancelled()
+
+            self.reporter.message(f'Launching {len(jobs)} jobs')
+            with timing.span('launch', jobs=len(jobs)):
+                with timing.span('write_command_txt', kind='command'):
+                    with sftp_of(con) as sftp:
+                        for job in jobs:  # before any command.txt is written
+                            job.check_library_refs(sftp=sftp)
+                        for job in jobs:
+                            job.write_command_txt(sftp=sftp)
+                with timing.span('enqueue', kind='command'):
+                    stdout = launch(
+                        con=con,
+                        remote_root=remote_root,
+                        enqueue_cmds=[cmd for job in jobs for cmd in [job.enqueue_cmd(), job.index_cmd()]])
+            positions = parse_positions(stdout)
+            for job in jobs:
+                job.queue_position = positions[job.job_name]
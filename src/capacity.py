@@ -0,0 +1,77 @@
+import math
+from os.path import getsize
+from typing import List
+from .hosts import HostProbe
+
+
+AUTO_THREADS = 'auto'
+MAX_AUTO_THREADS = 16  # DESeq2 and GSEA hardly speed up beyond
+MEMORY_FACTOR = 8  # peak memory per byte of tables, pandas and R each hold a few copies
+DISK_FACTOR = 4  # outdir size per byte of tables, the inputs plus normalized tables and figures
+BASE_BYTES = 2**30  # R, python and GSEA themselves
+
+
+def table_size(path: str) -> int:
+    """
+    Uncompressed size, which for a gzip file is in its last 4 bytes (modulo 4 GB)
+    """
+    size = getsize(path)
+    if not path.endswith('.gz') or size < 4:
+        return size
+    with open(path, 'rb') as fh:
+        fh.seek(-4, 2)
+        isize = int.from_bytes(fh.read(4), 'little')
+    while isize < size:  # wrapped around 4 GB, gzip never compresses tables below 1x
+        isize += 2**32
+    return isize
+
+
+class Capacity:
+    """
+    Sizes a job from the local input tables against the resources of the chosen host
+
+    The estimates are rough on purpose: free disk and total memory are hard limits,
+    available memory only warns, since running jobs free memory before a queued job starts
+    """
+
+    probe: HostProbe
+    input_bytes: int
+
+    def __init__(self, probe: HostProbe, local_paths: List[str]):
+        self.probe = probe
+        self.input_bytes = sum(table_size(p) for p in local_paths if p != '')
+
+    def auto_threads(self) -> int:
+        """
+        The idle CPUs of the host, so the job does not slow down the others
+        """
+        idle = math.floor(self.probe.free_cpus())
+        return max(1, min(idle, MAX_AUTO_THREADS))
+
+    def disk_needed(self) -> int:
+        return BASE_BYTES + DISK_FACTOR * self.input_bytes
+
+    def memory_needed(self) -> int:
+        return BASE_BYTES + MEMORY_FACTOR * self.input_bytes
+
+    def check(self) -> List[str]:
+        """
+        Raises if the job can never fit, returns warnings if it does not fit right now
+        """
+        if self.probe.disk_free < self.disk_needed():
+            raise OSError(
+                f'{self.probe.host} has {self.probe.disk_free / 1e9:.1f} GB free disk, '
+                f'but the job needs about {self.disk_needed() / 1e9:.1f} GB')
+
+        warnings = []
+        if self.probe.mem_total == 0:  # no /proc/meminfo
+            return warnings
+        if self.probe.mem_total < self.memory_needed():
+            raise OSError(
+                f'{self.probe.host} has {self.probe.mem_total / 1e9:.1f} GB memory in total, '
+                f'but the job needs about {self.memory_needed() / 1e9:.1f} GB')
+        if self.probe.mem_available < self.memory_needed():
+            warnings.append(
+                f'{self.probe.host} has {self.probe.mem_available / 1e9:.1f} GB memory available now, '
+                f'and the job needs about {self.memory_needed() / 1e9:.1f} GB')
+        return warnings
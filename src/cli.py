@@ -0,0 +1,240 @@
+"""
+Headless job submission, e.g. from cron or a LIMS, which never imports PyQt5
+
+    python RNAapp_cli.py -p parameters.txt -c count-table.csv -s sample-info-table.csv -g gene-info-table.csv
+
+The password is read from the environment variable RNAAPP_PASSWORD, or prompted on the terminal
+Progress goes to stderr, and the result is printed to stdout as JSON, e.g.
+    {"host": "10.0.0.1", "job_name": "outdir", "outdir": "/home/me/RNAapp/outdir", "queue_position": 0}
+"""
+import os
+import sys
+import json
+import getpass
+import argparse
+from typing import Dict, Any
+from . import VERSION
+from .io import IO
+from .reporter import Reporter
+from .timing import TimingLog
+from .submit import SubmitJob
+from .batch import BatchSubmitJob, expand_rows
+from .parameters import split_parameters
+from .schema import SchemaCache, form_of
+from .hosts import split_hosts
+
+
+PROG = 'python RNAapp_cli.py'
+DESCRIPTION = f'Submit an RNAapp-{VERSION} job without the GUI'
+PASSWORD_ENV = 'RNAAPP_PASSWORD'
+REQUIRED = [
+    {
+        'keys': ['-p', '--parameters'],
+        'properties': {
+            'type': str,
+            'required': True,
+            'help': 'parameter file saved by the app (.txt, .csv, .tsv, .tab)',
+        }
+    },
+    {
+        'keys': ['-c', '--count-table'],
+        'properties': {
+            'type': str,
+            'required': True,
+            'help': 'path to the count table',
+        }
+    },
+    {
+        'keys': ['-s', '--sample-info-table'],
+        'properties': {
+            'type': str,
+            'required': True,
+            'help': 'path to the sample info table',
+        }
+    },
+    {
+        'keys': ['-g', '--gene-info-table'],
+        'properties': {
+            'type': str,
+            'required': True,
+            'help': 'path to the gene info table',
+        }
+    },
+]
+OPTIONAL = [
+    {
+        'keys': ['-m', '--gene-sets-gmt'],
+        'properties': {
+            'type': str,
+            'required': False,
+            'default': '',
+            'help': 'path to the gene sets GMT file',
+        }
+    },
+    {
+        'keys': ['-b', '--parameter-sheet'],
+        'properties': {
+            'type': str,
+            'required': False,
+            'default': '',
+            'help': 'submit a batch, one job per row of the sheet (.csv, .tsv, .tab), which overrides --parameters',
+        }
+    },
+    {
+        'keys': ['-r', '--reuse-results'],
+        'properties': {
+            'action': 'store_true',
+            'help': 'if the same inputs were analyzed with the same parameters before, link those results\n'
+                    'into the outdir instead of running the job again',
+        }
+    },
+    {
+        'keys': ['-h', '--help'],
+        'properties': {
+            'action': 'help',
+            'help': 'show this help message',
+        }
+    },
+]
+
+
+class StderrReporter(Reporter):
+    """
+    stdout is reserved for the machine-readable result
+    Questions are answered by the command-line options, nobody is at the terminal of a cron job
+    """
+
+    reuse_results: bool
+
+    def __init__(self, reuse_results: bool = False):
+        self.reuse_results = reuse_results
+
+    def message(self, msg: str):
+        print(msg, file=sys.stderr, flush=True)
+
+    def ask(self, question: str) -> bool:
+        self.message(f'{question} {"yes" if self.reuse_results else "no"}')
+        return self.reuse_results
+
+
+class EntryPoint:
+
+    parser: argparse.ArgumentParser
+
+    def main(self):
+        self.set_parser()
+        self.add_required_arguments()
+        self.add_optional_arguments()
+        self.run()
+
+    def set_parser(self):
+        self.parser = argparse.ArgumentParser(
+            prog=PROG,
+            description=DESCRIPTION,
+            add_help=False,
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    def add_required_arguments(self):
+        group = self.parser.add_argument_group('required arguments')
+        for item in REQUIRED:
+            group.add_argument(*item['keys'], **item['properties'])
+
+    def add_optional_arguments(self):
+        group = self.parser.add_argument_group('optional arguments')
+        for item in OPTIONAL:
+            group.add_argument(*item['keys'], **item['properties'])
+
+    def run(self):
+        args = self.parser.parse_args()
+        result = SubmitFromCli(
+            parameters=args.parameters,
+            count_table=args.count_table,
+            sample_info_table=args.sample_info_table,
+            gene_info_table=args.gene_info_table,
+            gene_sets_gmt=args.gene_sets_gmt,
+            parameter_sheet=args.parameter_sheet,
+            reuse_results=args.reuse_results).main()
+        print(json.dumps(result), flush=True)
+
+
+class SubmitFromCli:
+
+    parameters: str
+    count_table: str
+    sample_info_table: str
+    gene_info_table: str
+    gene_sets_gmt: str
+    parameter_sheet: str
+    reuse_results: bool
+
+    io: IO
+    reporter: Reporter
+
+    def __init__(
+            self,
+            parameters: str,
+            count_table: str,
+            sample_info_table: str,
+            gene_info_table: str,
+            gene_sets_gmt: str,
+            parameter_sheet: str,
+            reuse_results: bool = False):
+
+        self.parameters = parameters
+        self.count_table = count_table
+        self.sample_info_table = sample_info_table
+        self.gene_info_table = gene_info_table
+        self.gene_sets_gmt = gene_sets_gmt
+        self.parameter_sheet = parameter_sheet
+        self.reuse_results = reuse_results
+        self.io = IO()
+        self.reporter = StderrReporter(reuse_results=reuse_results)
+        self.reporter.timing = TimingLog(action='cli')
+
+    def main(self) -> Any:
+        parameters = self.io.read(file=self.parameters)
+        ssh_key_values, rna_key_values = split_parameters(parameters)
+        options = SchemaCache().get(
+            host=split_hosts(ssh_key_values['Host'])[0], version=ssh_key_values['RNA-Seq Analysis'])
+        if options is not None:  # discovered by the GUI
+            ssh_key_values, rna_key_values = split_parameters(parameters, rna_key_to_values=form_of(options))
+        password = os.environ.get(PASSWORD_ENV)
+        if password is None:
+            password = getpass.getpass(f'Password of {ssh_key_values["User"]}@{ssh_key_values["Host"]}: ')
+
+        inputs = {
+            'count-table': self.count_table,
+            'sample-info-table': self.sample_info_table,
+            'gene-info-table': self.gene_info_table,
+            'gene-sets-gmt': self.gene_sets_gmt,
+        }
+
+        if self.parameter_sheet == '':
+            return self.submit_job(ssh_key_values, password, rna_key_values, inputs).main()
+
+        jobs = [
+            self.submit_job(ssh_key_values, password, job_rna_key_values, job_inputs)
+            for job_rna_key_values, job_inputs in expand_rows(
+                base_rna_key_values=rna_key_values,
+                base_inputs=inputs,
+                rows=self.io.read_table(file=self.parameter_sheet))
+        ]
+        return BatchSubmitJob(jobs=jobs, reporter=self.reporter).main()
+
+    def submit_job(
+            self,
+            ssh_key_values: Dict[str, str],
+            password: str,
+            rna_key_values: Dict[str, Any],
+            inputs: Dict[str, str]) -> SubmitJob:
+
+        return SubmitJob(
+            ssh_key_values=ssh_key_values,
+            ssh_password=password,
+            rna_key_values=rna_key_values,
+            count_table_local_path=inputs['count-table'],
+            sample_info_table_local_path=inputs['sample-info-table'],
+            gene_info_table_local_path=inputs['gene-info-table'],
+            gene_sets_gmt_local_path=inputs['gene-sets-gmt'],
+            reporter=self.reporter)
+
@@ -0,0 +1,20 @@
+from os.path import expanduser, basename
+
+
+REMOTE_ROOT_DIR = 'RNAapp'  # placed in the remote user's home directory
+PROFILE_FILE = '.profile'
+LOCAL_ROOT_DIR = expanduser('~/.RNAapp')  # caches and records of the app on the local machine
+
+
+def remote_root_of(user: str) -> str:
+    """
+    Absolute path, shell characters like '~/' do not work in SFTP
+    """
+    return f'/home/{user}/{REMOTE_ROOT_DIR}'
+
+
+def job_name_of(outdir: str) -> str:
+    """
+    Also the name of the screen session of the job
+    """
+    return basename(outdir).replace(' ', '_')
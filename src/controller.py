@@ -1,24 +1,78 @@
-from fabric import Connection
-from typing import Dict, Optional
-from os.path import basename, abspath
+import time
+from os.path import basename
+from typing import Dict, List, Optional, Callable, Any, Tuple, Union
+from PyQt5.QtCore import QTimer
 from .io import IO
 from .view import View
-
-
-REMOTE_ROOT_DIR = 'RNAapp'  # placed in the remote user's home directory
-PROFILE_FILE = '.profile'
+from .worker import Worker
+from .submit import SubmitJob
+from .batch import BatchSubmitJob, expand_rows
+from .monitor import ProgressTail
+from .mirror import ResultMirror
+from .download import ResultDownloader
+from .registry import JobRegistry, RefreshJobStatus
+from .watcher import CompletionWatcher, FINAL_STATUSES
+from .hosts import split_hosts
+from .constants import remote_root_of
+from .reporter import Reporter
+from .prefetch import Prefetcher
+from .timing import TimingLog, read_log, host_summary
+from .schema import SchemaCache, discover_schemas, form_of
+from .library import LibraryCache, LibrarySync, list_library, KINDS
+from .pool import POOL
+
+
+INPUT_KEY_TO_TITLE = {
+    'count-table': 'Upload Count Table',
+    'sample-info-table': 'Upload Sample Info Table',
+    'gene-info-table': 'Upload Gene Info Table',
+    'gene-sets-gmt': 'Upload Gene Sets GMT File (optional)',
+}
+LOCAL_FILE = 'Local file...'  # the last item of the library picker
 
 
 class Controller:
 
+    EVICT_INTERVAL = 60 * 1000  # milliseconds
+
     view: View
+    background_actions: List['Action']
+    evict_timer: QTimer
+    progress_tails: Dict[Tuple[str, str, int], Tuple[ProgressTail, Worker]]
+    watchers: Dict[Tuple[str, str, int], Worker]
+    mirrors: Dict[Tuple[str, str, int], Tuple[ResultMirror, Worker]]
+    schema_cache: SchemaCache
+    library_cache: LibraryCache
+    form_version: Optional[Tuple[str, str]]  # (host, version) of the schema the form is built from
 
     def __init__(self, io: IO, view: View):
         self.io = io
         self.view = view
+        self.background_actions = []
+        self.progress_tails = {}
+        self.watchers = {}
+        self.mirrors = {}
+        self.schema_cache = SchemaCache()
+        self.library_cache = LibraryCache()
+        self.form_version = None
         self.__connect_buttons_to_actions()
+        self.__connect_schema_edits()
+        self.apply_cached_schema()
+        self.__start_evict_timer()
         self.view.show()
 
+    def __connect_schema_edits(self):
+        """
+        Only user edits, not set_parameters(), rebuild the form, so loading parameters never races with it
+        """
+        self.view.edit_dict['Host'].qedit.lineEdit().editingFinished.connect(self.apply_cached_schema)
+        self.view.edit_dict['RNA-Seq Analysis'].qedit.activated.connect(lambda _: self.apply_cached_schema())
+
+    def __start_evict_timer(self):
+        self.evict_timer = QTimer()
+        self.evict_timer.timeout.connect(POOL.evict_idle)
+        self.evict_timer.start(self.EVICT_INTERVAL)
+
     def __connect_buttons_to_actions(self):
         for button in self.view.button_dict.values():
             key = button.key
@@ -38,13 +92,85 @@ class Controller:
     def action_submit(self):
         ActionSubmit(self).exec()
 
+    def action_submit_batch(self):
+        ActionSubmitBatch(self).exec()
+
+    def action_monitor(self):
+        ActionMonitor(self).exec()
+
+    def action_download(self):
+        ActionDownload(self).exec()
+
+    def action_jobs(self):
+        ActionJobs(self).exec()
+
+    def action_timing(self):
+        ActionTiming(self).exec()
+
+    def action_discover_versions(self):
+        ActionDiscoverVersions(self).exec()
+
+    def action_sync_library(self):
+        ActionSyncLibrary(self).exec()
+
+    def action_sync_results(self):
+        ActionSyncResults(self).exec()
+
+    def apply_cached_schema(self):
+        """
+        Builds the RNA part of the form from the cached schema of the selected version on the (first) host,
+        the built-in form stays if the version has never been discovered
+        """
+        hosts = split_hosts(self.view.get_ssh_key_values()['Host'])
+        if len(hosts) == 0:
+            return
+        versions = self.schema_cache.versions(host=hosts[0])
+        if len(versions) > 0:
+            self.view.set_programs(versions)
+        version = self.view.get_ssh_key_values()['RNA-Seq Analysis']
+        options = self.schema_cache.get(host=hosts[0], version=version)
+        if options is None or self.form_version == (hosts[0], version):
+            return
+        self.view.set_rna_form(form_of(options))
+        self.form_version = (hosts[0], version)
+
+    def watch_jobs(self, ssh_key_values: Dict[str, str], password: str):
+        """
+        (Re)starts the completion watcher of the host, so it also watches the jobs just submitted
+        """
+        s = ssh_key_values
+        key = (s['Host'], s['User'], int(s['Port']))
+        if key in self.watchers:
+            self.watchers[key].cancel()
+        watcher = CompletionWatcher(host=key[0], user=key[1], port=key[2], password=password)
+        worker = Worker(fn=watcher.run, long_running=True)
+        worker.signals.data.connect(lambda event, k=key: self.__on_job_event(key=k, event=event))
+        self.watchers[key] = worker
+        worker.start()
+
+    def stop_watchers(self):
+        for worker in self.watchers.values():
+            worker.cancel()
+        self.watchers = {}
+        for _, worker in self.mirrors.values():
+            worker.cancel()  # the snapshots are kept, so the next sync resumes
+        self.mirrors = {}
+
+    def __on_job_event(self, key: Tuple[str, str, int], event: Dict[str, Any]):
+        if event['status'] in FINAL_STATUSES:
+            self.view.notifier(title=f'Job {event["status"]}', msg=f'{key[0]}: {basename(event["outdir"])}')
+        if self.view.jobs_dialog.is_built():
+            self.view.jobs_dialog.set_jobs(JobRegistry().jobs())
+
 
 class Action:
 
+    controller: Controller
     io: IO
     view: View
 
     def __init__(self, controller: Controller):
+        self.controller = controller
         self.io = controller.io
         self.view = controller.view
 
@@ -54,6 +180,46 @@ class Action:
         except Exception as e:
             self.view.message_box_error(msg=repr(e))
 
+    def ask_password(self) -> Optional[str]:
+        """
+        No need to ask if the pool already holds an authenticated connection
+        Returns None if the user cancels
+        """
+        s = self.view.get_ssh_key_values()
+        if all(POOL.is_connected(host=h, user=s['User'], port=int(s['Port'])) for h in split_hosts(s['Host'])):
+            return ''
+        password = self.view.password_dialog()
+        return None if password == '' else password
+
+    def ask_input(self, key: str, organism: str) -> str:
+        """
+        Library entries of the organism, found on every host of the form, are offered before a local file
+        Returns '' if the user cancels
+        """
+        title = INPUT_KEY_TO_TITLE[key]
+        refs = [] if key not in KINDS else self.controller.library_cache.refs(
+            hosts=split_hosts(self.view.get_ssh_key_values()['Host']), organism=organism, kind=key)
+        if len(refs) > 0:
+            item = self.view.item_dialog(
+                title=title, label='From the library on the server, nothing is uploaded', items=refs + [LOCAL_FILE])
+            if item != LOCAL_FILE:
+                return item
+        return self.view.file_dialog_open(title=title)
+
+    def resolve_host(self, ssh_key_values: Dict[str, str], outdir: str) -> Dict[str, str]:
+        """
+        With a pool of hosts in the form, the outdir is looked up in the job registry for its host
+        outdir: absolute remote path
+        """
+        s = ssh_key_values
+        hosts = split_hosts(s['Host'])
+        if len(hosts) == 1:
+            return dict(s, Host=hosts[0])
+        host = JobRegistry().host_of(user=s['User'], port=int(s['Port']), outdir=outdir)
+        if host is None:
+            raise ValueError(f'No job of "{outdir}" submitted to any of {", ".join(hosts)}')
+        return dict(s, Host=host)
+
 
 class ActionLoadParameters(Action):
 
@@ -63,6 +229,8 @@ class ActionLoadParameters(Action):
             return
         parameters = self.io.read(file=file)
         self.view.set_parameters(parameters=parameters)
+        self.controller.apply_cached_schema()  # the host or version may have changed
+        self.view.set_parameters(parameters=parameters)
 
 
 class ActionSaveParameters(Action):
@@ -75,7 +243,60 @@ class ActionSaveParameters(Action):
         self.io.write(file=file, parameters=parameters)
 
 
-class ActionSubmit(Action):
+class BackgroundAction(Action):
+    """
+    The slow part runs in a worker thread, so the GUI event loop never blocks
+    The View is only touched by the slots below, which Qt runs in the GUI thread
+    """
+
+    PROGRESS_TITLE: str
+
+    worker: Worker
+
+    def start_worker(self, fn: Callable[[Reporter], Any]):
+        self.worker = Worker(fn=fn)
+        self.worker.signals.message.connect(self.view.progress_dialog.set_message)
+        self.worker.signals.file_progress.connect(self.view.progress_dialog.set_file_progress)
+        self.worker.signals.question.connect(self.__on_question)
+        self.worker.signals.finished.connect(self.__on_finished)
+        self.worker.signals.error.connect(self.__on_error)
+        self.worker.signals.cancelled.connect(self.__on_cancelled)
+
+        self.controller.background_actions.append(self)  # keep self alive until the worker is done
+        self.view.progress_dialog.open(title=self.PROGRESS_TITLE, on_cancel=self.worker.cancel)
+        self.worker.start()
+
+    def on_finished(self, result: Any):
+        pass
+
+    def __on_question(self, question: str):
+        self.worker.reporter.answer(self.view.message_box_yes_no(msg=question))
+
+    def __on_finished(self, result: Any):
+        self.__done()
+        self.on_finished(result)
+
+    def __on_error(self, msg: str):
+        self.__done()
+        self.view.message_box_error(msg=msg)
+
+    def __on_cancelled(self):
+        self.__done()
+        self.view.message_box_info(msg=f'{self.PROGRESS_TITLE} cancelled')
+
+    def __done(self):
+        self.view.progress_dialog.close()
+        self.controller.background_actions.remove(self)
+
+
+class ActionSubmit(BackgroundAction):
+    """
+    Pipelined: the password is asked first, then each input starts uploading in the background
+    the moment it is chosen, so by the confirmation most of the transfer is already done
+    Cancelling any dialog cancels the prefetch, which rolls back its uploads, and so does a failed submission
+    """
+
+    PROGRESS_TITLE = 'Job submission'
 
     count_table_local_path: str
     sample_info_table_local_path: str
@@ -85,106 +306,460 @@ class ActionSubmit(Action):
     ssh_password: str
     ssh_key_values: Dict[str, str]
     rna_key_values: Dict[str, str]
-    rna_cmd: str
+    timing: TimingLog
+    prefetcher: Prefetcher
+    prefetch_worker: Worker
 
     def workflow(self):
-        self.count_table_local_path = self.view.file_dialog_open(title='Upload Count Table')
-        if self.count_table_local_path == '':
+        start = time.time()
+        self.ssh_key_values = self.view.get_ssh_key_values()
+        self.rna_key_values = self.view.get_rna_key_values()
+
+        self.ssh_password = self.ask_password()
+        if self.ssh_password is None:
             return
-        self.sample_info_table_local_path = self.view.file_dialog_open(title='Upload Sample Info Table')
-        if self.sample_info_table_local_path == '':
+
+        self.timing = TimingLog(action='submit')
+        self.start_prefetch()
+        try:
+            confirmed = self.ask_inputs()
+        except Exception:
+            self.prefetch_worker.cancel()
+            raise
+        if not confirmed:
+            self.prefetch_worker.cancel()
             return
-        self.gene_info_table_local_path = self.view.file_dialog_open(title='Upload Gene Info Table')
-        if self.gene_info_table_local_path == '':
+
+        self.prefetcher.close()
+        self.timing.record(name='dialogs', kind='dialog', start=start, seconds=time.time() - start)
+        self.start_worker(fn=self.submit)
+        self.prefetch_worker.signals.message.connect(self.view.progress_dialog.set_message)
+        self.prefetch_worker.signals.file_progress.connect(self.view.progress_dialog.set_file_progress)
+
+    def start_prefetch(self):
+        """
+        The prefetch worker has no progress dialog of its own, its messages go to stdout until the submission starts
+        """
+        self.prefetcher = Prefetcher(
+            ssh_key_values=self.ssh_key_values, rna_key_values=self.rna_key_values, password=self.ssh_password)
+        self.prefetch_worker = Worker(fn=self.prefetch, long_running=True)
+        for signal in [
+            self.prefetch_worker.signals.finished,
+            self.prefetch_worker.signals.error,
+            self.prefetch_worker.signals.cancelled,
+        ]:
+            signal.connect(self.__on_prefetch_done)
+        self.controller.background_actions.append(self)  # keep self alive until the prefetch is done
+        self.prefetch_worker.start()
+
+    def __on_prefetch_done(self, *_):
+        self.controller.background_actions.remove(self)
+
+    def prefetch(self, reporter: Reporter):
+        reporter.timing = self.timing
+        self.prefetcher.run(reporter=reporter)
+
+    def ask_inputs(self) -> bool:
+        """
+        Returns False if the user cancels
+        """
+        paths = {}
+        for key in INPUT_KEY_TO_TITLE:
+            paths[key] = self.ask_input(key=key, organism=self.rna_key_values.get('organism', ''))
+            if paths[key] == '' and key != 'gene-sets-gmt':  # the gene sets GMT is optional
+                return False
+            self.prefetcher.add(key=key, local_path=paths[key])
+        self.count_table_local_path = paths['count-table']
+        self.sample_info_table_local_path = paths['sample-info-table']
+        self.gene_info_table_local_path = paths['gene-info-table']
+        self.gene_sets_gmt_local_path = paths['gene-sets-gmt']
+        return self.view.message_box_yes_no(msg='Are you sure you want to submit the job?')
+
+    def submit(self, reporter: Reporter) -> Dict[str, Union[str, int]]:
+        reporter.timing = self.timing
+        try:
+            return SubmitJob(
+                ssh_key_values=self.ssh_key_values,
+                ssh_password=self.ssh_password,
+                rna_key_values=self.rna_key_values,
+                count_table_local_path=self.count_table_local_path,
+                sample_info_table_local_path=self.sample_info_table_local_path,
+                gene_info_table_local_path=self.gene_info_table_local_path,
+                gene_sets_gmt_local_path=self.gene_sets_gmt_local_path,
+                reporter=reporter,
+                prefetcher=self.prefetcher).main()
+        except Exception:  # also Cancelled, the inputs it has not linked are rolled back
+            self.prefetch_worker.cancel()
+            self.prefetcher.discard(reporter=reporter)
+            raise
+
+    def on_finished(self, result: Dict[str, Union[str, int]]):
+        self.controller.watch_jobs(
+            ssh_key_values=dict(self.ssh_key_values, Host=result['host']), password=self.ssh_password)
+        self.view.message_box_info(
+            msg=f'Job submitted!\n{queue_status(result)}' + warnings_of([result]) + timing_of(self.timing))
+
+
+class ActionSubmitBatch(BackgroundAction):
+
+    PROGRESS_TITLE = 'Batch submission'
+
+    ssh_password: str
+    ssh_key_values: Dict[str, str]
+    jobs: List[Tuple[Dict[str, Union[str, bool]], Dict[str, str]]]
+    timing: TimingLog
+
+    def workflow(self):
+        start = time.time()
+        file = self.view.file_dialog_open(title='Load Parameter Sheet (one row per job)')
+        if file == '':
             return
-        self.gene_sets_gmt_local_path = self.view.file_dialog_open(title='Upload Gene Sets GMT File (optional)')
+        rows = self.io.read_table(file=file)
+        if len(rows) == 0:
+            self.view.message_box_error(msg=f'No job in "{file}"')
+            return
+
+        # only ask for the inputs which are not given for every job in the sheet
+        base_rna_key_values = self.view.get_rna_key_values()
+        base_inputs = {key: '' for key in INPUT_KEY_TO_TITLE}
+        for key in INPUT_KEY_TO_TITLE:
+            if all(row.get(key, '') != '' for row in rows):
+                continue
+            base_inputs[key] = self.ask_input(key=key, organism=base_rna_key_values.get('organism', ''))
+            if base_inputs[key] == '' and key != 'gene-sets-gmt':
+                return
+
+        self.ssh_key_values = self.view.get_ssh_key_values()
+        self.jobs = expand_rows(
+            base_rna_key_values=base_rna_key_values,
+            base_inputs=base_inputs,
+            rows=rows)
 
-        self.ssh_password = self.view.password_dialog()
-        if self.ssh_password == '':
+        self.ssh_password = self.ask_password()
+        if self.ssh_password is None:
             return
 
-        if not self.view.message_box_yes_no(msg='Are you sure you want to submit the job?'):
+        if not self.view.message_box_yes_no(msg=f'Are you sure you want to submit {len(self.jobs)} jobs?'):
             return
 
+        self.timing = TimingLog(action='submit_batch')
+        self.timing.record(name='dialogs', kind='dialog', start=start, seconds=time.time() - start)
+        self.start_worker(fn=self.submit)
+
+    def submit(self, reporter: Reporter) -> List[Dict[str, Union[str, int]]]:
+        reporter.timing = self.timing
+        jobs = [
+            SubmitJob(
+                ssh_key_values=self.ssh_key_values,
+                ssh_password=self.ssh_password,
+                rna_key_values=rna_key_values,
+                count_table_local_path=inputs['count-table'],
+                sample_info_table_local_path=inputs['sample-info-table'],
+                gene_info_table_local_path=inputs['gene-info-table'],
+                gene_sets_gmt_local_path=inputs['gene-sets-gmt'],
+                reporter=reporter)
+            for rna_key_values, inputs in self.jobs
+        ]
+        return BatchSubmitJob(jobs=jobs, reporter=reporter).main()
+
+    def on_finished(self, result: List[Dict[str, Union[str, int]]]):
+        self.controller.watch_jobs(
+            ssh_key_values=dict(self.ssh_key_values, Host=result[0]['host']), password=self.ssh_password)
+        lines = '\n'.join(f'{r["job_name"]}: {queue_status(r)}' for r in result)
+        self.view.message_box_info(
+            msg=f'{len(result)} jobs submitted!\n{lines}' + warnings_of(result) + timing_of(self.timing))
+
+
+class ActionMonitor(Action):
+    """
+    Adds the job of the current outdir to the job monitor
+    Jobs on the same host share one ProgressTail, which runs in a worker thread until the monitor is closed
+    """
+
+    def workflow(self):
+        s = self.view.get_ssh_key_values()
+        outdir = f'{remote_root_of(s["User"])}/{self.view.get_rna_key_values()["outdir"]}'
+        s = self.resolve_host(ssh_key_values=s, outdir=outdir)
+        key = (s['Host'], s['User'], int(s['Port']))
+
+        tails = self.controller.progress_tails
+        if key not in tails:
+            password = self.ask_password()
+            if password is None:
+                return
+            tail = ProgressTail(host=key[0], user=key[1], port=key[2], password=password)
+            worker = Worker(fn=tail.run, long_running=True)
+            worker.signals.data.connect(self.view.job_monitor.append)
+            worker.signals.error.connect(lambda msg, k=key: self.on_error(key=k, msg=msg))
+            tails[key] = (tail, worker)
+            worker.start()
+
+        tail, _ = tails[key]
+        tail.add(outdir=outdir)
+        self.view.job_monitor.add_job(key=outdir, title=f'{key[0]}: {basename(outdir)}')
+        self.view.job_monitor.open(on_close=self.stop_all)
+
+    def on_error(self, key: Tuple[str, str, int], msg: str):
+        self.controller.progress_tails.pop(key, None)
+        self.view.message_box_error(msg=msg)
+
+    def stop_all(self):
+        for _, worker in self.controller.progress_tails.values():
+            worker.cancel()
+        self.controller.progress_tails = {}
+
+
+class ActionSyncResults(Action):
+    """
+    Mirrors the results of the job of the current outdir into a local dir while the job runs,
+    pulling new or changed files until its screen session exits
+    Jobs on the same host share one ResultMirror, which runs in a worker thread until its last job has ended
+    """
+
+    def workflow(self):
+        s = self.view.get_ssh_key_values()
+        outdir = f'{remote_root_of(s["User"])}/{self.view.get_rna_key_values()["outdir"]}'
+        s = self.resolve_host(ssh_key_values=s, outdir=outdir)
+        key = (s['Host'], s['User'], int(s['Port']))
+
+        local_parent = self.view.file_dialog_directory(title='Sync Results To')
+        if local_parent == '':
+            return
+        local_dir = f'{local_parent}/{basename(outdir)}'
+
+        mirrors = self.controller.mirrors
+        if key not in mirrors or not mirrors[key][0].add(outdir=outdir, local_dir=local_dir):
+            password = self.ask_password()
+            if password is None:
+                return
+            self.start_mirror(key=key, password=password, excludes=excludes_of(s), outdir=outdir, local_dir=local_dir)
+        self.view.message_box_info(msg=f'Syncing "{basename(outdir)}" into "{local_dir}"')
+
+    def start_mirror(self, key: Tuple[str, str, int], password: str, excludes: List[str], outdir: str, local_dir: str):
+        mirror = ResultMirror(host=key[0], user=key[1], port=key[2], password=password, excludes=excludes)
+        mirror.add(outdir=outdir, local_dir=local_dir)
+        worker = Worker(fn=mirror.run, long_running=True)
+        worker.signals.data.connect(lambda event, k=key: self.on_event(key=k, event=event))
+        worker.signals.finished.connect(lambda _, k=key, m=mirror: self.on_done(key=k, mirror=m))
+        worker.signals.error.connect(lambda msg, k=key, m=mirror: self.on_error(key=k, mirror=m, msg=msg))
+        self.controller.mirrors[key] = (mirror, worker)
+        worker.start()
+
+    def on_event(self, key: Tuple[str, str, int], event: Dict[str, Any]):
+        name = basename(event['outdir'])
+        if event['status'] in ['queued', 'running']:
+            self.view.notifier(title='New results', msg=f'{key[0]}: {len(event["pulled"])} files of {name}')
+        else:
+            self.view.notifier(title='Results synced', msg=f'{key[0]}: {name} {event["status"]}, {event["files"]} files')
+
+    def on_done(self, key: Tuple[str, str, int], mirror: ResultMirror):
+        if key in self.controller.mirrors and self.controller.mirrors[key][0] is mirror:
+            self.controller.mirrors.pop(key)
+
+    def on_error(self, key: Tuple[str, str, int], mirror: ResultMirror, msg: str):
+        self.on_done(key=key, mirror=mirror)
+        self.view.message_box_error(msg=msg)
+
+
+class ActionDownload(BackgroundAction):
+    """
+    Downloads the outdir of the form into {local dir}/{basename of outdir}/
+    """
+
+    PROGRESS_TITLE = 'Download'
+
+    ssh_key_values: Dict[str, str]
+    ssh_password: str
+    remote_dir: str
+    local_dir: str
+    excludes: List[str]
+
+    def workflow(self):
         self.ssh_key_values = self.view.get_ssh_key_values()
-        self.rna_key_values = self.view.get_rna_key_values()
+        outdir = self.view.get_rna_key_values()['outdir']
+        self.remote_dir = f'{remote_root_of(self.ssh_key_values["User"])}/{outdir}'
+        self.ssh_key_values = self.resolve_host(ssh_key_values=self.ssh_key_values, outdir=self.remote_dir)
 
-        self.build_rna_cmd()
-        self.connect_and_submit_job()
-        self.view.message_box_info(msg='Job submitted!')
-
-    def build_rna_cmd(self):
-        program = self.ssh_key_values['RNA-Seq Analysis']
-        outdir = self.rna_key_values['outdir']
-
-        args = [f'python {program}']
-        for key, val in self.rna_key_values.items():
-            if type(val) is bool:
-                if val is True:
-                    args.append(f'--{key}')
-            else:  # val is string
-                args.append(f"--{key}='{val}'")
-        
-        args.append(f"--count-table='{outdir}/{basename(self.count_table_local_path)}'")  # uploaded by the user
-        args.append(f"--sample-info-table='{outdir}/{basename(self.sample_info_table_local_path)}'")
-        args.append(f"--gene-info-table='{outdir}/{basename(self.gene_info_table_local_path)}'")
-        if self.gene_sets_gmt_local_path != '':
-            args.append(f"--gene-sets-gmt='{outdir}/{basename(self.gene_sets_gmt_local_path)}'")
-        args.append(f"2>&1 | tee '{outdir}/progress.txt'")
-        self.rna_cmd = '     '.join(args)
-
-    def connect_and_submit_job(self):
-        """
-        Shell characters like './' and '~/' will work in con.run(), but not in con.put()
-        
-        To be safe, use absolute path for the remote root dir
-        The outdir is defined as relative path, but check if it traverses outside the remote root dir (security issues)
-        """
+        local_parent = self.view.file_dialog_directory(title='Download Results To')
+        if local_parent == '':
+            return
+        self.local_dir = f'{local_parent}/{basename(outdir)}'
+
+        self.excludes = excludes_of(self.ssh_key_values)
+
+        self.ssh_password = self.ask_password()
+        if self.ssh_password is None:
+            return
+
+        self.start_worker(fn=self.download)
+
+    def download(self, reporter: Reporter) -> Dict[str, Any]:
+        s = self.ssh_key_values
+        with POOL.connection(host=s['Host'], user=s['User'], port=int(s['Port']), password=self.ssh_password) as con:
+            return ResultDownloader(
+                con=con,
+                streams=int(s.get('Upload Streams', '4')),
+                reporter=reporter
+            ).download(remote_dir=self.remote_dir, local_dir=self.local_dir, excludes=self.excludes)
+
+    def on_finished(self, result: Dict[str, Any]):
+        self.view.message_box_info(
+            msg=f'Downloaded {result["downloaded"]} of {result["files"]} files '
+                f'({result["bytes"] / 1e6:,.1f} MB) to "{self.local_dir}"')
+
+
+class ActionJobs(Action):
+
+    def workflow(self):
+        self.view.jobs_dialog.open(
+            jobs=JobRegistry().jobs(),
+            on_refresh=lambda: ActionRefreshJobs(self.controller).exec())
+
+
+class ActionTiming(Action):
+    """
+    Median timings per host across the submissions in the timing log, to spot slow links or hosts
+    """
+
+    def workflow(self):
+        self.view.message_box_info(msg=host_summary(read_log()))
+
+
+class ActionDiscoverVersions(BackgroundAction):
+    """
+    Finds the versions installed on each host of the form, with the options of each, one remote call per host
+    The reference library of each host is listed over the same connection
+    """
+
+    PROGRESS_TITLE = 'Discovering versions'
+
+    ssh_key_values: Dict[str, str]
+    ssh_password: str
+
+    def workflow(self):
+        self.ssh_key_values = self.view.get_ssh_key_values()
+        self.ssh_password = self.ask_password()
+        if self.ssh_password is None:
+            return
+        self.start_worker(fn=self.discover)
+
+    def discover(self, reporter: Reporter) -> Dict[str, List[str]]:
         s = self.ssh_key_values
-        con = Connection(
-            host=s['Host'],
-            user=s['User'],
-            port=int(s['Port']),
-            connect_kwargs={'password': self.ssh_password}
+        ret = {}
+        for host in split_hosts(s['Host']):
+            reporter.message(f'Discovering versions on {host}')
+            with POOL.connection(host=host, user=s['User'], port=int(s['Port']), password=self.ssh_password) as con:
+                schemas = discover_schemas(con=con, remote_root=remote_root_of(s['User']))
+                library = list_library(con=con, remote_root=remote_root_of(s['User']))
+            self.controller.schema_cache.put(host=host, schemas=schemas)
+            self.controller.library_cache.put(host=host, entries=library)
+            ret[host] = self.controller.schema_cache.versions(host=host)
+        return ret
+
+    def on_finished(self, result: Dict[str, List[str]]):
+        self.controller.form_version = None  # a version may have been reinstalled
+        self.controller.apply_cached_schema()
+        lines = '\n'.join(f'{host}: {", ".join(versions) or "none"}' for host, versions in result.items())
+        self.view.message_box_info(msg=f'Versions found\n{lines}')
+
+
+class ActionSyncLibrary(BackgroundAction):
+    """
+    Pushes the new versions of a local reference library to each host of the form,
+    laid out as {organism}/{kind}/{version}/{file}, where kind is gene-info-table or gene-sets-gmt
+    """
+
+    PROGRESS_TITLE = 'Syncing library'
+
+    ssh_key_values: Dict[str, str]
+    ssh_password: str
+    local_dir: str
+
+    def workflow(self):
+        self.ssh_key_values = self.view.get_ssh_key_values()
+        self.local_dir = self.view.file_dialog_directory(title='Local Reference Library')
+        if self.local_dir == '':
+            return
+        self.ssh_password = self.ask_password()
+        if self.ssh_password is None:
+            return
+        self.start_worker(fn=self.sync)
+
+    def sync(self, reporter: Reporter) -> Dict[str, int]:
+        s = self.ssh_key_values
+        ret = {}
+        for host in split_hosts(s['Host']):
+            reporter.message(f'Syncing the library to {host}')
+            with POOL.connection(host=host, user=s['User'], port=int(s['Port']), password=self.ssh_password) as con:
+                entries = LibrarySync(
+                    con=con,
+                    remote_root=remote_root_of(s['User']),
+                    local_dir=self.local_dir,
+                    streams=int(s.get('Upload Streams', '4')),
+                    reporter=reporter).main()
+            self.controller.library_cache.put(host=host, entries=entries)
+            ret[host] = len(entries)
+        return ret
+
+    def on_finished(self, result: Dict[str, int]):
+        lines = '\n'.join(f'{host}: {n} files' for host, n in result.items())
+        self.view.message_box_info(msg=f'Library synced\n{lines}')
+
+
+class ActionRefreshJobs(BackgroundAction):
+    """
+    Refreshes the active jobs on each host of the form, one remote call per host
+    """
+
+    PROGRESS_TITLE = 'Job status'
+
+    ssh_key_values: Dict[str, str]
+    ssh_password: str
+
+    def workflow(self):
+        self.ssh_key_values = self.view.get_ssh_key_values()
+        self.ssh_password = self.ask_password()
+        if self.ssh_password is None:
+            return
+        self.start_worker(fn=self.refresh)
+
+    def refresh(self, reporter: Reporter) -> int:
+        s = self.ssh_key_values
+        return sum(
+            RefreshJobStatus(
+                host=host,
+                user=s['User'],
+                port=int(s['Port']),
+                password=self.ssh_password,
+                reporter=reporter).main()
+            for host in split_hosts(s['Host'])
         )
 
-        user = self.ssh_key_values['User']
-        remote_root = f'/home/{user}/{REMOTE_ROOT_DIR}'  # absolute path
-        outdir = self.rna_key_values['outdir']  # relative path
+    def on_finished(self, result: int):
+        self.view.jobs_dialog.set_jobs(JobRegistry().jobs())
+        if result > 0:
+            for host in split_hosts(self.ssh_key_values['Host']):
+                self.controller.watch_jobs(
+                    ssh_key_values=dict(self.ssh_key_values, Host=host), password=self.ssh_password)
 
-        assert is_subdir(parent=remote_root, child=f'{remote_root}/{outdir}'), \
-            f'The outdir "{outdir}" traverses outside the remote root directory, not safe!'
 
-        with con.cd(remote_root):
-            con.run(f'mkdir -p "{outdir}"', echo=True)
+def excludes_of(ssh_key_values: Dict[str, str]) -> List[str]:
+    excludes = ssh_key_values.get('Download Excludes', 'None')
+    return [] if excludes in ['None', ''] else [e.strip() for e in excludes.split(',') if e.strip() != '']
 
-        for local_path in [
-            self.count_table_local_path,
-            self.sample_info_table_local_path,
-            self.gene_info_table_local_path,
-            self.gene_sets_gmt_local_path,
-        ]:
-            if local_path == '':
-                continue
-            print(f'Uploading "{basename(local_path)}" to remote directory "{remote_root}/{outdir}/"', flush=True)
-            con.put(
-                local=local_path,
-                remote=f'{remote_root}/{outdir}/'  # absolute path
-            )
 
-        # the environment (.profile) needs to be activated right before the rna_cmd
-        script = f'source {PROFILE_FILE} && {self.rna_cmd}'
-        cmd_txt = f'{outdir}/command.txt'
-        job_name = basename(outdir).replace(' ', '_')
+def queue_status(result: Dict[str, Union[str, int]]) -> str:
+    if result.get('reused_from') is not None:
+        return f'Results reused from "{result["reused_from"]}"'
+    position = result['queue_position']
+    return 'Running' if position == 0 else f'Queued at position {position}'
 
-        with con.cd(remote_root):
-            con.run(f'echo "{script}" > "{cmd_txt}"', echo=True)
-            con.run(f'screen -dm -S {job_name} bash "{cmd_txt}"', echo=True)
 
-        con.close()
+def warnings_of(results: List[Dict[str, Any]]) -> str:
+    warnings = sorted({w for r in results for w in r.get('warnings', [])})
+    return ''.join(f'\n\nWarning: {w}' for w in warnings)
 
 
-def is_subdir(parent: str, child: str) -> bool:
-    p = abspath(parent)
-    c = abspath(child)
-    return c.startswith(p)
+def timing_of(timing: TimingLog) -> str:
+    summary = timing.summary()
+    return '' if summary == '' else f'\n\nTiming:\n{summary}'
@@ -0,0 +1,159 @@
+import os
+import json
+from os.path import basename, exists
+from typing import List, Optional, Dict, Any, TYPE_CHECKING
+from .reporter import Reporter
+from .helper import cdc_blocks, run_helper
+from .constants import LOCAL_ROOT_DIR
+from .transfer import ParallelUploader, Chunk, TransferMeter, GZIP
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+RESUMABLE_THRESHOLD = 64 * 2**20  # smaller files are simply re-sent
+
+
+class Checkpoint:
+    """
+    Local record of an upload: the blocks of the file with their checksums, so they are not split again on resume
+
+    Keyed by the sha256 of the file, so a resumed upload never mixes blocks of different contents
+    Which blocks were sent is not recorded here, the blocks staged on the server are what counts
+    """
+
+    DIR = f'{LOCAL_ROOT_DIR}/checkpoints'
+
+    file: str
+    blocks: Optional[List[List[Any]]]  # [[offset, length, sha256], ...]
+
+    def __init__(self, sha256: str, dir_: str = DIR):
+        self.file = f'{dir_}/{sha256}.json'
+        self.blocks = None
+        if exists(self.file):
+            with open(self.file) as fh:
+                self.blocks = json.load(fh)['blocks']
+
+    def save(self):
+        """
+        Once, when the file has been split
+        """
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        tmp = f'{self.file}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'blocks': self.blocks}, fh)
+        os.replace(tmp, self.file)
+
+    def remove(self):
+        if exists(self.file):
+            os.remove(self.file)
+
+
+class ResumableUploader:
+    """
+    Sends a file as content-defined blocks into a remote staging dir {target}.blocks/,
+    and the server helper assembles the target from them with per-block sha256 verification
+
+    - Resume: blocks already staged by an interrupted upload are not sent again,
+        the staging dir matching resume_from which no upload has written to for a while is taken over
+    - Delta: blocks also found in the basis, i.e. the previous version of the file on the server,
+        are copied on the server instead of being sent, like rsync
+    - Each block may be gzipped on the fly, the helper decompresses it with the python3 standard library
+
+    A cancelled or failed upload keeps the staged blocks on the server to be resumed next time
+    """
+
+    MAX_ATTEMPTS = 2
+
+    con: 'Connection'
+    streams: int
+    reporter: Reporter
+
+    def __init__(self, con: 'Connection', streams: int = 4, reporter: Optional[Reporter] = None):
+        self.con = con
+        self.streams = streams
+        self.reporter = Reporter() if reporter is None else reporter
+
+    def upload(
+            self,
+            local_path: str,
+            sha256: str,
+            target: str,
+            resume_from: Optional[str],
+            basis: Optional[str],
+            compress: bool):
+        name = basename(local_path)
+        checkpoint = Checkpoint(sha256=sha256)
+        if checkpoint.blocks is None:
+            self.reporter.message(f'Splitting "{name}" into blocks')
+            checkpoint.blocks = cdc_blocks(local_path, on_block=lambda _: self.reporter.check_cancelled())
+            checkpoint.save()
+        blocks = checkpoint.blocks
+
+        staging = f'{target}.blocks'
+        plan = run_helper(con=self.con, command='plan', request={
+            'basis': basis,
+            'staging': staging,
+            'resume_from': resume_from,
+            'blocks': blocks,
+        }, timing=self.reporter.timing)
+        from_basis: Dict[str, int] = plan['from_basis']
+        staged = set(plan['staged'])
+
+        if len(staged) > 0:
+            self.reporter.message(f'Resuming "{name}", {len(staged)} of {len(blocks)} blocks already sent')
+        if len(from_basis) > 0:
+            self.reporter.message(f'"{name}": {len(from_basis)} of {len(blocks)} blocks unchanged on the server')
+
+        for _ in range(self.MAX_ATTEMPTS):
+            needed = [
+                i for i in range(len(blocks))
+                if str(i) not in from_basis and i not in staged
+            ]
+            self.send_blocks(
+                local_path=local_path, blocks=blocks, needed=needed, staging=staging, compress=compress)
+
+            self.reporter.check_cancelled()
+            bad = run_helper(con=self.con, command='assemble', request={
+                'basis': basis,
+                'staging': staging,
+                'target': target,
+                'blocks': blocks,
+                'from_basis': from_basis,
+            }, timing=self.reporter.timing)['bad']
+
+            if len(bad) == 0:
+                checkpoint.remove()
+                return
+
+            self.reporter.message(f'"{name}": {len(bad)} blocks failed checksum verification, re-sending')
+            for i in bad:
+                from_basis.pop(str(i), None)
+                staged.discard(i)
+
+        raise IOError(f'Failed to upload "{local_path}" after {self.MAX_ATTEMPTS} attempts')
+
+    def send_blocks(
+            self,
+            local_path: str,
+            blocks: List[List[Any]],
+            needed: List[int],
+            staging: str,
+            compress: bool):
+
+        meter = TransferMeter(
+            name=basename(local_path),
+            total=sum(blocks[i][1] for i in needed),
+            reporter=self.reporter)
+
+        chunks = []
+        for i in needed:
+            offset, length, _ = blocks[i]
+            chunks.append(Chunk(
+                local_path=local_path,
+                remote_path=f'{staging}/{i}.gz' if compress else f'{staging}/{i}',
+                offset=offset,
+                length=length,
+                meter=meter,
+                codec=GZIP if compress else None))
+
+        ParallelUploader(con=self.con, streams=self.streams, reporter=self.reporter).upload_chunks(chunks)
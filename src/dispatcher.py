@@ -0,0 +1,200 @@
+import json
+import shlex
+from typing import Dict, List, TYPE_CHECKING
+from .pool import sftp_of
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+QUEUE_DIR = '.queue'  # in the remote root dir
+DISPATCHER_FILE = f'{QUEUE_DIR}/dispatcher_v4.py'  # bump the version whenever DISPATCHER changes
+NO_DISPATCHER_EXIT = 3  # exit code of the launch command when the dispatcher is not installed yet
+DISPATCHER = r'''
+"""
+FIFO job queue of RNAapp with a thread budget, python3 standard library only
+
+    .queue/budget         the number of threads that all running jobs may use, default: nproc
+    .queue/pending/*.json jobs waiting, named by submission time
+    .queue/running/*.json jobs running, removed by the job itself when it exits
+    {outdir}/.exit_code   empty while the job runs, its exit code once it exits, so a job killed with the server stays empty
+
+    python3 dispatcher.py enqueue < job.json    queue a job, print its position (0 = running)
+    python3 dispatcher.py daemon                keep dispatching until the queue has been idle for a while
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import subprocess
+
+QUEUE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(QUEUE_DIR)
+PENDING = os.path.join(QUEUE_DIR, 'pending')
+RUNNING = os.path.join(QUEUE_DIR, 'running')
+INTERVAL = 5  # seconds
+MAX_IDLE = 600  # seconds
+STALE_AFTER = 60  # seconds, a running job without its screen session is considered dead
+EXIT_CODE_FILE = '.exit_code'
+
+
+def budget():
+    try:
+        with open(os.path.join(QUEUE_DIR, 'budget')) as fh:
+            return int(fh.read().strip())
+    except (OSError, ValueError):
+        return os.cpu_count() or 1
+
+
+def load(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def jobs_in(d):
+    """
+    Sorted names of the job files, without the *.json.tmp still being written by enqueue()
+    """
+    return sorted(name for name in os.listdir(d) if name.endswith('.json'))
+
+
+def screen_sessions():
+    out = subprocess.run(['screen', '-ls'], stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return {line.split()[0].split('.', 1)[-1] for line in out.splitlines() if line.startswith('\t')}
+
+
+def running_threads():
+    sessions = screen_sessions()
+    used = 0
+    for name in jobs_in(RUNNING):
+        path = os.path.join(RUNNING, name)
+        try:
+            job = load(path)
+            if job['name'] not in sessions and time.time() - os.path.getmtime(path) > STALE_AFTER:
+                os.remove(path)  # killed without cleaning up
+                continue
+        except (OSError, ValueError):
+            continue  # removed by its job meanwhile, which does not take the lock
+        used += job['threads']
+    return used
+
+
+def dispatch():
+    with open(os.path.join(QUEUE_DIR, 'dispatch.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        used = running_threads()
+        for name in jobs_in(PENDING):
+            try:
+                job = load(os.path.join(PENDING, name))
+            except (OSError, ValueError):
+                continue  # unreadable, never dispatched, rather than the daemon dying
+            if used > 0 and used + job['threads'] > budget():
+                break  # strictly FIFO, the head of the queue blocks the rest
+            marker = os.path.join(RUNNING, name)
+            os.rename(os.path.join(PENDING, name), marker)
+            os.utime(marker)
+            exit_code = os.path.join(os.path.dirname(job['cmd_txt']), EXIT_CODE_FILE)
+            # pipefail, or the exit code would be the one of tee
+            script = f'cd "{ROOT}" && : > "{exit_code}" && bash -o pipefail "{job["cmd_txt"]}"; ' \
+                     f'echo $? > "{exit_code}"; rm -f "{marker}"'
+            subprocess.call(['screen', '-dm', '-S', job['name'], 'bash', '-c', script])
+            used += job['threads']
+
+
+def position(name):
+    """
+    0 also once the job has exited, which a short job may do before its position is asked
+    """
+    pending = jobs_in(PENDING)
+    if name not in pending:
+        return 0
+    return pending.index(name) + 1
+
+
+def enqueue():
+    job = json.load(sys.stdin)
+    name = f'{time.time_ns()}-{job["name"]}.json'
+    with open(os.path.join(PENDING, name + '.tmp'), 'w') as fh:
+        json.dump(job, fh)
+    os.rename(os.path.join(PENDING, name + '.tmp'), os.path.join(PENDING, name))
+    dispatch()
+    subprocess.call(['screen', '-dm', '-S', 'rnaapp_dispatcher', sys.executable, os.path.abspath(__file__), 'daemon'])
+    print(json.dumps({'name': job['name'], 'position': position(name)}), flush=True)
+
+
+def daemon():
+    with open(os.path.join(QUEUE_DIR, 'daemon.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return  # another daemon is running
+        idle = 0
+        while idle < MAX_IDLE:
+            dispatch()
+            busy = len(jobs_in(PENDING)) + len(jobs_in(RUNNING)) > 0
+            idle = 0 if busy else idle + INTERVAL
+            time.sleep(INTERVAL)
+
+
+if __name__ == '__main__':
+    for d in [PENDING, RUNNING]:
+        os.makedirs(d, exist_ok=True)
+    {'enqueue': enqueue, 'daemon': daemon}[sys.argv[1]]()
+'''
+
+
+def install_dispatcher(con: 'Connection', remote_root: str):
+    """
+    Only uploaded once per server, DISPATCHER_FILE is versioned
+    """
+    path = f'{remote_root}/{DISPATCHER_FILE}'
+    with sftp_of(con) as sftp:
+        try:
+            sftp.stat(path)
+            return
+        except IOError:
+            pass
+        con.run(f'mkdir -p "{remote_root}/{QUEUE_DIR}"', hide=True)
+        with sftp.open(f'{path}.tmp', 'w') as fh:
+            fh.write(DISPATCHER)
+        sftp.posix_rename(f'{path}.tmp', path)
+
+
+def enqueue_cmd(job_name: str, threads: int, cmd_txt: str) -> str:
+    """
+    Run in the remote root dir, cmd_txt is relative to the remote root dir
+    """
+    job = json.dumps({'name': job_name, 'threads': threads, 'cmd_txt': cmd_txt})
+    return f'echo {shlex.quote(job)} | python3 "{DISPATCHER_FILE}" enqueue'
+
+
+def launch(con: 'Connection', remote_root: str, enqueue_cmds: List[str]) -> str:
+    """
+    Enqueues all jobs in one remote exec, and returns its stdout for parse_positions()
+
+    Whether the dispatcher is installed is checked by the same exec,
+    so only the first launch on a server takes the extra round trips to install it
+    """
+    cmd = f'cd "{remote_root}" || exit 1; ' \
+          f'[ -f "{DISPATCHER_FILE}" ] || exit {NO_DISPATCHER_EXIT}; ' \
+          + ' && '.join(enqueue_cmds)
+    result = con.run(cmd, hide=True, warn=True)
+    if result.exited == NO_DISPATCHER_EXIT:
+        install_dispatcher(con=con, remote_root=remote_root)
+        result = con.run(cmd, hide=True, warn=True)
+    if result.exited != 0:
+        raise IOError(f'Failed to launch the jobs:\n{result.stderr}')
+    return result.stdout
+
+
+def parse_positions(stdout: str) -> Dict[str, int]:
+    """
+    {job_name: queue position}, 0 means running
+    """
+    ret = {}
+    for line in stdout.splitlines():
+        line = line.strip()
+        if line.startswith('{'):
+            d = json.loads(line)
+            ret[d['name']] = d['position']
+    return ret
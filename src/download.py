@@ -0,0 +1,143 @@
+import os
+import queue
+import threading
+from os.path import exists, getsize, dirname
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+from .reporter import Reporter, Cancelled
+from .store import HashCache
+from .helper import run_helper
+from .transfer import TransferMeter
+from .constants import LOCAL_ROOT_DIR
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+HASH_CACHE_FILE = f'{LOCAL_ROOT_DIR}/download_hash_cache.json'  # of the downloaded results, kept apart from the inputs
+
+
+class RemoteFile:
+
+    rel_path: str
+    size: int
+    sha256: str
+
+    def __init__(self, rel_path: str, size: int, sha256: str):
+        self.rel_path = rel_path
+        self.size = size
+        self.sha256 = sha256
+
+
+class ResultDownloader:
+    """
+    Downloads a remote outdir with a manifest of sizes and sha256 built on the server in one round trip
+
+    - Local files with a matching sha256 are skipped
+    - Files are downloaded over several SFTP streams in parallel, into {file}.part
+    - A .part left by an interrupted download is resumed from its size, then verified against the manifest
+    """
+
+    BLOCK_SIZE = 32768
+
+    con: 'Connection'
+    streams: int
+    reporter: Reporter
+    hash_cache: HashCache
+
+    files: queue.Queue
+    errors: List[BaseException]
+    stop: threading.Event
+
+    def __init__(self, con: 'Connection', streams: int = 4, reporter: Optional[Reporter] = None):
+        self.con = con
+        self.streams = max(1, streams)
+        self.reporter = Reporter() if reporter is None else reporter
+        self.hash_cache = HashCache(file=HASH_CACHE_FILE)
+
+    def download(self, remote_dir: str, local_dir: str, excludes: List[str]) -> Dict[str, Any]:
+        self.reporter.message(f'Listing "{remote_dir}"')
+        manifest = [
+            RemoteFile(rel_path=rel, size=size, sha256=sha)
+            for rel, size, sha in run_helper(
+                con=self.con, command='manifest', request={'dir': remote_dir, 'excludes': excludes})['files']
+        ]
+
+        to_download = [f for f in manifest if not self.is_up_to_date(f=f, local_dir=local_dir)]
+        self.hash_cache.flush()
+        self.reporter.message(f'{len(manifest) - len(to_download)} of {len(manifest)} files are up to date')
+
+        self.files = queue.Queue()
+        self.errors = []
+        self.stop = threading.Event()
+        for f in sorted(to_download, key=lambda f: -f.size):  # largest first
+            self.files.put(f)
+
+        threads = [
+            threading.Thread(target=self.run_stream, args=(remote_dir, local_dir), daemon=True)
+            for _ in range(min(self.streams, len(to_download)))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.hash_cache.flush()
+
+        if len(self.errors) > 0:
+            raise self.errors[0]
+
+        return {
+            'files': len(manifest),
+            'downloaded': len(to_download),
+            'bytes': sum(f.size for f in to_download),
+        }
+
+    def is_up_to_date(self, f: RemoteFile, local_dir: str) -> bool:
+        path = f'{local_dir}/{f.rel_path}'
+        return exists(path) \
+            and getsize(path) == f.size \
+            and self.hash_cache.sha256(path=path, reporter=self.reporter) == f.sha256
+
+    def run_stream(self, remote_dir: str, local_dir: str):
+        sftp = self.con.client.open_sftp()  # a new channel on the same transport
+        try:
+            while not self.stop.is_set():
+                try:
+                    f = self.files.get_nowait()
+                except queue.Empty:
+                    return
+                self.get(sftp=sftp, f=f, remote_dir=remote_dir, local_dir=local_dir)
+        except BaseException as e:
+            self.errors.append(e)
+            self.stop.set()
+        finally:
+            sftp.close()
+
+    def get(self, sftp, f: RemoteFile, remote_dir: str, local_dir: str):
+        path = f'{local_dir}/{f.rel_path}'
+        part = f'{path}.part'
+        os.makedirs(dirname(path), exist_ok=True)
+
+        offset = getsize(part) if exists(part) else 0
+        if offset > f.size:  # not a prefix of this file
+            offset = 0
+        if offset > 0:
+            self.reporter.message(f'Resuming "{f.rel_path}" from {offset / 1e6:,.1f} MB')
+
+        meter = TransferMeter(name=f.rel_path, total=f.size, reporter=self.reporter)
+        meter.add(offset)
+        with sftp.open(f'{remote_dir}/{f.rel_path}', 'rb') as src:
+            src.seek(offset)
+            src.prefetch(f.size)  # pipelined reads from the current offset
+            with open(part, 'ab' if offset > 0 else 'wb') as dst:
+                while True:
+                    if self.stop.is_set():
+                        raise Cancelled()
+                    data = src.read(self.BLOCK_SIZE)
+                    if len(data) == 0:
+                        break
+                    dst.write(data)
+                    meter.add(len(data))
+
+        os.replace(part, path)
+        if self.hash_cache.sha256(path=path, reporter=self.reporter) != f.sha256:
+            os.remove(path)
+            raise IOError(f'Checksum mismatch of "{f.rel_path}", please download again')
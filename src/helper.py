@@ -0,0 +1,404 @@
+import json
+import shlex
+from typing import Any, Dict, TYPE_CHECKING
+from .timing import Timing
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+HELPER = r'''
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import zlib
+import shutil
+import fnmatch
+import select
+import hashlib
+import subprocess
+
+MIN_BLOCK = 2 ** 20
+MAX_BLOCK = 8 * 2 ** 20
+MAX_LINE = 2 ** 16
+CUT_MASK = 63
+EXIT_CODE_FILE = '.exit_code'  # written by the dispatcher
+IDLE_STAGING = 60  # seconds without a block written, after which a staging dir is taken over
+
+
+def cdc_blocks(path, on_block=None):
+    """
+    Content-defined, line-aligned blocks [[offset, length, sha256], ...]
+
+    A block ends after a line whose crc32 & CUT_MASK == 0 once the block is at least MIN_BLOCK,
+    so inserting or deleting rows only changes the blocks around them, the later blocks are not shifted
+    """
+    blocks = []
+    offset, buf = 0, bytearray()
+    with open(path, 'rb') as fh:
+        for line in iter(lambda: fh.readline(MAX_LINE), b''):
+            buf += line
+            if (len(buf) >= MIN_BLOCK and zlib.crc32(line) & CUT_MASK == 0) or len(buf) >= MAX_BLOCK:
+                blocks.append([offset, len(buf), hashlib.sha256(buf).hexdigest()])
+                offset, buf = offset + len(buf), bytearray()
+                if on_block is not None:
+                    on_block(offset)
+    if len(buf) > 0:
+        blocks.append([offset, len(buf), hashlib.sha256(buf).hexdigest()])
+    return blocks
+
+
+def plan(request):
+    staging = request['staging']
+    if request['resume_from'] is not None and not os.path.isdir(staging):
+        for other in glob.glob(request['resume_from']):
+            if time.time() - os.path.getmtime(other) < IDLE_STAGING:
+                continue  # a concurrent upload is still writing to it
+            try:
+                os.rename(other, staging)
+                break
+            except OSError:
+                continue  # taken over by another upload first
+    os.makedirs(staging, exist_ok=True)
+
+    basis = {}
+    if request['basis'] is not None and os.path.isfile(request['basis']):
+        for offset, length, sha in cdc_blocks(request['basis']):
+            basis.setdefault(sha, offset)
+
+    from_basis = {}
+    for i, (offset, length, sha) in enumerate(request['blocks']):
+        if sha in basis:
+            from_basis[str(i)] = basis[sha]
+
+    staged = [int(n.split('.')[0]) for n in os.listdir(staging) if not n.endswith('.tmp')]
+    return {'from_basis': from_basis, 'staged': staged}
+
+
+def read_staged(staging, i):
+    for name, decompress in [(str(i), None), (f'{i}.gz', gzip.decompress)]:
+        path = f'{staging}/{name}'
+        if os.path.isfile(path):
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            return data if decompress is None else decompress(data)
+    return None
+
+
+def assemble(request):
+    staging, target, from_basis = request['staging'], request['target'], request['from_basis']
+    bad = []
+    with open(target, 'wb') as out:
+        for i, (offset, length, sha) in enumerate(request['blocks']):
+            if str(i) in from_basis:
+                with open(request['basis'], 'rb') as fh:
+                    fh.seek(from_basis[str(i)])
+                    data = fh.read(length)
+            else:
+                data = read_staged(staging, i)
+            if data is None or hashlib.sha256(data).hexdigest() != sha:
+                bad.append(i)
+                for name in [str(i), f'{i}.gz']:
+                    if os.path.isfile(f'{staging}/{name}'):
+                        os.remove(f'{staging}/{name}')
+                continue
+            out.write(data)
+    if len(bad) > 0:
+        os.remove(target)
+    else:
+        shutil.rmtree(staging)
+    return {'bad': bad}
+
+
+def sha256_of(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(MAX_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def manifest(request):
+    """
+    [[relative path, size, sha256], ...] of the files in the dir, except the excluded glob patterns
+    """
+    root = request['dir']
+    ret = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root)
+            if any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel, p) for p in request['excludes']):
+                continue
+            ret.append([rel, os.path.getsize(path), sha256_of(path)])
+    return {'files': ret}
+
+
+def screen_sessions():
+    try:
+        out = subprocess.run(['screen', '-ls'], stdout=subprocess.PIPE, universal_newlines=True).stdout
+    except OSError:
+        return set()
+    return {line.split()[0].split('.', 1)[-1] for line in out.splitlines() if line.startswith('\t')}
+
+
+def progress_failed(path):
+    with open(path, 'rb') as fh:
+        fh.seek(max(0, os.path.getsize(path) - 2 ** 14))
+        tail = fh.read().decode('utf-8', errors='replace')
+    return 'Traceback (most recent call last)' in tail
+
+
+def exit_code(outdir):
+    """
+    None if the job was dispatched before exit codes were recorded
+    The file stays empty if the job never exited by itself, e.g. killed with the server, which counts as failed
+    """
+    path = os.path.join(outdir, EXIT_CODE_FILE)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as fh:
+            return int(fh.read().strip())
+    except (OSError, ValueError):
+        return -1
+
+
+def job_status(request):
+    """
+    {outdir: {status, progress_size, progress_mtime, outputs}} of the jobs [[outdir, job_name], ...]
+    """
+    pending_dir = os.path.join(request['root'], '.queue', 'pending')
+    pending = set()
+    for name in (os.listdir(pending_dir) if os.path.isdir(pending_dir) else []):
+        try:
+            with open(os.path.join(pending_dir, name)) as fh:
+                pending.add(json.load(fh)['name'])
+        except (OSError, ValueError, KeyError):
+            pass  # dispatched meanwhile
+    sessions = screen_sessions()
+
+    ret = {}
+    for outdir, job_name in request['jobs']:
+        progress = os.path.join(outdir, 'progress.txt')
+        has_progress = os.path.isfile(progress)
+        if job_name in sessions:
+            status = 'running'
+        elif job_name in pending:
+            status = 'queued'
+        elif not os.path.isdir(outdir):
+            status = 'missing'
+        elif exit_code(outdir) not in [None, 0] or not has_progress or progress_failed(progress):
+            status = 'failed'
+        else:
+            status = 'finished'
+        ret[outdir] = {
+            'status': status,
+            'progress_size': os.path.getsize(progress) if has_progress else 0,
+            'progress_mtime': os.path.getmtime(progress) if has_progress else 0,
+            'outputs': len(os.listdir(outdir)) if os.path.isdir(outdir) else 0,
+        }
+    return {'jobs': ret}
+
+
+def inotify_waiter(dirs):
+    """
+    wait(timeout) which returns as soon as anything is created, moved or deleted in the dirs,
+    None if inotify is not available
+    """
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = 0x40 | 0x80 | 0x100 | 0x200  # IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    for d in dirs:
+        if os.path.isdir(d):
+            libc.inotify_add_watch(fd, d.encode(), mask)
+
+    def wait(timeout):
+        if len(select.select([fd], [], [], timeout)[0]) > 0:
+            time.sleep(0.5)  # a burst of events, e.g. dispatching several jobs, wakes up once
+            try:
+                while os.read(fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+    return wait
+
+
+WATCH_MIN_INTERVAL = 2
+WATCH_MAX_INTERVAL = 60
+
+
+def watch(request):
+    """
+    Prints a line of JSON whenever the status of a job changes, until none of the jobs is queued or running
+
+    A job starts by moving its marker from .queue/pending to .queue/running and ends by deleting it,
+    so inotify on those dirs wakes up exactly when it matters
+    Without inotify, polls with an interval doubling up to WATCH_MAX_INTERVAL while nothing changes
+    """
+    queue_dir = os.path.join(request['root'], '.queue')
+    wait = inotify_waiter([os.path.join(queue_dir, 'pending'), os.path.join(queue_dir, 'running')])
+    interval = WATCH_MIN_INTERVAL
+    last = {}
+    while True:
+        changed = False
+        for outdir, s in job_status(request)['jobs'].items():
+            if s['status'] != last.get(outdir):
+                last[outdir] = s['status']
+                changed = True
+                print(json.dumps(dict(s, outdir=outdir)), flush=True)
+        request['jobs'] = [j for j in request['jobs'] if last[j[0]] in ['queued', 'running']]
+        if len(request['jobs']) == 0:
+            return {}
+
+        if wait is not None:
+            wait(WATCH_MAX_INTERVAL)  # the timeout catches jobs killed without cleaning up
+        else:
+            interval = WATCH_MIN_INTERVAL if changed else min(interval * 2, WATCH_MAX_INTERVAL)
+            time.sleep(interval)
+        print('', flush=True)  # heartbeat, exits by broken pipe once the app has gone
+
+
+def listing(request):
+    """
+    {outdir: {status, files: [[relative path, size, mtime], ...]}} of the jobs [[outdir, job_name], ...],
+    one call covers every job of a sync cycle, nothing is hashed
+    """
+    statuses = job_status(request)['jobs']
+    ret = {}
+    for outdir, _ in request['jobs']:
+        files = []
+        for dirpath, dirnames, filenames in os.walk(outdir):
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, outdir)
+                if any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel, p) for p in request['excludes']):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # removed meanwhile, e.g. a temp file of the job
+                files.append([rel, st.st_size, st.st_mtime])
+        ret[outdir] = {'status': statuses[outdir]['status'], 'files': files}
+    return {'jobs': ret}
+
+
+def probe(request):
+    """
+    Resources of the server for choosing a host and sizing a job
+    """
+    mem_total, mem_available = 0, 0
+    try:
+        with open('/proc/meminfo') as fh:
+            for line in fh:
+                key, val = line.split(':', 1)
+                if key == 'MemTotal':
+                    mem_total = int(val.split()[0]) * 1024
+                elif key == 'MemAvailable':
+                    mem_available = int(val.split()[0]) * 1024
+    except OSError:
+        pass
+    root = request['root']
+    os.makedirs(root, exist_ok=True)
+    queue_dir = os.path.join(root, '.queue')
+    counts = {
+        d: len(os.listdir(os.path.join(queue_dir, d))) if os.path.isdir(os.path.join(queue_dir, d)) else 0
+        for d in ['pending', 'running']
+    }
+    return {
+        'cpus': os.cpu_count() or 1,
+        'load': os.getloadavg()[0],
+        'mem_total': mem_total,
+        'mem_available': mem_available,
+        'disk_free': shutil.disk_usage(root).free,
+        'running': counts['running'],
+        'pending': counts['pending'],
+    }
+
+
+def previous_run(request):
+    """
+    [outdir, ...] of the latest finished run of each [fingerprint, outdir] in request['jobs'],
+    None if never run, not finished or failed
+    Only a run whose exit code was recorded as 0 counts, so neither a killed one nor one of an older dispatcher
+    A run in the outdir itself is skipped, it is about to be overwritten
+    """
+    outdirs = []
+    for fingerprint, skipped in request['jobs']:
+        entries = []
+        results = os.path.join(request['root'], '.results')
+        for index in [fingerprint + '.json', fingerprint + '.jsonl']:  # the single entry of older versions first
+            try:
+                with open(os.path.join(results, index)) as fh:
+                    entries += [json.loads(line) for line in fh.read().splitlines() if line.strip() != '']
+            except (OSError, ValueError):
+                pass
+
+        found = None
+        for entry in reversed(entries):  # latest first
+            outdir = entry['outdir']
+            if outdir == skipped:
+                continue
+            status = job_status({'root': request['root'], 'jobs': [[outdir, entry['job_name']]]})['jobs'][outdir]
+            if status['status'] == 'finished' and exit_code(outdir) == 0:
+                found = outdir
+                break
+        outdirs.append(found)
+    return {'outdirs': outdirs}
+
+
+if __name__ == '__main__':
+    request = json.load(sys.stdin)
+    commands = {
+        'plan': plan,
+        'assemble': assemble,
+        'manifest': manifest,
+        'job_status': job_status,
+        'watch': watch,
+        'listing': listing,
+        'probe': probe,
+        'previous_run': previous_run,
+    }
+    response = commands[sys.argv[1]](request)
+    json.dump(response, sys.stdout)
+'''
+
+
+# The very same source runs locally, so both sides always cut blocks identically
+_namespace = {'__name__': 'rnaapp_helper'}
+exec(HELPER, _namespace)
+cdc_blocks = _namespace['cdc_blocks']
+
+
+def run_helper(
+        con: 'Connection',
+        command: str,
+        request: Dict[str, Any],
+        timing: Timing = Timing()) -> Dict[str, Any]:
+    """
+    The helper only needs the python3 standard library on the server, nothing is installed
+
+    The request is sent on a channel of its own rather than by con.run(in_stream=...),
+    which feeds stdin a few bytes at a time, and takes minutes for the block list of a large file
+    """
+    with timing.span(f'helper {command}', kind='command'):
+        channel = con.client.get_transport().open_session()
+        try:
+            channel.exec_command(f'python3 -c {shlex.quote(HELPER)} {command}')
+            channel.sendall(json.dumps(request).encode())
+            channel.shutdown_write()
+            stdout = channel.makefile('rb').read()
+            stderr = channel.makefile_stderr('rb').read()
+            if channel.recv_exit_status() != 0:
+                raise IOError(f'Helper "{command}" failed on the server:\n{stderr.decode(errors="replace")}')
+        finally:
+            channel.close()
+    return json.loads(stdout)
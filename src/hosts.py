@@ -0,0 +1,129 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Any, Optional
+from .reporter import Reporter
+from .timing import Timing
+from .helper import run_helper
+from .constants import remote_root_of
+from .pool import POOL
+
+
+HOST_SEPARATOR = ','  # the Host field may hold a pool of servers, e.g. "10.0.0.1, 10.0.0.2"
+
+
+class HostProbe:
+
+    host: str
+    cpus: int
+    load: float
+    mem_total: int
+    mem_available: int
+    disk_free: int
+    running: int
+    pending: int
+    probed_at: float
+
+    def __init__(self, host: str, probe: Dict[str, Any]):
+        self.host = host
+        self.cpus = probe['cpus']
+        self.load = probe['load']
+        self.mem_total = probe['mem_total']
+        self.mem_available = probe['mem_available']
+        self.disk_free = probe['disk_free']
+        self.running = probe['running']
+        self.pending = probe['pending']
+        self.probed_at = time.time()
+
+    def free_cpus(self) -> float:
+        return max(0., self.cpus - self.load)
+
+    def rank_key(self) -> Tuple[int, int, float, int]:
+        """
+        The smaller the better: no queue first, then the fewest jobs running,
+        because the load average lags behind a job which has just started,
+        then the most idle CPUs, then the most free memory
+        """
+        return self.pending, self.running, -self.free_cpus(), -self.mem_available
+
+    def summary(self) -> str:
+        return f'{self.free_cpus():.1f} of {self.cpus} CPUs idle, ' \
+               f'{self.mem_available / 1e9:.1f} GB memory and {self.disk_free / 1e9:.1f} GB disk free, ' \
+               f'{self.running} jobs running, {self.pending} queued'
+
+
+class ProbeCache:
+    """
+    Probes younger than ttl are reused, so a batch of submissions does not probe every host every time
+    """
+
+    ttl: float
+    probes: Dict[Tuple[str, str, int], HostProbe]
+    lock: threading.Lock
+
+    def __init__(self, ttl: float = 60.):
+        self.ttl = ttl
+        self.probes = {}
+        self.lock = threading.Lock()
+
+    def get(self, host: str, user: str, port: int) -> Optional[HostProbe]:
+        with self.lock:
+            probe = self.probes.get((host, user, int(port)))
+        if probe is None or time.time() - probe.probed_at > self.ttl:
+            return None
+        return probe
+
+    def put(self, user: str, port: int, probe: HostProbe):
+        with self.lock:
+            self.probes[(probe.host, user, int(port))] = probe
+
+
+PROBE_CACHE = ProbeCache()
+
+
+def split_hosts(host_field: str) -> List[str]:
+    return [h.strip() for h in host_field.split(HOST_SEPARATOR) if h.strip() != '']
+
+
+def probe_host(host: str, user: str, port: int, password: str = '', timing: Timing = Timing()) -> HostProbe:
+    probe = PROBE_CACHE.get(host=host, user=user, port=port)
+    if probe is None:
+        with POOL.connection(host=host, user=user, port=port, password=password, timing=timing) as con:
+            probe = HostProbe(host=host, probe=run_helper(con=con, command='probe', request={
+                'root': remote_root_of(user),
+            }, timing=timing))
+        PROBE_CACHE.put(user=user, port=port, probe=probe)
+    return probe
+
+
+def choose_host(ssh_key_values: Dict[str, str], password: str, reporter: Optional[Reporter] = None) -> Dict[str, str]:
+    """
+    Returns a copy of ssh_key_values with a single Host, the best one of the pool
+    All the hosts of the pool are probed at once, with the same user, port and password
+    """
+    reporter = Reporter() if reporter is None else reporter
+    hosts = split_hosts(ssh_key_values['Host'])
+    if len(hosts) == 1:
+        return dict(ssh_key_values, Host=hosts[0])
+
+    user, port = ssh_key_values['User'], int(ssh_key_values['Port'])
+    reporter.message(f'Probing {len(hosts)} hosts')
+    with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+        futures = {
+            host: executor.submit(
+                probe_host, host=host, user=user, port=port, password=password, timing=reporter.timing)
+            for host in hosts
+        }
+
+    probes, errors = [], []
+    for host, future in futures.items():
+        try:
+            probes.append(future.result())
+        except Exception as e:
+            errors.append(f'{host}: {e!r}')
+    if len(probes) == 0:
+        raise ConnectionError('None of the hosts is reachable\n' + '\n'.join(errors))
+
+    best = min(probes, key=HostProbe.rank_key)
+    reporter.message(f'Dispatching to {best.host}: {best.summary()}')
+    return dict(ssh_key_values, Host=best.host)
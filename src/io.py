@@ -1,5 +1,5 @@
 import csv
-from typing import Dict, Union
+from typing import Dict, Union, List
 
 
 class IO:
@@ -44,6 +44,24 @@ class IO:
                 ret[key] = val
         return ret
 
+    def read_table(self, file: str) -> List[Dict[str, str]]:
+        """
+        A sheet with a header row of keys and one row of values per job
+        """
+        if file.endswith('.tsv') or file.endswith('.tab'):
+            delimiter = '\t'
+        elif file.endswith('.csv'):
+            delimiter = ','
+        else:
+            raise ValueError(f'Unknown file type: {file}')
+
+        with open(file, newline='') as fh:
+            reader = csv.DictReader(fh, delimiter=delimiter)
+            return [
+                {key.strip(): val.strip() for key, val in row.items() if key is not None and val is not None}
+                for row in reader
+            ]
+
     def write(self,
               parameters: Dict[str, Union[str, bool]],
               file: str):
@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import threading
+from os.path import exists, dirname, isdir, isfile, join
+from typing import Dict, List, Any, Tuple, Optional, TYPE_CHECKING
+from .reporter import Reporter
+from .store import InputStore, HashCache
+from .schema import version_key
+from .constants import LOCAL_ROOT_DIR
+from .pool import sftp_of
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+LIBRARY_DIR = '.library'  # in the remote root dir, {organism}/{kind}/{version}/{name}
+INDEX_FILE = 'index.json'  # in the library dir, every entry with its sha256
+LIBRARY_PREFIX = 'library:'  # in place of a local path, e.g. library:human/gene-sets-gmt/2024.1/h.all.gmt
+KINDS = ['gene-info-table', 'gene-sets-gmt']
+PART = re.compile(r'^[\w][\w.+-]*$')  # no '/' or '..' in any part of a reference
+
+
+Entry = Dict[str, Any]  # {'organism': str, 'kind': str, 'version': str, 'name': str, 'sha256': str, 'bytes': int}
+
+
+def is_library_ref(path: str) -> bool:
+    return path.startswith(LIBRARY_PREFIX)
+
+
+def ref_of(entry: Entry) -> str:
+    return f'{LIBRARY_PREFIX}{entry["organism"]}/{entry["kind"]}/{entry["version"]}/{entry["name"]}'
+
+
+def parse_ref(ref: str) -> Tuple[str, str, str, str]:
+    """
+    Returns (organism, kind, version, name)
+    """
+    parts = ref[len(LIBRARY_PREFIX):].split('/')
+    if not is_library_ref(ref) or len(parts) != 4 or not all(PART.match(p) for p in parts) or parts[1] not in KINDS:
+        raise ValueError(f'Invalid library reference "{ref}", should be {LIBRARY_PREFIX}organism/kind/version/name')
+    organism, kind, version, name = parts
+    return organism, kind, version, name
+
+
+def library_path_of(ref: str) -> str:
+    """
+    Relative to the remote root dir, in which jobs run
+    """
+    return f'{LIBRARY_DIR}/' + '/'.join(parse_ref(ref))
+
+
+def list_library(con: 'Connection', remote_root: str) -> List[Entry]:
+    stdout = con.run(f'cat "{remote_root}/{LIBRARY_DIR}/{INDEX_FILE}" 2>/dev/null || echo "[]"', hide=True).stdout
+    return json.loads(stdout)
+
+
+def scan_local_library(local_dir: str) -> List[Tuple[Entry, str]]:
+    """
+    The local library mirrors the remote one: {local_dir}/{organism}/{kind}/{version}/{file}
+    Returns [(entry without sha256, local path), ...]
+    Gzipped files are decompressed on the server, so their entries are named without .gz
+    """
+    ret = []
+    for organism in sorted(os.listdir(local_dir)):
+        for kind in KINDS:
+            kind_dir = join(local_dir, organism, kind)
+            if not isdir(kind_dir):
+                continue
+            for version in sorted(os.listdir(kind_dir)):
+                version_dir = join(kind_dir, version)
+                for file in sorted(os.listdir(version_dir)) if isdir(version_dir) else []:
+                    path = join(version_dir, file)
+                    if not isfile(path) or file.startswith('.'):
+                        continue
+                    name = file[:-len('.gz')] if file.endswith('.gz') else file
+                    entry = {'organism': organism, 'kind': kind, 'version': version, 'name': name}
+                    parse_ref(ref_of(entry))  # every part is a valid path component
+                    ret.append((entry, path))
+    return ret
+
+
+class LibrarySync:
+    """
+    Pushes the versions of a local library which are not on the server yet
+
+    Files go through the input store, so content already on the server is never transferred again,
+    and each library file is a hard link of .store/{sha256}, which is its checksum
+    A version is never changed once pushed, a different file under an existing version is an error
+    """
+
+    con: 'Connection'
+    remote_root: str
+    local_dir: str
+    streams: int
+    reporter: Reporter
+
+    def __init__(
+            self,
+            con: 'Connection',
+            remote_root: str,
+            local_dir: str,
+            streams: int = 4,
+            reporter: Optional[Reporter] = None):
+
+        self.con = con
+        self.remote_root = remote_root
+        self.local_dir = local_dir
+        self.streams = streams
+        self.reporter = Reporter() if reporter is None else reporter
+
+    def main(self) -> List[Entry]:
+        """
+        Returns every entry on the server after the sync
+        """
+        remote = {ref_of(e): e for e in list_library(con=self.con, remote_root=self.remote_root)}
+        hash_cache = HashCache()
+
+        new = []
+        for entry, local_path in scan_local_library(self.local_dir):
+            entry = dict(entry, sha256=hash_cache.sha256(path=local_path, reporter=self.reporter))
+            ref = ref_of(entry)
+            existing = remote.get(ref)
+            if existing is None:
+                new.append((entry, local_path))
+            elif existing['sha256'] != entry['sha256']:
+                raise ValueError(
+                    f'"{local_path}" differs from {ref} on the server, versions are never changed, add a new version')
+        hash_cache.flush()
+
+        if len(new) == 0:
+            self.reporter.message('The library on the server is up to date')
+            return sorted(remote.values(), key=ref_of)
+
+        self.reporter.message(f'Pushing {len(new)} new library files')
+        InputStore(
+            con=self.con,
+            remote_root=self.remote_root,
+            streams=self.streams,
+            reporter=self.reporter
+        ).put([(local_path, f'{self.remote_root}/{library_path_of(ref_of(entry))}') for entry, local_path in new])
+
+        with sftp_of(self.con) as sftp:
+            for entry, _ in new:
+                remote[ref_of(entry)] = dict(entry, bytes=sftp.stat(
+                    f'{self.remote_root}/{library_path_of(ref_of(entry))}').st_size)
+        entries = sorted(remote.values(), key=ref_of)
+        self.write_index(entries)
+        return entries
+
+    def write_index(self, entries: List[Entry]):
+        """
+        Written aside and renamed, so a listing never reads a half-written index
+        """
+        index = f'{self.remote_root}/{LIBRARY_DIR}/{INDEX_FILE}'
+        with sftp_of(self.con) as sftp, sftp.open(f'{index}.tmp', 'wb') as fh:
+            fh.write(json.dumps(entries, indent=1).encode())
+        self.con.run(f'mv -f "{index}.tmp" "{index}"', hide=True)
+
+
+class LibraryCache:
+    """
+    The library entries of each host, so the picker is filled without a round trip
+    Refreshed by every sync and discovery
+    """
+
+    FILE = f'{LOCAL_ROOT_DIR}/library.json'
+
+    file: str
+    cache: Dict[str, List[Entry]]  # {host: entries}
+    lock: threading.Lock
+
+    def __init__(self, file: str = FILE):
+        self.file = file
+        self.cache = {}
+        self.lock = threading.Lock()
+        if exists(self.file):
+            try:
+                with open(self.file) as fh:
+                    self.cache = json.load(fh)
+            except ValueError:
+                pass  # rebuilt by the next sync or discovery
+
+    def refs(self, hosts: List[str], organism: str, kind: str) -> List[str]:
+        """
+        Of the entries on every host of the pool, the latest version first
+        """
+        per_host = [
+            {ref_of(e) for e in self.cache.get(h, []) if e['organism'] == organism and e['kind'] == kind}
+            for h in hosts
+        ]
+        common = set.intersection(*per_host) if len(per_host) > 0 else set()
+        return sorted(common, key=lambda r: version_key(parse_ref(r)[2]), reverse=True)
+
+    def put(self, host: str, entries: List[Entry]):
+        with self.lock:
+            self.cache[host] = entries
+            os.makedirs(dirname(self.file), exist_ok=True)
+            tmp = f'{self.file}.tmp'
+            with open(tmp, 'w') as fh:
+                json.dump(self.cache, fh)
+            os.replace(tmp, self.file)
+
@@ -0,0 +1,185 @@
+import os
+import json
+import threading
+from os.path import exists, dirname
+from typing import Dict, List, Any, Optional, TYPE_CHECKING
+from .reporter import Reporter, Cancelled
+from .helper import run_helper
+from .constants import remote_root_of, job_name_of
+from .pool import POOL
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+SNAPSHOT_FILE = '.rnaapp_snapshot.json'  # in the local mirror, {relative path: [size, mtime]} of the pulled files
+ACTIVE_STATUSES = ['queued', 'running']
+
+Snapshot = Dict[str, List[float]]
+
+
+class MirroredJob:
+
+    outdir: str
+    job_name: str
+    local_dir: str
+    snapshot: Snapshot  # as pulled
+    listed: Snapshot  # as listed by the previous cycle
+
+    def __init__(self, outdir: str, local_dir: str):
+        self.outdir = outdir
+        self.job_name = job_name_of(outdir)
+        self.local_dir = local_dir
+        self.snapshot = {}
+        self.listed = {}
+        path = f'{local_dir}/{SNAPSHOT_FILE}'
+        if exists(path):
+            try:
+                with open(path) as fh:
+                    self.snapshot = json.load(fh)
+            except ValueError:
+                pass  # everything is pulled again
+
+    def save_snapshot(self):
+        os.makedirs(self.local_dir, exist_ok=True)
+        path = f'{self.local_dir}/{SNAPSHOT_FILE}'
+        with open(f'{path}.tmp', 'w') as fh:
+            json.dump(self.snapshot, fh)
+        os.replace(f'{path}.tmp', path)
+
+
+class ResultMirror:
+    """
+    Pulls the new or changed result files of the running jobs of one host into local mirrors
+
+    Each cycle lists the outdirs of all the mirrored jobs in one helper call, with size and mtime only,
+    and compares them with the snapshots kept in the mirrors
+    While a job runs, a file is only pulled once it is unchanged between two cycles, so never half-written,
+    and once its screen session exits, everything left is pulled and the job is dropped
+    """
+
+    INTERVAL = 10.  # seconds
+    RETRY_MAX = 300.  # seconds
+
+    host: str
+    user: str
+    port: int
+    password: str
+    excludes: List[str]
+
+    jobs: Dict[str, MirroredJob]  # {remote outdir: MirroredJob}
+    lock: threading.Lock
+    closed: bool  # run() has returned, jobs added later would never be synced
+
+    def __init__(
+            self,
+            host: str,
+            user: str,
+            port: int,
+            password: str = '',
+            excludes: Optional[List[str]] = None):
+
+        self.host = host
+        self.user = user
+        self.port = port
+        self.password = password
+        self.excludes = [] if excludes is None else excludes
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def add(self, outdir: str, local_dir: str) -> bool:
+        """
+        outdir: absolute remote path
+        Returns False once closed, then a new ResultMirror is needed
+        """
+        with self.lock:
+            if self.closed:
+                return False
+            if outdir not in self.jobs:
+                self.jobs[outdir] = MirroredJob(outdir=outdir, local_dir=local_dir)
+            return True
+
+    def run(self, reporter: Reporter):
+        """
+        Emits {outdir, status, pulled, files} by reporter.data() for each job which pulled anything or has ended,
+        until no job is left or cancelled
+        """
+        backoff = self.INTERVAL
+        try:
+            while not reporter.is_cancelled():
+                with self.lock:
+                    jobs = list(self.jobs.values())
+                    if len(jobs) == 0:
+                        self.closed = True
+                        return
+                try:
+                    with POOL.connection(host=self.host, user=self.user, port=self.port, password=self.password) as con:
+                        for event in self.cycle(con=con, jobs=jobs, reporter=reporter):
+                            reporter.data(event)
+                    backoff = self.INTERVAL
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    reporter.message(f'Result sync of {self.host} failed ({e!r}), retrying in {backoff:.0f} s')
+                    backoff = min(backoff * 2, self.RETRY_MAX)
+                reporter.wait(backoff)
+        finally:
+            with self.lock:
+                self.closed = True
+
+    def cycle(self, con: 'Connection', jobs: List[MirroredJob], reporter: Reporter) -> List[Dict[str, Any]]:
+        listing = run_helper(con=con, command='listing', request={
+            'root': remote_root_of(self.user),
+            'jobs': [[j.outdir, j.job_name] for j in jobs],
+            'excludes': self.excludes,
+        })['jobs']
+
+        events = []
+        sftp = None  # a channel of its own, only opened if anything is to be pulled
+        try:
+            for job in jobs:
+                status, files = listing[job.outdir]['status'], listing[job.outdir]['files']
+                active = status in ACTIVE_STATUSES
+                listed = {rel: [size, mtime] for rel, size, mtime in files}
+                to_pull = to_pull_of(listed=listed, previous=job.listed, snapshot=job.snapshot, active=active)
+                job.listed = listed
+
+                if len(to_pull) > 0:
+                    sftp = con.client.open_sftp() if sftp is None else sftp
+                    try:
+                        for rel in to_pull:
+                            reporter.check_cancelled()
+                            self.pull(sftp=sftp, job=job, rel=rel)
+                            job.snapshot[rel] = listed[rel]
+                    finally:
+                        job.save_snapshot()
+
+                if len(to_pull) > 0 or not active:
+                    events.append({'outdir': job.outdir, 'status': status, 'pulled': to_pull, 'files': len(listed)})
+                if not active:
+                    with self.lock:
+                        self.jobs.pop(job.outdir, None)
+        finally:
+            if sftp is not None:
+                sftp.close()
+        return events
+
+    def pull(self, sftp, job: MirroredJob, rel: str):
+        """
+        Into {file}.part then renamed, so the mirror never shows a half-pulled file
+        """
+        path = f'{job.local_dir}/{rel}'
+        os.makedirs(dirname(path), exist_ok=True)
+        sftp.get(f'{job.outdir}/{rel}', f'{path}.part')
+        os.replace(f'{path}.part', path)
+
+
+def to_pull_of(listed: Snapshot, previous: Snapshot, snapshot: Snapshot, active: bool) -> List[str]:
+    """
+    New or changed since pulled, and while the job is active, also unchanged since the previous cycle
+    """
+    return [
+        rel for rel, stat in sorted(listed.items())
+        if snapshot.get(rel) != stat and (not active or previous.get(rel) == stat)
+    ]
+
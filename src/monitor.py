@@ -0,0 +1,106 @@
+import codecs
+import threading
+from typing import Dict, List
+from .reporter import Reporter
+from .pool import POOL
+
+
+PROGRESS_FILE = 'progress.txt'  # in the outdir, written by `tee` of the rna_cmd
+
+
+class TailedFile:
+
+    path: str
+    offset: int
+    decoder: codecs.IncrementalDecoder
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = -1  # not opened yet
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')  # multi-byte chars may be split
+
+
+class ProgressTail:
+    """
+    Streams the new bytes of the progress.txt of several jobs on one host
+    through one SFTP channel, reading from the last offset, so the file is never re-downloaded
+
+    When a job is first added, only its last INITIAL_BYTES are read
+    """
+
+    INTERVAL = 1.  # seconds
+    INITIAL_BYTES = 64 * 2**10
+    MAX_READ = 2**20  # per file per poll, so one chatty job does not starve the others
+
+    host: str
+    user: str
+    port: int
+    password: str
+
+    files: Dict[str, TailedFile]  # {remote outdir: TailedFile}
+    lock: threading.Lock
+
+    def __init__(self, host: str, user: str, port: int, password: str = ''):
+        self.host = host
+        self.user = user
+        self.port = port
+        self.password = password
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def add(self, outdir: str):
+        """
+        outdir: absolute remote path
+        """
+        with self.lock:
+            if outdir not in self.files:
+                self.files[outdir] = TailedFile(path=f'{outdir}/{PROGRESS_FILE}')
+
+    def remove(self, outdir: str):
+        with self.lock:
+            self.files.pop(outdir, None)
+
+    def outdirs(self) -> List[str]:
+        with self.lock:
+            return list(self.files.keys())
+
+    def run(self, reporter: Reporter):
+        """
+        Emits {outdir: new text} by reporter.data() until cancelled
+        """
+        with POOL.connection(host=self.host, user=self.user, port=self.port, password=self.password) as con:
+            sftp = con.client.open_sftp()  # a channel of its own, kept open for the whole run
+            try:
+                while not reporter.is_cancelled():
+                    new_text = self.poll(sftp)
+                    if len(new_text) > 0:
+                        reporter.data(new_text)
+                    reporter.wait(self.INTERVAL)
+            finally:
+                sftp.close()
+
+    def poll(self, sftp) -> Dict[str, str]:
+        with self.lock:
+            files = dict(self.files)
+
+        ret = {}
+        for outdir, f in files.items():
+            try:
+                size = sftp.stat(f.path).st_size
+            except IOError:
+                continue  # not created yet, the job may still be queued
+
+            if f.offset == -1:
+                f.offset = max(0, size - self.INITIAL_BYTES)
+            if size < f.offset:  # truncated, e.g. the job was re-run
+                f.offset = 0
+            if size == f.offset:
+                continue
+
+            with sftp.open(f.path, 'rb') as fh:
+                fh.seek(f.offset)
+                data = fh.read(min(size - f.offset, self.MAX_READ))
+            f.offset += len(data)
+            ret[outdir] = f.decoder.decode(data)
+
+        return ret
@@ -0,0 +1,96 @@
+from typing import Dict, Union, Tuple, List, Optional
+
+
+EDIT_KEY_TO_VALUES = {
+    'User': [''],
+    'Host': ['255.255.255.255'],
+    'Port': ['22'],
+    'RNA-Seq Analysis': ['rna_seq_analysis-1.2.0'],
+    'Upload Streams': ['4', '1', '2', '8'],
+    'Compression': ['auto', 'off'],
+    'Download Excludes': ['None', '*.csv,*.tsv'],
+    'outdir': ['outdir'],
+    'gene-length-column': ['gene_length'],
+    'gene-name-column': ['gene_name'],
+    'gene-description-column': ['None', 'gene_description'],
+    'heatmap-read-fraction': ['0.8'],
+    'sample-batch-column': ['None', 'batch'],
+    'sample-group-column': ['group'],
+    'skip-differential-analysis': False,
+    'control-group-name': ['None'],
+    'experimental-group-name': ['None'],
+    'volcano-plot-label-genes': ['None'],
+    'gsea-input': ['deseq2', 'tpm'],
+    'gsea-gene-name-keywords': ['None'],
+    'gsea-gene-set-name-keywords': ['None'],
+    'gene-p-threshold': ['0.05'],
+    'gene-q-threshold': ['0.1'],
+    'pathway-p-threshold': ['0.05'],
+    'pathway-q-threshold': ['0.2'],
+    'organism': ['human', 'mouse', 'rat'],
+    'show-n-pathways': ['20'],
+    'colormap': ['Set1', 'Set2', 'Set3', 'tab10', 'tab20', 'tab20b', 'tab20c', 'Pastel1', 'Pastel2', 'Paired', 'Accent', 'Dark2'],
+    'invert-colors': False,
+    'publication-figure': False,
+    'threads': ['1', '2', '4', 'auto'],
+}
+SSH_KEYS = [
+    'User',
+    'Host',
+    'Port',
+    'RNA-Seq Analysis',
+    'Upload Streams',
+    'Compression',
+    'Download Excludes',
+]
+RNA_KEYS = [
+    'outdir',
+    'gene-length-column',
+    'gene-name-column',
+    'gene-description-column',
+    'heatmap-read-fraction',
+    'sample-batch-column',
+    'sample-group-column',
+    'skip-differential-analysis',
+    'control-group-name',
+    'experimental-group-name',
+    'volcano-plot-label-genes',
+    'gsea-input',
+    'gsea-gene-name-keywords',
+    'gsea-gene-set-name-keywords',
+    'gene-p-threshold',
+    'gene-q-threshold',
+    'pathway-p-threshold',
+    'pathway-q-threshold',
+    'organism',
+    'show-n-pathways',
+    'colormap',
+    'invert-colors',
+    'publication-figure',
+    'threads',
+]
+
+
+def split_parameters(
+        parameters: Dict[str, Union[str, bool]],
+        rna_key_to_values: Optional[Dict[str, Union[List[str], bool]]] = None) \
+        -> Tuple[Dict[str, str], Dict[str, Union[str, bool]]]:
+    """
+    Resolves parameters read by IO into (ssh_key_values, rna_key_values) the same way as the form:
+        a missing value falls back to the first default, and a flag is True only when it is present
+
+    rna_key_to_values: the RNA part of the form built from a schema, default: the built-in one
+    """
+    if rna_key_to_values is None:
+        rna_key_to_values = {k: EDIT_KEY_TO_VALUES[k] for k in RNA_KEYS}
+    ret = []
+    for key_to_values in [{k: EDIT_KEY_TO_VALUES[k] for k in SSH_KEYS}, rna_key_to_values]:
+        key_values = {}
+        for key, default in key_to_values.items():
+            if type(default) is bool:
+                key_values[key] = parameters.get(key, False) is True
+            else:
+                key_values[key] = parameters.get(key, default[0])
+        ret.append(key_values)
+    ssh_key_values, rna_key_values = ret
+    return ssh_key_values, rna_key_values
@@ -0,0 +1,158 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple, Iterator, Optional, TYPE_CHECKING
+from .timing import Timing
+if TYPE_CHECKING:
+    from fabric import Connection
+    from paramiko import SFTPClient
+
+
+Key = Tuple[str, str, int]  # (host, user, port)
+
+
+class PooledConnection:
+
+    con: 'Connection'
+    in_use: int
+    last_used: float
+
+    def __init__(self, con: 'Connection'):
+        self.con = con
+        self.in_use = 0
+        self.last_used = time.time()
+
+
+class ConnectionPool:
+    """
+    Process-wide authenticated SSH connections keyed by (host, user, port),
+    shared by all actions so that the handshake, key exchange and password auth are paid once
+
+    - Keepalive packets stop firewalls and NAT from silently dropping idle transports
+    - A stale transport is transparently replaced by a new connection on the next lease,
+      logged in with the password kept in memory from the first login
+    - Connections idle longer than idle_timeout are closed by evict_idle()
+    - Connecting and logging in happen outside the lock, so a slow or dead host never blocks the others
+
+    A leased Connection may be used by other threads at the same time: run() opens a channel of its own per call,
+    but con.sftp() is one SFTP session cached on the Connection, which is not thread-safe,
+    so SFTP always goes through sftp_of(con)
+    """
+
+    KEEPALIVE_INTERVAL = 30  # seconds
+    CONNECT_TIMEOUT = 15  # seconds, of the TCP connect and the SSH banner
+
+    idle_timeout: float
+    pooled: Dict[Key, PooledConnection]
+    passwords: Dict[Key, str]  # of the last successful login, never written to disk
+    lock: threading.Lock
+
+    def __init__(self, idle_timeout: float = 600.):
+        self.idle_timeout = idle_timeout
+        self.pooled = {}
+        self.passwords = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(
+            self,
+            host: str,
+            user: str,
+            port: int,
+            password: str = '',
+            timing: Timing = Timing()) -> Iterator['Connection']:
+        """
+        An empty password means the one of the last successful login, e.g. when ask_password() was skipped
+        """
+        key = (host, user, int(port))
+        with timing.span('connect', kind='connect', host=host) as attrs:
+            p = self.__lease(key)
+            attrs['reused'] = p is not None
+            if p is None:
+                password = password or self.passwords.get(key, '')
+                con = self.__connect(host=host, user=user, port=int(port), password=password)
+                p = self.__add(key=key, con=con, password=password)
+
+        try:
+            yield p.con
+        finally:
+            with self.lock:
+                p.in_use -= 1
+                p.last_used = time.time()
+
+    def __lease(self, key: Key) -> Optional[PooledConnection]:
+        with self.lock:
+            p = self.pooled.get(key)
+            if p is None:
+                return None
+            if not p.con.is_connected:
+                p.con.close()
+                del self.pooled[key]
+                return None
+            p.in_use += 1
+            return p
+
+    def __add(self, key: Key, con: 'Connection', password: str) -> PooledConnection:
+        """
+        Another thread may have connected to the same key meanwhile, then its connection is shared and ours closed
+        """
+        with self.lock:
+            p = self.pooled.get(key)
+            if p is None or not p.con.is_connected:
+                p = PooledConnection(con=con)
+                self.pooled[key] = p
+                con = None
+            self.passwords[key] = password
+            p.in_use += 1
+        if con is not None:
+            con.close()
+        return p
+
+    def __connect(self, host: str, user: str, port: int, password: str) -> 'Connection':
+        from fabric import Connection  # fabric pulls in paramiko and cryptography, so not before the first remote action
+        con = Connection(
+            host=host,
+            user=user,
+            port=port,
+            connect_timeout=self.CONNECT_TIMEOUT,
+            connect_kwargs={'password': password, 'banner_timeout': self.CONNECT_TIMEOUT}
+        )
+        con.open()  # authenticate now, a wrong password never gets pooled
+        con.transport.set_keepalive(self.KEEPALIVE_INTERVAL)
+        return con
+
+    def is_connected(self, host: str, user: str, port: int) -> bool:
+        with self.lock:
+            p = self.pooled.get((host, user, int(port)))
+            return p is not None and p.con.is_connected
+
+    def evict_idle(self):
+        now = time.time()
+        with self.lock:
+            for key, p in list(self.pooled.items()):
+                if p.in_use == 0 and (now - p.last_used > self.idle_timeout or not p.con.is_connected):
+                    p.con.close()
+                    del self.pooled[key]
+
+    def close_all(self):
+        with self.lock:
+            for p in self.pooled.values():
+                p.con.close()
+            self.pooled = {}
+            self.passwords = {}
+
+
+POOL = ConnectionPool()
+
+
+@contextmanager
+def sftp_of(con: 'Connection') -> Iterator['SFTPClient']:
+    """
+    An SFTP session of the caller's own, a new channel on the shared transport, closed on exit
+    """
+    con.open()  # a no-op once connected, as every pooled Connection is
+    sftp = con.client.open_sftp()
+    try:
+        yield sftp
+    finally:
+        sftp.close()
@@ -0,0 +1,193 @@
+import queue
+import threading
+from typing import Dict, List, Optional, Set, Tuple, Union, TYPE_CHECKING
+from .reporter import Reporter, Cancelled
+from .store import InputStore
+from .library import is_library_ref
+from .hosts import choose_host, probe_host
+from .capacity import Capacity
+from .preflight import Preflight
+from .pool import POOL
+from .constants import remote_root_of
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+class Prefetcher:
+    """
+    Uploads each input into the input store the moment it is selected, while the user picks the next one
+
+    The store is content-addressed, so the submission finds the prefetched inputs as hits and only links them
+    Each input is checked by preflight and against the capacity of the host before it is uploaded,
+    so an input the submission would refuse is never sent
+    If the prefetch fails, its uploads are rolled back and the submission uploads whatever is missing by itself
+    If the submission fails before linking the prefetched inputs, or reuses a previous run instead, it discards them
+    """
+
+    POLL = 0.1  # seconds, how often cancellation is checked while waiting
+
+    ssh_key_values: Dict[str, str]
+    rna_key_values: Dict[str, Union[str, bool]]
+    password: str
+
+    paths: queue.Queue  # (input key, local path), None once no more input is to come
+    host_chosen: threading.Event
+    finished: threading.Event
+    discarded: threading.Event  # no more input is to be uploaded
+    error: Optional[Exception]
+    store_dir: str
+    upload_id: str  # of the store, which names the partial files of this prefetch
+    sent: Set[str]  # sha256 of the misses this prefetch uploaded, not yet linked by the submission
+
+    def __init__(self, ssh_key_values: Dict[str, str], rna_key_values: Dict[str, Union[str, bool]], password: str):
+        self.ssh_key_values = ssh_key_values
+        self.rna_key_values = rna_key_values
+        self.password = password
+        self.paths = queue.Queue()
+        self.host_chosen = threading.Event()
+        self.finished = threading.Event()
+        self.discarded = threading.Event()
+        self.error = None
+        self.store_dir = ''
+        self.upload_id = ''
+        self.sent = set()
+
+    def add(self, key: str, local_path: str):
+        """
+        key: e.g. 'count-table', inputs are added in the order of the dialogs
+        """
+        if local_path != '' and not is_library_ref(local_path):
+            self.paths.put((key, local_path))
+
+    def close(self):
+        """
+        No more input is to come
+        """
+        self.paths.put(None)
+
+    def run(self, reporter: Reporter):
+        """
+        The fn of a worker, connects while the user is still picking the first input
+        """
+        try:
+            self.ssh_key_values = choose_host(
+                ssh_key_values=self.ssh_key_values, password=self.password, reporter=reporter)
+            self.host_chosen.set()
+            reporter.timing.tag(host=self.ssh_key_values['Host'])
+            s = self.ssh_key_values
+            with POOL.connection(
+                    host=s['Host'], user=s['User'], port=int(s['Port']), password=self.password,
+                    timing=reporter.timing) as con:
+                store = InputStore(
+                    con=con,
+                    remote_root=remote_root_of(s['User']),
+                    streams=int(s.get('Upload Streams', '4')),
+                    compression=s.get('Compression', 'auto'),
+                    reporter=reporter)
+                self.store_dir, self.upload_id, self.sent = store.store_dir, store.upload_id, store.sent
+                try:
+                    self.prefetch(store=store, reporter=reporter)
+                except Exception:  # cancelled, refused by preflight or capacity, or failed
+                    self.rollback(con=con)
+                    raise
+        except Cancelled:
+            raise
+        except Exception as e:
+            self.error = e
+            reporter.message(f'Prefetch stopped, inputs will be checked and uploaded on submission: {e!r}')
+        finally:
+            self.host_chosen.set()
+            self.finished.set()
+
+    def prefetch(self, store: InputStore, reporter: Reporter):
+        preflight = Preflight(
+            rna_key_values=self.rna_key_values,
+            count_table_path='',
+            sample_info_table_path='',
+            gene_info_table_path='',
+            reporter=reporter)
+        local_paths = []
+        while True:
+            item = self.next_path(reporter)
+            if item is None:
+                return
+            key, local_path = item
+            local_paths.append(local_path)
+            with reporter.timing.span('prefetch'):
+                preflight.check(key=key, path=local_path)
+                self.check_capacity(local_paths=local_paths, reporter=reporter)
+                store.put([(local_path, None)])
+
+    def check_capacity(self, local_paths: List[str], reporter: Reporter):
+        """
+        The inputs chosen so far only underestimate the job, so what is refused here is refused on submission too
+        The probe was cached by choose_host()
+        """
+        s = self.ssh_key_values
+        probe = probe_host(
+            host=s['Host'], user=s['User'], port=int(s['Port']), password=self.password, timing=reporter.timing)
+        Capacity(probe=probe, local_paths=local_paths).check()
+
+    def next_path(self, reporter: Reporter) -> Optional[Tuple[str, str]]:
+        while not self.discarded.is_set():
+            reporter.check_cancelled()
+            try:
+                return self.paths.get(timeout=self.POLL)
+            except queue.Empty:
+                pass
+        return None
+
+    def chosen_ssh_key_values(self, reporter: Reporter) -> Optional[Dict[str, str]]:
+        """
+        The host the inputs are prefetched to, None if the prefetch failed
+        """
+        while not self.host_chosen.wait(self.POLL):
+            reporter.check_cancelled()
+        return None if self.error is not None else self.ssh_key_values
+
+    def wait(self, reporter: Reporter):
+        """
+        Until every input is in the store, or the prefetch has failed
+        """
+        while not self.finished.wait(self.POLL):
+            reporter.check_cancelled()
+
+    def claim(self):
+        """
+        The submission has linked the prefetched inputs into its outdir, they are never rolled back from now on
+        """
+        self.sent = set()
+
+    def discard(self, reporter: Reporter):
+        """
+        Rolls back the prefetched inputs of a failed submission, or of one which reused a previous run,
+        once the prefetch has stopped after the input being uploaded
+        Never raises, the failure of the submission is what the user has to see
+        """
+        self.discarded.set()
+        self.finished.wait()
+        if len(self.sent) == 0:
+            return
+        s = self.ssh_key_values
+        try:
+            with POOL.connection(host=s['Host'], user=s['User'], port=int(s['Port']), password=self.password) as con:
+                self.rollback(con=con)
+        except Exception as e:
+            reporter.message(f'Failed to roll back the prefetched inputs: {e!r}')
+
+    def rollback(self, con: 'Connection'):
+        if len(self.sent) > 0:
+            con.run(rollback_cmd(
+                store_dir=self.store_dir, upload_id=self.upload_id, hashes=sorted(self.sent)), hide=True)
+        self.sent = set()
+
+
+def rollback_cmd(store_dir: str, upload_id: str, hashes: List[str]) -> str:
+    """
+    Removes the uploads of the hashes, partial, staged in blocks or complete
+    Only ever called with the hashes this prefetch sent itself, never with hits, which may be used by other jobs
+    The link count cannot tell, an outdir linked by the ln -sf fallback does not raise it
+    The partial files of other uploaders of the same hashes are left alone
+    """
+    names = ' '.join(hashes)
+    return f'cd "{store_dir}" && for h in {names}; do rm -rf "$h".partial.{upload_id}* "$h"; done'
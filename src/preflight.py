@@ -0,0 +1,219 @@
+import csv
+import gzip
+import itertools
+from typing import List, Dict, Union, Set, Iterator, Optional
+from .reporter import Reporter
+from .library import is_library_ref
+
+
+MAX_ROWS = 100000  # rows of the count and gene info tables checked, a bounded pass however large the table is
+TAB_SUFFIXES = ['.tsv', '.tab', '.txt']
+
+
+class Table:
+    """
+    Streams a table row by row, never the whole file in memory
+
+    The first column is the index, i.e. gene ID or sample ID, as read by rna_seq_analysis
+    """
+
+    path: str
+    header: List[str]
+
+    def __init__(self, path: str):
+        self.path = path
+        with self.open() as fh:
+            self.header = [h.strip() for h in next(csv.reader(fh, delimiter=self.delimiter()), [])]
+        if len(self.header) == 0:
+            raise ValueError(f'"{path}" is empty')
+
+    def delimiter(self) -> str:
+        name = self.path[:-len('.gz')] if self.path.endswith('.gz') else self.path
+        return '\t' if any(name.endswith(s) for s in TAB_SUFFIXES) else ','
+
+    def open(self):
+        if self.path.endswith('.gz'):
+            return gzip.open(self.path, 'rt', newline='')
+        return open(self.path, newline='')
+
+    def rows(self, max_rows: Optional[int] = None) -> Iterator[List[str]]:
+        """
+        Data rows without the header, at most max_rows
+        """
+        with self.open() as fh:
+            reader = csv.reader(fh, delimiter=self.delimiter())
+            next(reader, None)
+            for row in itertools.islice(reader, max_rows):
+                if len(row) > 0:
+                    yield row
+
+    def column(self, name: str) -> int:
+        return self.header.index(name)
+
+
+class Preflight:
+    """
+    Checks the input tables against the parameters locally, before anything is uploaded,
+    so that a mismatch fails in seconds with a precise message rather than on the server an hour later
+
+    Only the headers, the sample info table, and the first MAX_ROWS rows of the other tables are read
+    """
+
+    rna_key_values: Dict[str, Union[str, bool]]
+    count_table_path: str
+    sample_info_table_path: str
+    gene_info_table_path: str
+    reporter: Reporter
+
+    sample_ids: List[str]
+    gene_ids: Set[str]
+    errors: List[str]
+
+    def __init__(
+            self,
+            rna_key_values: Dict[str, Union[str, bool]],
+            count_table_path: str,
+            sample_info_table_path: str,
+            gene_info_table_path: str,
+            reporter: Optional[Reporter] = None):
+
+        self.rna_key_values = rna_key_values
+        self.count_table_path = count_table_path
+        self.sample_info_table_path = sample_info_table_path
+        self.gene_info_table_path = gene_info_table_path
+        self.reporter = Reporter() if reporter is None else reporter
+
+    def main(self):
+        self.reporter.message('Checking the input tables')
+        self.errors = []
+        self.check_count_table()
+        self.check_sample_info_table()
+        if not is_library_ref(self.gene_info_table_path):  # no local copy, checked by the program itself
+            self.check_gene_info_table()
+        self.raise_errors()
+
+    def check(self, key: str, path: str):
+        """
+        One input table as soon as it is chosen, e.g. before it is prefetched
+
+        The count table comes first, the sample info and gene info tables are checked against it
+        """
+        self.errors = []
+        if key == 'count-table':
+            self.count_table_path = path
+            self.check_count_table()
+        elif key == 'sample-info-table':
+            self.sample_info_table_path = path
+            self.check_sample_info_table()
+        elif key == 'gene-info-table' and not is_library_ref(path):
+            self.gene_info_table_path = path
+            self.check_gene_info_table()
+        self.raise_errors()
+
+    def value(self, key: str) -> Union[str, bool]:
+        """
+        A form built from the schema of a version has no key of the options the version lacks, never checked
+        """
+        return self.rna_key_values.get(key, 'None')
+
+    def raise_errors(self):
+        if len(self.errors) > 0:
+            raise ValueError('\n'.join(self.errors))
+
+    def check_count_table(self):
+        table = Table(self.count_table_path)
+        self.sample_ids = table.header[1:]
+        if len(self.sample_ids) == 0:
+            self.errors.append(f'Count table "{table.path}": no sample column, is the delimiter right?')
+
+        self.gene_ids = set()
+        for i, row in enumerate(table.rows(max_rows=MAX_ROWS)):
+            line = i + 2
+            if len(row) != len(table.header):
+                self.errors.append(
+                    f'Count table "{table.path}" line {line}: {len(row)} columns, but the header has {len(table.header)}')
+                return
+            for sample_id, val in zip(self.sample_ids, row[1:]):
+                if not is_number(val):
+                    self.errors.append(
+                        f'Count table "{table.path}" line {line}: non-numeric count "{val}" of sample "{sample_id}"')
+                    return
+            self.gene_ids.add(row[0])
+            if i % 10000 == 0:
+                self.reporter.check_cancelled()
+
+    def check_sample_info_table(self):
+        table = Table(self.sample_info_table_path)
+        name = f'Sample info table "{table.path}"'
+
+        columns = [self.value(key) for key in ['sample-group-column', 'sample-batch-column']]
+        missing = [c for c in columns if not is_none(c) and c not in table.header]
+        if len(missing) > 0:
+            self.errors.append(f'{name}: column {quoted(missing)} not found in the header {quoted(table.header)}')
+            return
+
+        group = None if is_none(columns[0]) else table.column(columns[0])
+        sample_ids, groups = [], set()
+        for row in table.rows():
+            sample_ids.append(row[0])
+            if group is not None:
+                groups.add(row[group] if group < len(row) else '')
+
+        not_counted = [s for s in sample_ids if s not in self.sample_ids]
+        if len(not_counted) > 0:
+            self.errors.append(f'{name}: sample {quoted(not_counted)} not found in the columns of the count table')
+
+        if group is None or self.rna_key_values.get('skip-differential-analysis') is True:
+            return
+        for key in ['control-group-name', 'experimental-group-name']:
+            val = self.value(key)
+            if not is_none(val) and val not in groups:
+                self.errors.append(
+                    f'{name}: {key} "{val}" not found in the column "{table.header[group]}", '
+                    f'which has {quoted(sorted(groups))}')
+
+    def check_gene_info_table(self):
+        table = Table(self.gene_info_table_path)
+        name = f'Gene info table "{table.path}"'
+
+        keys = ['gene-length-column', 'gene-name-column', 'gene-description-column']
+        missing = [
+            f'{key} "{self.value(key)}"'
+            for key in keys
+            if not is_none(self.value(key)) and self.value(key) not in table.header
+        ]
+        if len(missing) > 0:
+            self.errors.append(f'{name}: {", ".join(missing)} not found in the header {quoted(table.header)}')
+            return
+
+        length_column = self.value('gene-length-column')
+        length = None if is_none(length_column) else table.column(length_column)
+        found = False
+        for i, row in enumerate(table.rows(max_rows=MAX_ROWS)):
+            if length is not None:  # gene-length-column "None" or not an option, nothing to check
+                val = row[length] if length < len(row) else ''
+                if not is_number(val):
+                    self.errors.append(f'{name} line {i + 2}: non-numeric gene length "{val}"')
+                    return
+            found = found or row[0] in self.gene_ids
+            if i % 10000 == 0:
+                self.reporter.check_cancelled()
+
+        if not found and len(self.gene_ids) > 0:
+            self.errors.append(f'{name}: none of the gene IDs is found in the count table')
+
+
+def is_number(val: str) -> bool:
+    try:
+        float(val)
+        return True
+    except ValueError:
+        return False
+
+
+def is_none(val: Union[str, bool]) -> bool:
+    return val in ['None', '']
+
+
+def quoted(items: List[str]) -> str:
+    return ', '.join(f'"{i}"' for i in items)
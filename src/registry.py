@@ -0,0 +1,170 @@
+import os
+import time
+import sqlite3
+from os.path import dirname
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Tuple, Optional
+from .reporter import Reporter
+from .helper import run_helper
+from .constants import LOCAL_ROOT_DIR, remote_root_of
+from .pool import POOL
+
+
+ACTIVE_STATUSES = ['queued', 'running']
+COLUMNS = [
+    'host',
+    'user',
+    'port',
+    'job_name',
+    'outdir',
+    'program',
+    'submitted_at',
+    'status',
+    'progress_size',
+    'progress_mtime',
+    'outputs',
+    'checked_at',
+]
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    host TEXT NOT NULL,
+    user TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    job_name TEXT NOT NULL,
+    outdir TEXT NOT NULL,
+    program TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    progress_size INTEGER NOT NULL DEFAULT 0,
+    progress_mtime REAL NOT NULL DEFAULT 0,
+    outputs INTEGER NOT NULL DEFAULT 0,
+    checked_at REAL NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_outdir ON jobs (host, user, port, outdir);
+CREATE INDEX IF NOT EXISTS jobs_host_status ON jobs (host, status);
+CREATE INDEX IF NOT EXISTS jobs_submitted_at ON jobs (submitted_at);
+'''
+
+
+class JobRegistry:
+    """
+    Local SQLite record of every submitted job, so jobs are not forgotten once the app is closed
+
+    A resubmission to the same outdir replaces the old record
+    Each call opens its own sqlite3 connection, so it is safe from any thread
+    """
+
+    FILE = f'{LOCAL_ROOT_DIR}/jobs.sqlite3'
+
+    file: str
+
+    def __init__(self, file: str = FILE):
+        self.file = file
+        os.makedirs(dirname(self.file), exist_ok=True)
+        with self.connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.file, timeout=10)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:  # commits, or rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def add(self, host: str, user: str, port: int, job_name: str, outdir: str, program: str, status: str):
+        with self.connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO jobs (host, user, port, job_name, outdir, program, submitted_at, status) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (host, user, int(port), job_name, outdir, program, time.time(), status))
+
+    def jobs(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        The latest jobs first
+        """
+        with self.connect() as db:
+            rows = db.execute(
+                f'SELECT {", ".join(COLUMNS)} FROM jobs ORDER BY submitted_at DESC, id DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def active_jobs(self, host: str, user: str, port: int) -> List[Tuple[str, str]]:
+        """
+        [(outdir, job_name), ...] of the jobs which may still change
+        """
+        marks = ', '.join('?' for _ in ACTIVE_STATUSES)
+        with self.connect() as db:
+            rows = db.execute(
+                f'SELECT outdir, job_name FROM jobs WHERE host = ? AND user = ? AND port = ? AND status IN ({marks})',
+                (host, user, int(port), *ACTIVE_STATUSES)).fetchall()
+        return [(r['outdir'], r['job_name']) for r in rows]
+
+    def host_of(self, user: str, port: int, outdir: str) -> Optional[str]:
+        """
+        The host of the latest job in the outdir, for a form with a pool of hosts
+        """
+        with self.connect() as db:
+            row = db.execute(
+                'SELECT host FROM jobs WHERE user = ? AND port = ? AND outdir = ? ORDER BY submitted_at DESC LIMIT 1',
+                (user, int(port), outdir)).fetchone()
+        return None if row is None else row['host']
+
+    def update(self, host: str, user: str, port: int, outdir_to_status: Dict[str, Dict[str, Any]]):
+        now = time.time()
+        with self.connect() as db:
+            db.executemany(
+                'UPDATE jobs SET status = ?, progress_size = ?, progress_mtime = ?, outputs = ?, checked_at = ? '
+                'WHERE host = ? AND user = ? AND port = ? AND outdir = ?',
+                [
+                    (s['status'], s['progress_size'], s['progress_mtime'], s['outputs'], now,
+                     host, user, int(port), outdir)
+                    for outdir, s in outdir_to_status.items()
+                ])
+
+
+class RefreshJobStatus:
+    """
+    Refreshes all the active jobs of one host with a single remote call,
+    instead of one round trip per job
+    """
+
+    host: str
+    user: str
+    port: int
+    password: str
+    registry: JobRegistry
+    reporter: Reporter
+
+    def __init__(
+            self,
+            host: str,
+            user: str,
+            port: int,
+            password: str = '',
+            registry: Optional[JobRegistry] = None,
+            reporter: Optional[Reporter] = None):
+
+        self.host = host
+        self.user = user
+        self.port = int(port)
+        self.password = password
+        self.registry = JobRegistry() if registry is None else registry
+        self.reporter = Reporter() if reporter is None else reporter
+
+    def main(self) -> int:
+        jobs = self.registry.active_jobs(host=self.host, user=self.user, port=self.port)
+        if len(jobs) == 0:
+            return 0
+
+        self.reporter.message(f'Checking {len(jobs)} jobs on {self.host}')
+        with POOL.connection(host=self.host, user=self.user, port=self.port, password=self.password) as con:
+            response = run_helper(con=con, command='job_status', request={
+                'root': remote_root_of(self.user),
+                'jobs': jobs,
+            })
+
+        self.registry.update(host=self.host, user=self.user, port=self.port, outdir_to_status=response['jobs'])
+        return len(jobs)
@@ -0,0 +1,49 @@
+import time
+from typing import Any
+from .timing import Timing
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Reporter:
+    """
+    Background jobs know nothing about the GUI, they only talk to a Reporter
+
+    The default Reporter prints messages to stdout and is never cancelled
+    Spans are timed by reporter.timing, which records nothing unless replaced by a TimingLog
+    """
+
+    timing: Timing = Timing()
+
+    def message(self, msg: str):
+        print(msg, flush=True)
+
+    def file_progress(self, name: str, done: int, total: int, mb_per_sec: float):
+        pass
+
+    def data(self, obj: Any):
+        """
+        Intermediate results of a long-running job
+        """
+        pass
+
+    def ask(self, question: str) -> bool:
+        """
+        A yes/no question to the user, the default Reporter has nobody to ask and says no
+        """
+        return False
+
+    def is_cancelled(self) -> bool:
+        return False
+
+    def wait(self, seconds: float):
+        """
+        Sleep which returns early once cancelled
+        """
+        time.sleep(seconds)
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise Cancelled()
@@ -0,0 +1,85 @@
+import json
+import shlex
+import hashlib
+from typing import Dict, List, Tuple, Union, Optional, TYPE_CHECKING
+from .helper import run_helper
+from .timing import Timing
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+RESULTS_DIR = '.results'  # in the remote root dir, {fingerprint}.jsonl of every job launched with it
+EXCLUDED_KEYS = ['outdir', 'threads']  # do not change the results
+REUSED_FILE = 'reused_from.txt'  # in an outdir materialized from a previous run
+
+
+def normalize(val: Union[str, bool]) -> Union[str, bool]:
+    """
+    '0.05', '.05' and '5e-2' are the same threshold
+    """
+    if type(val) is bool:
+        return val
+    val = val.strip()
+    try:
+        return repr(float(val))
+    except ValueError:
+        return val
+
+
+def fingerprint_of(program: str, rna_key_values: Dict[str, Union[str, bool]], input_hashes: Dict[str, str]) -> str:
+    """
+    Of everything which determines the results: the analysis program, the parameters and the input contents
+
+    input_hashes: {input key, e.g. 'count-table': sha256}
+    """
+    params = {k: normalize(v) for k, v in rna_key_values.items() if k not in EXCLUDED_KEYS}
+    key = json.dumps({'program': program, 'parameters': params, 'inputs': input_hashes}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def index_cmd(fingerprint: str, outdir: str, job_name: str) -> str:
+    """
+    Run in the remote root dir, outdir is absolute
+    Appended rather than overwritten, so a resubmission which is queued, fails or is cancelled
+    never hides an earlier finished run
+    """
+    entry = json.dumps({'outdir': outdir, 'job_name': job_name})
+    return f'mkdir -p "{RESULTS_DIR}" && printf "%s\\n" {shlex.quote(entry)} >> "{RESULTS_DIR}/{fingerprint}.jsonl"'
+
+
+def find_previous_run(
+        con: 'Connection',
+        remote_root: str,
+        fingerprint: str,
+        outdir: str,
+        timing: Timing = Timing()) -> Optional[str]:
+    """
+    The absolute outdir of the latest finished run of the same fingerprint other than outdir, if any
+    """
+    return find_previous_runs(con=con, remote_root=remote_root, jobs=[(fingerprint, outdir)], timing=timing)[0]
+
+
+def find_previous_runs(
+        con: 'Connection',
+        remote_root: str,
+        jobs: List[Tuple[str, str]],
+        timing: Timing = Timing()) -> List[Optional[str]]:
+    """
+    jobs: [(fingerprint, absolute outdir), ...]
+    The outdir of the latest finished run of each, if any, in one round trip however many
+    """
+    return run_helper(con=con, command='previous_run', request={
+        'root': remote_root,
+        'jobs': jobs,
+    }, timing=timing)['outdirs']
+
+
+def materialize_cmd(previous: str, outdir: str) -> str:
+    """
+    Hard links every file of the previous outdir into the new one, which takes no extra disk space
+    Falls back to copying, e.g. where cp has no -l
+    The linked files are shared with the previous run, so they are not to be edited in place
+    """
+    return f'mkdir -p "{outdir}" && ' \
+           f'(cp -al "{previous}/." "{outdir}/" 2>/dev/null || cp -a "{previous}/." "{outdir}/") && ' \
+           f'printf "%s\\n" "{previous}" > "{outdir}/{REUSED_FILE}"'
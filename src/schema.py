@@ -0,0 +1,156 @@
+import re
+import os
+import json
+import threading
+from os.path import exists, dirname
+from typing import Dict, List, Any, Optional, Union, TYPE_CHECKING
+from .constants import LOCAL_ROOT_DIR, PROFILE_FILE
+from .parameters import EDIT_KEY_TO_VALUES
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+PROGRAM_PREFIX = 'rna_seq_analysis-'  # each installed version is a dir in the remote root dir
+INPUT_KEYS = [  # file options, uploaded by the app rather than edited in the form
+    'count-table',
+    'sample-info-table',
+    'gene-info-table',
+    'gene-sets-gmt',
+]
+SKIPPED_KEYS = ['help', 'version']
+REQUIRED_KEYS = ['outdir']  # the app always needs them, whatever the schema says
+SEPARATOR = '@@@RNAAPP@@@'  # between the --help outputs of the versions
+
+OPTION_LINE = re.compile(  # e.g. "  -c COUNT_TABLE, --count-table COUNT_TABLE", "  --organism {human,mouse}"
+    r'^\s{1,8}(?:-\w(?: \S+)?, )?--(?P<key>[\w-]+)(?:[ =](?P<metavar>\{[^}]*\}|[A-Za-z_]+))?')
+DEFAULT = re.compile(r'\(?default:\s*(?P<default>[^)\s]+)\)?')
+
+
+Option = Dict[str, Any]  # {'key': str, 'flag': bool, 'choices': List[str], 'default': Optional[str]}
+
+
+def parse_help(text: str) -> List[Option]:
+    """
+    Options of an argparse --help output, in the order of the output
+    """
+    options, helps = [], []
+    for line in text.splitlines():
+        m = OPTION_LINE.match(line)
+        if m is not None:
+            metavar = m.group('metavar')
+            options.append({
+                'key': m.group('key'),
+                'flag': metavar is None,
+                'choices': metavar[1:-1].split(',') if metavar is not None and metavar.startswith('{') else [],
+                'default': None,
+            })
+            helps.append(line[m.end():])  # a short help may follow on the same line
+        elif len(options) > 0:
+            helps[-1] += ' ' + line.strip()  # the help wraps over the following lines
+
+    for option, help_ in zip(options, helps):
+        d = DEFAULT.search(' '.join(help_.split()))
+        if d is not None:
+            option['default'] = d.group('default')
+    return [o for o in options if o['key'] not in SKIPPED_KEYS + INPUT_KEYS]
+
+
+def form_of(options: List[Option]) -> Dict[str, Union[List[str], bool]]:
+    """
+    {key: values} of the RNA part of the form, like EDIT_KEY_TO_VALUES
+    The default of the schema comes first, followed by its choices, or by the built-in suggestions if it has none,
+    so a value the program would reject is never offered
+    """
+    ret = {}
+    for o in options:
+        builtin = EDIT_KEY_TO_VALUES.get(o['key'])
+        if o['flag']:
+            ret[o['key']] = False
+            continue
+        values = []
+        default = o['default']
+        if len(o['choices']) > 0:
+            suggestions = o['choices']
+        else:
+            suggestions = [] if type(builtin) is not list else builtin
+        for v in ([] if default in [None, 'None'] else [default]) + suggestions:
+            if v not in values:
+                values.append(v)
+        ret[o['key']] = values if len(values) > 0 else ['None']
+    for key in REQUIRED_KEYS:
+        if key not in ret:
+            ret = {key: EDIT_KEY_TO_VALUES[key], **ret}
+    return ret
+
+
+def discover_cmd(remote_root: str) -> str:
+    """
+    One exec: every installed version with its --help, in the environment in which jobs run
+    """
+    return f'cd "{remote_root}" && source {PROFILE_FILE} > /dev/null 2>&1; ' \
+           f'for d in {PROGRAM_PREFIX}*/; do d="${{d%/}}"; echo "{SEPARATOR} $d"; python "$d" --help 2>&1; done; true'
+
+
+def discover_schemas(con: 'Connection', remote_root: str) -> Dict[str, List[Option]]:
+    """
+    {version: options}, e.g. {'rna_seq_analysis-1.2.0': [...]}
+    """
+    stdout = con.run(discover_cmd(remote_root), hide=True).stdout
+    ret = {}
+    for part in stdout.split(SEPARATOR)[1:]:
+        version, _, text = part.strip().partition('\n')
+        if version.startswith(PROGRAM_PREFIX):
+            ret[version] = parse_help(text)
+    return ret
+
+
+def version_key(version: str) -> List[int]:
+    """
+    rna_seq_analysis-1.10.0 is later than rna_seq_analysis-1.9.0
+    """
+    return [int(n) for n in re.findall(r'\d+', version)]
+
+
+class SchemaCache:
+    """
+    The options of each version on each host, so the form is built at startup without a round trip
+
+    Versions are never changed once installed, so a cached schema does not expire,
+    it is only replaced by the next discovery
+    """
+
+    FILE = f'{LOCAL_ROOT_DIR}/schemas.json'
+
+    file: str
+    cache: Dict[str, Dict[str, List[Option]]]  # {host: {version: options}}
+    lock: threading.Lock
+
+    def __init__(self, file: str = FILE):
+        self.file = file
+        self.cache = {}
+        self.lock = threading.Lock()
+        if exists(self.file):
+            try:
+                with open(self.file) as fh:
+                    self.cache = json.load(fh)
+            except ValueError:
+                pass  # rebuilt by the next discovery
+
+    def get(self, host: str, version: str) -> Optional[List[Option]]:
+        """
+        None if never discovered, or if its --help could not be parsed
+        """
+        options = self.cache.get(host, {}).get(version)
+        return options if options else None
+
+    def versions(self, host: str) -> List[str]:
+        return sorted(self.cache.get(host, {}).keys(), key=version_key, reverse=True)  # the latest first
+
+    def put(self, host: str, schemas: Dict[str, List[Option]]):
+        with self.lock:
+            self.cache[host] = schemas
+            os.makedirs(dirname(self.file), exist_ok=True)
+            tmp = f'{self.file}.tmp'
+            with open(tmp, 'w') as fh:
+                json.dump(self.cache, fh)
+            os.replace(tmp, self.file)
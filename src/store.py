@@ -0,0 +1,273 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+from os.path import abspath, basename, exists, dirname, getsize
+from typing import Dict, List, Set, Tuple, Optional, TYPE_CHECKING
+from .reporter import Reporter
+from .transfer import ParallelUploader, Codec, GZIP, ZSTD, COMPRESS_THRESHOLD, is_zstd_available
+from .constants import LOCAL_ROOT_DIR
+from .delta import ResumableUploader, RESUMABLE_THRESHOLD
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+STORE_DIR = '.store'  # in the remote root dir, files are named by their sha256
+
+
+class HashCache:
+    """
+    A file is never re-hashed as long as its path, size and mtime are unchanged
+
+    The hash of the previous version of a changed file is kept, which is the delta basis of the upload
+    New hashes are only kept in memory until flush(), which the caller calls once per batch of files
+    """
+
+    FILE = f'{LOCAL_ROOT_DIR}/hash_cache.json'  # of the input files
+    BLOCK_SIZE = 2**20
+
+    file: str
+    cache: Dict[str, Dict[str, str]]
+    lock: threading.Lock
+    changed: bool  # since loaded or flushed
+
+    def __init__(self, file: str = FILE):
+        self.file = file
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.changed = False
+        if exists(self.file):
+            with open(self.file) as fh:
+                self.cache = json.load(fh)
+
+    def sha256(self, path: str, reporter: Optional[Reporter] = None) -> str:
+        reporter = Reporter() if reporter is None else reporter
+        path = abspath(path)
+        stat = os.stat(path)
+        entry = self.cache.get(path)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+
+        reporter.message(f'Hashing "{basename(path)}"')
+        h = hashlib.sha256()
+        with open(path, 'rb') as fh:  # streamed, so memory stays flat for multi-GB tables
+            while True:
+                reporter.check_cancelled()
+                block = fh.read(self.BLOCK_SIZE)
+                if len(block) == 0:
+                    break
+                h.update(block)
+
+        previous = None if entry is None else entry['sha256']
+        with self.lock:  # may be called from several transfer streams
+            self.cache[path] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': h.hexdigest(),
+                'previous_sha256': previous,
+            }
+            self.changed = True
+        return h.hexdigest()
+
+    def previous_sha256(self, path: str) -> Optional[str]:
+        entry = self.cache.get(abspath(path))
+        return None if entry is None else entry.get('previous_sha256')
+
+    def flush(self):
+        with self.lock:
+            if self.changed:
+                self.save()
+                self.changed = False
+
+    def save(self):
+        os.makedirs(dirname(self.file), exist_ok=True)
+        tmp = f'{self.file}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.cache, fh)
+        os.replace(tmp, self.file)  # atomic, a crash never leaves a truncated cache
+
+
+class InputStore:
+    """
+    Content-addressed store of uploaded inputs on the server: {remote_root}/.store/{sha256}
+
+    Inputs already in the store are hard-linked into the outdir without any transfer
+    Misses larger than RESUMABLE_THRESHOLD go through the ResumableUploader,
+    with the previous version of the same local file in the store as the delta basis, except for *.gz inputs
+    Misses are uploaded as {sha256}.partial.{upload_id} and only renamed once complete,
+    so the store never holds a truncated file under a valid hash,
+    and concurrent submissions missing on the same input never write into the same file
+
+    With compression 'auto', misses larger than COMPRESS_THRESHOLD are compressed on the fly
+    and decompressed on the server, zstd if both sides have it, otherwise gzip
+    Inputs which are already gzipped (*.gz) are sent as-is and always decompressed on the server
+    """
+
+    con: 'Connection'
+    remote_root: str
+    streams: int
+    compression: str
+    reporter: Reporter
+    hash_cache: HashCache
+
+    store_dir: str
+    remote_has_zstd: bool
+    upload_id: str  # unique to this store, in the names of its partial files
+    sent: Set[str]  # sha256 of every miss this store has started uploading
+
+    def __init__(
+            self,
+            con: 'Connection',
+            remote_root: str,
+            streams: int = 4,
+            compression: str = 'auto',
+            reporter: Optional[Reporter] = None):
+
+        self.con = con
+        self.remote_root = remote_root
+        self.streams = streams
+        self.compression = compression
+        self.reporter = Reporter() if reporter is None else reporter
+        self.hash_cache = HashCache()
+        self.store_dir = f'{remote_root}/{STORE_DIR}'
+        self.remote_has_zstd = False
+        self.upload_id = uuid.uuid4().hex[:12]
+        self.sent = set()
+
+    def put(self, local_remote_paths: List[Tuple[str, Optional[str]]]) -> Dict[str, str]:
+        """
+        A remote path of None puts the input into the store without linking it anywhere
+        Returns {local_path: sha256}
+        """
+        with self.reporter.timing.span('sha256', kind='local'):
+            hashes = {
+                local_path: self.hash_cache.sha256(path=local_path, reporter=self.reporter)
+                for local_path, _ in local_remote_paths
+            }
+            self.hash_cache.flush()
+
+        hits = self.find_hits(hashes=set(hashes.values()))
+        misses = {h for h in hashes.values() if h not in hits}
+        for local_path, _ in local_remote_paths:
+            if hashes[local_path] in hits:
+                self.reporter.message(f'"{basename(local_path)}" is already on the server, skip uploading')
+
+        to_upload = {}  # {sha256: local_path}, identical files are uploaded once
+        for local_path, _ in local_remote_paths:
+            h = hashes[local_path]
+            if h in misses:
+                to_upload.setdefault(h, local_path)
+        self.sent.update(to_upload.keys())
+
+        large = {h: p for h, p in to_upload.items() if getsize(p) >= RESUMABLE_THRESHOLD}
+        small = {h: p for h, p in to_upload.items() if h not in large}
+
+        send_codecs = {}  # {local_path: Codec} compressed while sending
+        remote_codecs = {}  # {sha256: Codec} to be decompressed on the server
+        for h, local_path in small.items():
+            send_codec, remote_codec = self.codecs_of(local_path)
+            if send_codec is not None:
+                send_codecs[local_path] = send_codec
+            if remote_codec is not None:
+                remote_codecs[h] = remote_codec
+
+        ParallelUploader(
+            con=self.con,
+            streams=self.streams,
+            reporter=self.reporter
+        ).upload(
+            local_remote_paths=[
+                (local_path, f'{self.store_dir}/{partial_name(h, self.upload_id, remote_codecs.get(h))}')
+                for h, local_path in small.items()
+            ],
+            codecs=send_codecs)
+
+        for h, local_path in large.items():
+            send_codec, _ = self.codecs_of(local_path)
+            previous = self.hash_cache.previous_sha256(local_path)
+            if local_path.endswith('.gz'):
+                # the gzip bytes are assembled as they are and decompressed later by commit_and_link,
+                # so they never match the blocks of the decompressed previous version: no delta
+                remote_codecs[h] = GZIP
+                previous = None
+            ResumableUploader(
+                con=self.con,
+                streams=self.streams,
+                reporter=self.reporter
+            ).upload(
+                local_path=local_path,
+                sha256=h,
+                target=f'{self.store_dir}/{partial_name(h, self.upload_id, remote_codecs.get(h))}',
+                resume_from=f'{self.store_dir}/{h}.partial.*.blocks',
+                basis=None if previous is None else f'{self.store_dir}/{previous}',
+                compress=send_codec is not None)
+
+        self.reporter.check_cancelled()
+        self.commit_and_link(
+            misses=list(to_upload.keys()),
+            remote_codecs=remote_codecs,
+            links=[
+                (hashes[local_path], remote_path)
+                for local_path, remote_path in local_remote_paths
+                if remote_path is not None
+            ])
+
+        return hashes
+
+    def find_hits(self, hashes: Set[str]) -> Set[str]:
+        if len(hashes) == 0:
+            return set()
+        names = ' '.join(sorted(hashes))
+        cmd = f'mkdir -p "{self.store_dir}" && cd "{self.store_dir}" && ' \
+              f'for h in {names}; do [ -f "$h" ] && echo "$h"; done; ' \
+              f'command -v zstd > /dev/null && echo zstd; true'
+        with self.reporter.timing.span('find_hits', kind='command'):
+            stdout = self.con.run(cmd, hide=True).stdout
+        lines = [line.strip() for line in stdout.splitlines()]
+        self.remote_has_zstd = 'zstd' in lines
+        return {line for line in lines if line in hashes}
+
+    def codecs_of(self, local_path: str) -> Tuple[Optional[Codec], Optional[Codec]]:
+        """
+        Returns the Codec to compress while sending, and the Codec to decompress on the server
+        """
+        if local_path.endswith('.gz'):
+            return None, GZIP
+        if self.compression == 'off' or getsize(local_path) < COMPRESS_THRESHOLD:
+            return None, None
+        codec = ZSTD if (is_zstd_available() and self.remote_has_zstd) else GZIP
+        return codec, codec
+
+    def commit_and_link(self, misses: List[str], remote_codecs: Dict[str, Codec], links: List[Tuple[str, str]]):
+        """
+        One round trip: decompress and rename the completed uploads into the store, make the outdirs,
+        then link the inputs into the outdirs
+        Fall back to symlinks when hard links are not possible, e.g. across file systems
+        A hash completed meanwhile by a concurrent submission is kept, the own partial file is just removed
+        """
+        if len(misses) == 0 and len(links) == 0:
+            return
+        cmds = [f'cd "{self.store_dir}"']
+        for h in misses:
+            codec = remote_codecs.get(h)
+            partial = partial_name(h, self.upload_id, None)
+            if codec is None:
+                cmds.append(f'{{ [ -f "{h}" ] || mv -f "{partial}" "{h}"; }} && rm -f "{partial}"')
+            else:
+                src = partial_name(h, self.upload_id, codec)
+                cmds.append(
+                    f'{{ [ -f "{h}" ] || {{ {codec.decompress_cmd} < "{src}" > "{partial}" && mv -f "{partial}" "{h}"; }}; }}'
+                    f' && rm -f "{src}" "{partial}"')
+        dirs = sorted({dirname(remote_path) for _, remote_path in links})
+        if len(dirs) > 0:
+            cmds.append('mkdir -p ' + ' '.join(f'"{d}"' for d in dirs))
+        for h, remote_path in links:
+            cmds.append(f'(ln -f "{h}" "{remote_path}" 2>/dev/null || ln -sf "{self.store_dir}/{h}" "{remote_path}")')
+        with self.reporter.timing.span('commit_and_link', kind='command'):
+            self.con.run(' && '.join(cmds), hide=True)
+
+
+def partial_name(sha256: str, upload_id: str, codec: Optional[Codec]) -> str:
+    name = f'{sha256}.partial.{upload_id}'
+    return name if codec is None else f'{name}{codec.suffix}'
@@ -0,0 +1,379 @@
+import shlex
+from typing import Dict, Union, List, Tuple, Optional, TYPE_CHECKING
+from os.path import basename, abspath
+from .reporter import Reporter
+from .store import InputStore, HashCache
+from .preflight import Preflight
+from .registry import JobRegistry
+from .hosts import choose_host, probe_host
+from .capacity import Capacity, AUTO_THREADS
+from .pool import POOL, sftp_of
+from .dispatcher import launch, enqueue_cmd, parse_positions
+from .reuse import fingerprint_of, find_previous_run, index_cmd, materialize_cmd
+from .schema import SchemaCache
+from .prefetch import Prefetcher
+from .library import is_library_ref, library_path_of
+from .constants import PROFILE_FILE, remote_root_of, job_name_of
+if TYPE_CHECKING:
+    from fabric import Connection
+
+
+class SubmitJob:
+
+    ssh_key_values: Dict[str, str]
+    ssh_password: str
+    rna_key_values: Dict[str, Union[str, bool]]
+
+    count_table_local_path: str
+    sample_info_table_local_path: str
+    gene_info_table_local_path: str
+    gene_sets_gmt_local_path: str
+
+    reporter: Reporter
+    prefetcher: Optional[Prefetcher]  # uploading the inputs while the user was still picking them
+
+    rna_cmd: str
+    remote_root: str
+    job_name: str
+    queue_position: int  # 0 means running
+    warnings: List[str]
+    fingerprint: str
+    previous_outdir: Optional[str]  # absolute, of a finished run with the same fingerprint
+    reused_from: Optional[str]
+
+    def __init__(
+            self,
+            ssh_key_values: Dict[str, str],
+            ssh_password: str,
+            rna_key_values: Dict[str, Union[str, bool]],
+            count_table_local_path: str,
+            sample_info_table_local_path: str,
+            gene_info_table_local_path: str,
+            gene_sets_gmt_local_path: str,
+            reporter: Optional[Reporter] = None,
+            prefetcher: Optional[Prefetcher] = None):
+
+        self.ssh_key_values = ssh_key_values
+        self.ssh_password = ssh_password
+        self.rna_key_values = rna_key_values
+        self.count_table_local_path = count_table_local_path
+        self.sample_info_table_local_path = sample_info_table_local_path
+        self.gene_info_table_local_path = gene_info_table_local_path
+        self.gene_sets_gmt_local_path = gene_sets_gmt_local_path
+        self.reporter = Reporter() if reporter is None else reporter
+        self.prefetcher = prefetcher
+        self.warnings = []
+        self.previous_outdir = None
+        self.reused_from = None
+
+    def main(self) -> Dict[str, Union[str, int]]:
+        timing = self.reporter.timing
+        self.check_outdir()
+        with timing.span('preflight'):
+            self.preflight()
+        with timing.span('choose_host'):
+            self.choose_host()
+        with timing.span('find_previous_run'):
+            self.set_fingerprint()
+            self.find_previous_run()
+
+        if self.previous_outdir is not None and self.reporter.ask(
+                f'The same inputs were analyzed with the same parameters in "{self.previous_outdir}"\n'
+                f'Reuse those results instead of running the job again?'):
+            with timing.span('reuse_previous_run'):
+                self.reuse_previous_run()
+            if self.prefetcher is not None:  # none of its uploads is linked
+                self.prefetcher.discard(reporter=self.reporter)
+        else:
+            with timing.span('check_capacity'):
+                self.check_capacity()
+            self.build_rna_cmd()
+            self.connect_and_submit_job()
+
+        with timing.span('register'):
+            self.register()
+        return self.result()
+
+    def check_outdir(self):
+        """
+        Shell characters like './' and '~/' will work in con.run(), but not in con.put()
+
+        To be safe, use absolute path for the remote root dir
+        The outdir is defined as relative path, but check if it traverses outside the remote root dir (security issues)
+        """
+        self.remote_root = remote_root_of(self.ssh_key_values['User'])
+        outdir = self.rna_key_values['outdir']  # relative path
+        assert is_subdir(parent=self.remote_root, child=f'{self.remote_root}/{outdir}'), \
+            f'The outdir "{outdir}" traverses outside the remote root directory, not safe!'
+        self.job_name = job_name_of(outdir)
+
+    def preflight(self):
+        Preflight(
+            rna_key_values=self.rna_key_values,
+            count_table_path=self.count_table_local_path,
+            sample_info_table_path=self.sample_info_table_local_path,
+            gene_info_table_path=self.gene_info_table_local_path,
+            reporter=self.reporter).main()
+
+    def build_rna_cmd(self, schema_cache: Optional[SchemaCache] = None):
+        """
+        With the schema of the version discovered, only the options it accepts are passed, in its order
+        """
+        program = self.ssh_key_values['RNA-Seq Analysis']
+        outdir = self.rna_key_values['outdir']
+
+        schema_cache = SchemaCache() if schema_cache is None else schema_cache
+        options = schema_cache.get(host=self.ssh_key_values['Host'], version=program)
+        if options is None:
+            key_values = self.rna_key_values
+        else:
+            key_values = {o['key']: self.rna_key_values[o['key']] for o in options if o['key'] in self.rna_key_values}
+            for key in self.rna_key_values:
+                if key not in key_values:
+                    self.reporter.message(f'Warning: {program} has no option "--{key}", not passed')
+
+        args = [f'python {shlex.quote(program)}']  # every value quoted, so quotes, $ or spaces reach the program as typed
+        for key, val in key_values.items():
+            if type(val) is bool:
+                if val is True:
+                    args.append(f'--{key}')
+            else:  # val is string
+                args.append(f'--{key}={shlex.quote(val)}')
+
+        args.append(f'--count-table={shlex.quote(self.input_path(self.count_table_local_path))}')  # uploaded by the user
+        args.append(f'--sample-info-table={shlex.quote(self.input_path(self.sample_info_table_local_path))}')
+        args.append(f'--gene-info-table={shlex.quote(self.input_path(self.gene_info_table_local_path))}')
+        if self.gene_sets_gmt_local_path != '':
+            args.append(f'--gene-sets-gmt={shlex.quote(self.input_path(self.gene_sets_gmt_local_path))}')
+        args.append(f'2>&1 | tee {shlex.quote(f"{outdir}/progress.txt")}')
+        self.rna_cmd = '     '.join(args)
+
+    def input_path(self, local_path: str) -> str:
+        """
+        Relative to the remote root dir, a library entry is read in place, other inputs are linked into the outdir
+        """
+        if is_library_ref(local_path):
+            return library_path_of(local_path)
+        return f'{self.rna_key_values["outdir"]}/{remote_name(local_path)}'
+
+    def set_fingerprint(self, hash_cache: Optional[HashCache] = None):
+        """
+        The inputs hashed here are found in the hash cache by the input store, so never hashed twice
+        A library version is never changed, so its reference stands for its contents
+        """
+        hash_cache = HashCache() if hash_cache is None else hash_cache
+        key_to_path = {
+            'count-table': self.count_table_local_path,
+            'sample-info-table': self.sample_info_table_local_path,
+            'gene-info-table': self.gene_info_table_local_path,
+            'gene-sets-gmt': self.gene_sets_gmt_local_path,
+        }
+        self.fingerprint = fingerprint_of(
+            program=self.ssh_key_values['RNA-Seq Analysis'],
+            rna_key_values=self.rna_key_values,
+            input_hashes={
+                key: path if is_library_ref(path) else hash_cache.sha256(path=path, reporter=self.reporter)
+                for key, path in key_to_path.items()
+                if path != ''
+            })
+        hash_cache.flush()
+
+    def find_previous_run(self):
+        s = self.ssh_key_values
+        with POOL.connection(
+                host=s['Host'], user=s['User'], port=int(s['Port']), password=self.ssh_password,
+                timing=self.reporter.timing) as con:
+            self.previous_outdir = find_previous_run(
+                con=con,
+                remote_root=self.remote_root,
+                fingerprint=self.fingerprint,
+                outdir=self.outdir(),  # resubmitted to the same outdir, which is about to be overwritten
+                timing=self.reporter.timing)
+
+    def reuse_previous_run(self):
+        s = self.ssh_key_values
+        self.reporter.message(f'Linking the results of "{self.previous_outdir}" into "{self.outdir()}"')
+        with POOL.connection(
+                host=s['Host'], user=s['User'], port=int(s['Port']), password=self.ssh_password,
+                timing=self.reporter.timing) as con:
+            con.run(materialize_cmd(previous=self.previous_outdir, outdir=self.outdir()), hide=True)
+        self.queue_position = 0
+        self.reused_from = self.previous_outdir
+
+    def choose_host(self):
+        """
+        The inputs are prefetched to a host of the pool, the job goes to the same one
+        """
+        s = None if self.prefetcher is None else self.prefetcher.chosen_ssh_key_values(reporter=self.reporter)
+        if s is not None:
+            self.ssh_key_values = dict(self.ssh_key_values, Host=s['Host'])
+        else:
+            self.ssh_key_values = choose_host(
+                ssh_key_values=self.ssh_key_values, password=self.ssh_password, reporter=self.reporter)
+        self.reporter.timing.tag(host=self.ssh_key_values['Host'])
+
+    def check_capacity(self):
+        """
+        Also resolves threads 'auto' into a number, before the rna_cmd is built
+        """
+        s = self.ssh_key_values
+        capacity = Capacity(
+            probe=probe_host(
+                host=s['Host'],
+                user=s['User'],
+                port=int(s['Port']),
+                password=self.ssh_password,
+                timing=self.reporter.timing),
+            local_paths=[local for local, _ in self.local_remote_paths()])
+        if self.rna_key_values.get('threads') == AUTO_THREADS:
+            self.rna_key_values = dict(self.rna_key_values, threads=str(capacity.auto_threads()))
+            self.reporter.message(f'Using {self.rna_key_values["threads"]} threads on {s["Host"]}')
+        self.warnings = capacity.check()
+        for w in self.warnings:
+            self.reporter.message(f'Warning: {w}')
+
+    def connect_and_submit_job(self):
+        """
+        The outdir is made by the input store when it links the inputs,
+        so after the upload only command.txt is written over SFTP, and the job is launched in one exec
+        """
+        s = self.ssh_key_values
+        timing = self.reporter.timing
+        self.reporter.message(f'Connecting to {s["Host"]}')
+        with POOL.connection(
+                host=s['Host'], user=s['User'], port=int(s['Port']), password=self.ssh_password, timing=timing) as con:
+            if self.prefetcher is not None:
+                with timing.span('wait_prefetch'):
+                    self.prefetcher.wait(reporter=self.reporter)
+            with timing.span('upload_inputs'):
+                self.upload_inputs(con=con)
+            self.reporter.check_cancelled()
+
+            self.reporter.message(f'Launching job "{self.job_name}"')
+            with timing.span('launch'):
+                with timing.span('write_command_txt', kind='command'):
+                    with sftp_of(con) as sftp:
+                        self.check_library_refs(sftp=sftp)
+                        self.write_command_txt(sftp=sftp)
+                with timing.span('enqueue', kind='command'):
+                    stdout = launch(
+                        con=con, remote_root=self.remote_root, enqueue_cmds=[self.enqueue_cmd(), self.index_cmd()])
+            self.queue_position = parse_positions(stdout)[self.job_name]
+
+    def local_remote_paths(self) -> List[Tuple[str, str]]:
+        remote_dir = f'{self.remote_root}/{self.rna_key_values["outdir"]}'
+        return [
+            (local_path, f'{remote_dir}/{remote_name(local_path)}')  # absolute path
+            for local_path in self.local_paths()
+            if not is_library_ref(local_path)  # already on the server
+        ]
+
+    def local_paths(self) -> List[str]:
+        return [
+            p for p in [
+                self.count_table_local_path,
+                self.sample_info_table_local_path,
+                self.gene_info_table_local_path,
+                self.gene_sets_gmt_local_path,
+            ]
+            if p != ''
+        ]
+
+    def check_library_refs(self, sftp):
+        """
+        One stat per library reference, rather than a job failing in the queue
+        """
+        for ref in [p for p in self.local_paths() if is_library_ref(p)]:
+            try:
+                sftp.stat(f'{self.remote_root}/{library_path_of(ref)}')
+            except FileNotFoundError:
+                raise ValueError(f'{ref} is not in the library of {self.ssh_key_values["Host"]}, sync the library first')
+
+    def upload_inputs(self, con: 'Connection'):
+        InputStore(
+            con=con,
+            remote_root=self.remote_root,
+            streams=int(self.ssh_key_values.get('Upload Streams', '4')),
+            compression=self.ssh_key_values.get('Compression', 'auto'),
+            reporter=self.reporter
+        ).put(self.local_remote_paths())
+        if self.prefetcher is not None:
+            self.prefetcher.claim()
+
+    def cmd_txt(self) -> str:
+        """
+        Relative to the remote root dir
+        """
+        return f'{self.rna_key_values["outdir"]}/command.txt'
+
+    def write_command_txt(self, sftp):
+        """
+        Written as bytes over SFTP rather than echoed by the shell,
+        so parameter values with quotes or $ arrive exactly as typed
+        """
+        # the environment (.profile) needs to be activated right before the rna_cmd
+        script = f'source {PROFILE_FILE} && {self.rna_cmd}\n'
+        with sftp.open(f'{self.remote_root}/{self.cmd_txt()}', 'wb') as fh:
+            fh.write(script.encode())
+
+    def enqueue_cmd(self) -> str:
+        """
+        Run in the remote root dir
+        """
+        return enqueue_cmd(job_name=self.job_name, threads=self.threads(), cmd_txt=self.cmd_txt())
+
+    def index_cmd(self) -> str:
+        """
+        Records the fingerprint of the job in the remote index, run in the remote root dir
+        """
+        return index_cmd(fingerprint=self.fingerprint, outdir=self.outdir(), job_name=self.job_name)
+
+    def outdir(self) -> str:
+        """
+        Absolute remote path
+        """
+        return f'{self.remote_root}/{self.rna_key_values["outdir"]}'
+
+    def threads(self) -> int:
+        return int(self.rna_key_values.get('threads', '1'))
+
+    def register(self, registry: Optional[JobRegistry] = None):
+        s = self.ssh_key_values
+        (registry or JobRegistry()).add(
+            host=s['Host'],
+            user=s['User'],
+            port=int(s['Port']),
+            job_name=self.job_name,
+            outdir=self.outdir(),
+            program=s['RNA-Seq Analysis'],
+            status=self.status())
+
+    def status(self) -> str:
+        if self.reused_from is not None:
+            return 'finished'
+        return 'running' if self.queue_position == 0 else 'queued'
+
+    def result(self) -> Dict[str, Union[str, int]]:
+        return {
+            'host': self.ssh_key_values['Host'],
+            'job_name': self.job_name,
+            'outdir': self.outdir(),
+            'queue_position': self.queue_position,
+            'threads': 0 if self.reused_from is not None else self.threads(),  # nothing runs
+            'warnings': self.warnings,
+            'reused_from': self.reused_from,
+        }
+
+
+def is_subdir(parent: str, child: str) -> bool:
+    p = abspath(parent)
+    c = abspath(child)
+    return c.startswith(p)
+
+
+def remote_name(local_path: str) -> str:
+    """
+    Gzipped inputs are decompressed on the server, so the analysis reads plain tables
+    """
+    name = basename(local_path)
+    return name[:-len('.gz')] if name.endswith('.gz') else name
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import uuid
+import threading
+import statistics
+from os.path import exists, dirname
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterator
+from .constants import LOCAL_ROOT_DIR
+
+
+TIMING_LOG = f'{LOCAL_ROOT_DIR}/timing.jsonl'
+MAX_LOG_BYTES = 16 * 2**20  # the log is rotated to timing.jsonl.1 beyond this
+
+
+class Timing:
+    """
+    Times the phases of a submission: dialogs, phases, connect/auth, remote commands and file transfers
+
+    The base Timing records nothing, like the base Reporter which has no GUI
+    """
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'phase', **attrs) -> Iterator[Dict[str, Any]]:
+        """
+        Yields attrs, to which the timed code may add more, e.g. bytes
+        """
+        yield attrs
+
+    def record(self, name: str, kind: str, start: float, seconds: float, **attrs):
+        pass
+
+    def tag(self, **context):
+        """
+        Adds to every span recorded from now on, e.g. the host once chosen
+        """
+        pass
+
+    def summary(self) -> str:
+        return ''
+
+
+class TimingLog(Timing):
+    """
+    Appends each span to a local log as a line of JSON, e.g.
+        {"trace": "3f2a...", "action": "submit", "span": "upload_inputs", "kind": "phase",
+         "start": 1700000000.0, "seconds": 12.3}
+
+    All spans of one submission share the trace id
+    A transfer span also has bytes and mb_per_sec, a connect span has host and reused
+    The spans recorded after the host of the submission is chosen are tagged with it as well
+    """
+
+    file: str
+    trace: str
+    context: Dict[str, Any]
+    spans: List[Dict[str, Any]]
+    lock: threading.Lock
+
+    def __init__(self, file: str = TIMING_LOG, **context):
+        self.file = file
+        self.trace = uuid.uuid4().hex
+        self.context = context
+        self.spans = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'phase', **attrs) -> Iterator[Dict[str, Any]]:
+        start = time.time()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            self.record(name=name, kind=kind, start=start, seconds=time.time() - start, **attrs)
+
+    def record(self, name: str, kind: str, start: float, seconds: float, **attrs):
+        with self.lock:
+            context = dict(self.context)
+        span = {
+            'trace': self.trace,
+            **context,
+            'span': name,
+            'kind': kind,
+            'start': round(start, 3),
+            'seconds': round(seconds, 4),
+            **attrs,
+        }
+        if 'bytes' in attrs:
+            span['mb_per_sec'] = round(attrs['bytes'] / 1e6 / max(seconds, 1e-6), 2)
+        with self.lock:
+            self.spans.append(span)
+            self.__append(span)
+
+    def tag(self, **context):
+        with self.lock:
+            self.context.update(context)
+
+    def __append(self, span: Dict[str, Any]):
+        try:
+            os.makedirs(dirname(self.file), exist_ok=True)
+            if exists(self.file) and os.path.getsize(self.file) > MAX_LOG_BYTES:
+                os.replace(self.file, f'{self.file}.1')
+            with open(self.file, 'a') as fh:
+                fh.write(json.dumps(span) + '\n')
+        except OSError as e:
+            print(f'Warning: cannot write the timing log "{self.file}": {e!r}', flush=True)
+
+    def summary(self) -> str:
+        """
+        Seconds of each phase, and the throughput of each file transfer
+        """
+        with self.lock:
+            spans = list(self.spans)
+        lines = []
+        for s in spans:
+            if s['kind'] in ['dialog', 'phase', 'connect']:
+                lines.append(f'{s["span"]}: {s["seconds"]:.2f} s')
+            elif s['kind'] == 'transfer':
+                lines.append(f'{s["span"]}: {s["bytes"] / 1e6:.1f} MB in {s["seconds"]:.2f} s, '
+                             f'{s["mb_per_sec"]:.1f} MB/s')
+        return '\n'.join(lines)
+
+
+def read_log(file: str = TIMING_LOG, limit: int = 100000) -> List[Dict[str, Any]]:
+    """
+    The last spans of the log, skipping lines which are not JSON, e.g. cut by a crash
+    """
+    if not exists(file):
+        return []
+    spans = []
+    with open(file) as fh:
+        for line in fh:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+    return spans[-limit:]
+
+
+def host_summary(spans: List[Dict[str, Any]]) -> str:
+    """
+    Per host, across submissions: median seconds of the connect and of each phase, and median upload MB/s
+
+    A span without host, e.g. recorded before the host was chosen, belongs to the host its trace was submitted to,
+    which tags every later span, unlike connect spans, which also come from probing the other hosts of a pool
+    Logs written before spans were tagged fall back to the host of the last connect span of the trace
+    """
+    trace_to_host, trace_to_connected = {}, {}
+    for s in spans:
+        if s['kind'] == 'connect':
+            trace_to_connected[s['trace']] = s['host']
+        elif 'host' in s:
+            trace_to_host[s['trace']] = s['host']
+    trace_to_host = {**trace_to_connected, **trace_to_host}
+
+    host_to_values: Dict[str, Dict[str, List[float]]] = {}
+    for s in spans:
+        host = s.get('host', trace_to_host.get(s['trace']))
+        if host is None or s['kind'] not in ['connect', 'phase', 'transfer']:
+            continue
+        values = host_to_values.setdefault(host, {})
+        if s['kind'] == 'transfer':
+            values.setdefault('upload MB/s', []).append(s['mb_per_sec'])
+        else:
+            values.setdefault(f'{s["span"]} s', []).append(s['seconds'])
+
+    blocks = []
+    for host, values in sorted(host_to_values.items()):
+        n = len({s['trace'] for s in spans if trace_to_host.get(s['trace']) == host})
+        medians = ', '.join(f'{k} {statistics.median(v):.2f}' for k, v in values.items())
+        blocks.append(f'{host} ({n} submissions): median {medians}')
+    return '\n\n'.join(blocks) if len(blocks) > 0 else 'No submission timed yet'
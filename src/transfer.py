@@ -0,0 +1,322 @@
+import abc
+import time
+import zlib
+import queue
+import threading
+from os.path import basename, getsize
+from typing import List, Tuple, Dict, Optional, TYPE_CHECKING
+from .reporter import Reporter, Cancelled
+from .pool import sftp_of
+if TYPE_CHECKING:
+    from fabric import Connection
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # optional, gzip is always available
+
+
+COMPRESS_THRESHOLD = 16 * 2**20  # files smaller than this are not worth the CPU time
+
+
+class Codec(abc.ABC):
+    """
+    Streaming compression, blocks are compressed and sent as they are read, no temp file is written
+    """
+
+    name: str
+    suffix: str
+    decompress_cmd: str  # reads stdin and writes stdout on the server
+
+    @abc.abstractmethod
+    def compressobj(self):
+        """
+        A new compressor per stream, with compress(data) and flush()
+        """
+
+
+class Gzip(Codec):
+
+    name = 'gzip'
+    suffix = '.gz'
+    decompress_cmd = 'gzip -dc'
+
+    def compressobj(self):
+        return zlib.compressobj(1, zlib.DEFLATED, 31)  # wbits=31 for the gzip format, level 1 for speed
+
+
+class Zstd(Codec):
+
+    name = 'zstd'
+    suffix = '.zst'
+    decompress_cmd = 'zstd -dcq'
+
+    def compressobj(self):
+        return zstandard.ZstdCompressor(level=3).compressobj()
+
+
+GZIP = Gzip()
+ZSTD = Zstd()
+
+
+def is_zstd_available() -> bool:
+    return zstandard is not None
+
+
+class TransferMeter:
+    """
+    Accumulates the bytes of one file, which may be written by several streams at the same time
+
+    Report to the Reporter at most every INTERVAL seconds to not flood the GUI event loop,
+    and abort the transfer by raising Cancelled as soon as the user cancels
+    """
+
+    INTERVAL = 0.1  # seconds
+
+    name: str
+    total: int
+    reporter: Reporter
+
+    done: int
+    start: float
+    end: Optional[float]
+    last_report: float
+    lock: threading.Lock
+
+    def __init__(self, name: str, total: int, reporter: Reporter):
+        self.name = name
+        self.total = total
+        self.reporter = reporter
+        self.done = 0
+        self.start = time.time()
+        self.end = None
+        self.last_report = 0.
+        self.lock = threading.Lock()
+
+    def add(self, n_bytes: int):
+        self.reporter.check_cancelled()
+        with self.lock:
+            self.done += n_bytes
+            now = time.time()
+            if self.done >= self.total and self.end is None:
+                self.end = now
+            if now - self.last_report < self.INTERVAL and self.done < self.total:
+                return
+            self.last_report = now
+            elapsed = max(now - self.start, 1e-6)
+            self.reporter.file_progress(self.name, self.done, self.total, self.done / elapsed / 1e6)
+
+
+class Chunk:
+    """
+    A byte range of a local file
+
+    remote_offset is None: the chunk is written as a remote file of its own, via a .tmp file renamed when complete
+    remote_offset is int: the chunk is written at that offset of a pre-allocated remote file
+    """
+
+    local_path: str
+    remote_path: str
+    offset: int
+    length: int
+    meter: TransferMeter
+    remote_offset: Optional[int]
+    codec: Optional[Codec]
+
+    def __init__(
+            self,
+            local_path: str,
+            remote_path: str,
+            offset: int,
+            length: int,
+            meter: TransferMeter,
+            remote_offset: Optional[int] = None,
+            codec: Optional[Codec] = None):
+
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.offset = offset
+        self.length = length
+        self.meter = meter
+        self.remote_offset = remote_offset
+        self.codec = codec
+
+
+class ParallelUploader:
+    """
+    Uploads files over several SFTP channels opened on the one SSH transport of the Connection
+
+    Files larger than chunk_size are split into byte ranges, which are written in parallel
+    into a remote file pre-allocated to the full size
+    Files given a Codec are compressed on the fly in one stream, the caller decompresses them on the server
+    A failed or cancelled upload leaves no partial file behind
+    """
+
+    BLOCK_SIZE = 32768  # the max SFTP write packet of paramiko
+
+    con: 'Connection'
+    streams: int
+    chunk_size: int
+    reporter: Reporter
+
+    chunks: queue.Queue
+    errors: List[BaseException]
+    stop: threading.Event
+
+    def __init__(
+            self,
+            con: 'Connection',
+            streams: int = 4,
+            chunk_size: int = 64 * 2**20,
+            reporter: Optional[Reporter] = None):
+
+        self.con = con
+        self.streams = max(1, streams)
+        self.chunk_size = chunk_size
+        self.reporter = Reporter() if reporter is None else reporter
+
+    def upload(
+            self,
+            local_remote_paths: List[Tuple[str, str]],
+            codecs: Optional[Dict[str, Codec]] = None):
+        """
+        Remote paths are absolute file paths, not directories
+        codecs: {local_path: Codec} of the files to be compressed while sending
+        """
+        codecs = {} if codecs is None else codecs
+        try:
+            chunks = self.split_chunks(local_remote_paths=local_remote_paths, codecs=codecs)  # pre-allocates
+            self.upload_chunks(chunks)
+        except BaseException:
+            self.remove_partial_files(local_remote_paths)
+            raise
+        self.confirm_sizes(local_remote_paths=local_remote_paths, codecs=codecs)
+
+    def upload_chunks(self, chunks: List[Chunk]):
+        """
+        The lower-level entry, raises the first error of any stream
+        """
+        self.chunks = queue.Queue()
+        self.errors = []
+        self.stop = threading.Event()
+        for chunk in chunks:
+            self.chunks.put(chunk)
+
+        threads = [
+            threading.Thread(target=self.run_stream, daemon=True)
+            for _ in range(min(self.streams, len(chunks)))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if len(self.errors) > 0:
+            raise self.errors[0]
+
+        for meter in {id(c.meter): c.meter for c in chunks}.values():
+            end = time.time() if meter.end is None else meter.end
+            self.reporter.timing.record(
+                name=meter.name, kind='transfer', start=meter.start, seconds=end - meter.start, bytes=meter.total)
+
+    def split_chunks(self, local_remote_paths: List[Tuple[str, str]], codecs: Dict[str, Codec]) -> List[Chunk]:
+        chunks = []
+        with sftp_of(self.con) as sftp:
+            # largest files first, so the small ones fill in the idle streams at the end
+            for local_path, remote_path in sorted(local_remote_paths, key=lambda p: -getsize(p[0])):
+                size = getsize(local_path)
+                meter = TransferMeter(name=basename(local_path), total=size, reporter=self.reporter)
+                self.reporter.message(f'Uploading "{basename(local_path)}" to "{remote_path}"')
+
+                codec = codecs.get(local_path)
+                if codec is not None:  # a compressed stream cannot be split into byte ranges
+                    chunks.append(Chunk(
+                        local_path=local_path,
+                        remote_path=remote_path,
+                        offset=0,
+                        length=size,
+                        meter=meter,
+                        codec=codec))
+                    continue
+
+                with sftp.open(remote_path, 'wb') as fh:
+                    fh.truncate(size)  # pre-allocate so that byte ranges can be written in any order
+
+                for offset in range(0, max(size, 1), self.chunk_size):
+                    chunks.append(Chunk(
+                        local_path=local_path,
+                        remote_path=remote_path,
+                        offset=offset,
+                        length=min(self.chunk_size, size - offset),
+                        meter=meter,
+                        remote_offset=offset))
+
+        return chunks
+
+    def run_stream(self):
+        sftp = self.con.client.open_sftp()  # a new channel on the same transport
+        try:
+            while not self.stop.is_set():
+                try:
+                    chunk = self.chunks.get_nowait()
+                except queue.Empty:
+                    return
+                self.write_chunk(sftp=sftp, chunk=chunk)
+        except BaseException as e:
+            self.errors.append(e)
+            self.stop.set()
+        finally:
+            sftp.close()
+
+    def write_chunk(self, sftp, chunk: Chunk):
+        if chunk.remote_offset is None:
+            tmp = f'{chunk.remote_path}.tmp'
+            with sftp.open(tmp, 'wb') as dst:
+                self.copy(chunk=chunk, dst=dst)
+            sftp.posix_rename(tmp, chunk.remote_path)  # a remote file of its own is either complete or absent
+        else:
+            with sftp.open(chunk.remote_path, 'r+b') as dst:
+                dst.seek(chunk.remote_offset)
+                self.copy(chunk=chunk, dst=dst)
+
+    def copy(self, chunk: Chunk, dst):
+        dst.set_pipelined(True)  # do not wait for the server to ack every write
+        compressor = None if chunk.codec is None else chunk.codec.compressobj()
+        with open(chunk.local_path, 'rb') as src:
+            src.seek(chunk.offset)
+            remaining = chunk.length
+            while remaining > 0:
+                if self.stop.is_set():
+                    raise Cancelled()
+                data = src.read(min(self.BLOCK_SIZE, remaining))
+                if len(data) == 0:
+                    raise IOError(f'Local file "{chunk.local_path}" is shorter than expected')
+                remaining -= len(data)
+                chunk.meter.add(len(data))
+                if compressor is not None:
+                    data = compressor.compress(data)
+                if len(data) > 0:  # the compressor may hold everything in its buffer
+                    dst.write(data)
+            if compressor is not None:
+                dst.write(compressor.flush())
+
+    def confirm_sizes(self, local_remote_paths: List[Tuple[str, str]], codecs: Dict[str, Codec]):
+        with sftp_of(self.con) as sftp:
+            for local_path, remote_path in local_remote_paths:
+                if local_path in codecs:
+                    continue  # the compressed size is unknown in advance
+                local_size = getsize(local_path)
+                remote_size = sftp.stat(remote_path).st_size
+                if remote_size != local_size:
+                    raise IOError(f'Size mismatch of "{remote_path}": {remote_size} (remote) vs. {local_size} (local)')
+
+    def remove_partial_files(self, local_remote_paths: List[Tuple[str, str]]):
+        try:
+            with sftp_of(self.con) as sftp:
+                for _, remote_path in local_remote_paths:
+                    for path in [remote_path, f'{remote_path}.tmp']:
+                        try:
+                            sftp.remove(path)
+                        except IOError:
+                            pass  # never created
+        except Exception:
+            pass  # the connection is gone, the error of the upload is what the caller has to see
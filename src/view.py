@@ -1,82 +1,40 @@
+import time
 from os.path import dirname
-from typing import List, Dict, Union
-from PyQt5.QtGui import QIcon
+from typing import List, Dict, Union, Callable, Any, Optional
+from PyQt5.QtGui import QIcon, QPaintEvent
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, \
     QPushButton, QScrollArea, QCheckBox, QMessageBox, QFileDialog, QDialog, QFormLayout, \
-    QLineEdit, QDialogButtonBox
-
-
-EDIT_KEY_TO_VALUES = {
-    'User': [''],
-    'Host': ['255.255.255.255'],
-    'Port': ['22'],
-    'RNA-Seq Analysis': ['rna_seq_analysis-1.2.0'],
-    'outdir': ['outdir'],
-    'gene-length-column': ['gene_length'],
-    'gene-name-column': ['gene_name'],
-    'gene-description-column': ['None', 'gene_description'],
-    'heatmap-read-fraction': ['0.8'],
-    'sample-batch-column': ['None', 'batch'],
-    'sample-group-column': ['group'],
-    'skip-differential-analysis': False,
-    'control-group-name': ['None'],
-    'experimental-group-name': ['None'],
-    'volcano-plot-label-genes': ['None'],
-    'gsea-input': ['deseq2', 'tpm'],
-    'gsea-gene-name-keywords': ['None'],
-    'gsea-gene-set-name-keywords': ['None'],
-    'gene-p-threshold': ['0.05'],
-    'gene-q-threshold': ['0.1'],
-    'pathway-p-threshold': ['0.05'],
-    'pathway-q-threshold': ['0.2'],
-    'organism': ['human', 'mouse', 'rat'],
-    'show-n-pathways': ['20'],
-    'colormap': ['Set1', 'Set2', 'Set3', 'tab10', 'tab20', 'tab20b', 'tab20c', 'Pastel1', 'Pastel2', 'Paired', 'Accent', 'Dark2'],
-    'invert-colors': False,
-    'publication-figure': False,
-    'threads': ['1', '2', '4'],
-}
+    QLineEdit, QDialogButtonBox, QProgressDialog, QTabWidget, QPlainTextEdit, QTableView, QAbstractItemView, \
+    QSystemTrayIcon, QInputDialog
+from .parameters import EDIT_KEY_TO_VALUES, SSH_KEYS, RNA_KEYS
+
+
 BUTTON_KEY_TO_LABEL = {
     'load_parameters': 'Load Parameters',
     'save_parameters': 'Save Parameters',
     'submit': 'Submit',
+    'submit_batch': 'Submit Batch',
+    'monitor': 'Monitor Job',
+    'download': 'Download Results',
+    'jobs': 'Jobs',
+    'timing': 'Timing',
+    'discover_versions': 'Discover Versions',
+    'sync_library': 'Sync Library',
+    'sync_results': 'Sync Results',
 }
-SSH_KEYS = [
-    'User',
-    'Host',
-    'Port',
-    'RNA-Seq Analysis',
-]
-RNA_KEYS = [
-    'outdir',
-    'gene-length-column',
-    'gene-name-column',
-    'gene-description-column',
-    'heatmap-read-fraction',
-    'sample-batch-column',
-    'sample-group-column',
-    'skip-differential-analysis',
-    'control-group-name',
-    'experimental-group-name',
-    'volcano-plot-label-genes',
-    'gsea-input',
-    'gsea-gene-name-keywords',
-    'gsea-gene-set-name-keywords',
-    'gene-p-threshold',
-    'gene-q-threshold',
-    'pathway-p-threshold',
-    'pathway-q-threshold',
-    'organism',
-    'show-n-pathways',
-    'colormap',
-    'invert-colors',
-    'publication-figure',
-    'threads',
-]
 BUTTON_NAMES = [
     'load_parameters',
     'save_parameters',
     'submit',
+    'submit_batch',
+    'monitor',
+    'download',
+    'jobs',
+    'timing',
+    'discover_versions',
+    'sync_library',
+    'sync_results',
 ]
 
 
@@ -102,6 +60,35 @@ class Button:
         self.qbutton = qbutton
 
 
+class Lazy:
+    """
+    Builds the dialog on first use instead of at startup, so the main window paints sooner
+    """
+
+    cls: type
+    parent: QWidget
+    instance: Any
+
+    def __init__(self, cls: type, parent: QWidget):
+        self.cls = cls
+        self.parent = parent
+        self.instance = None
+
+    def get(self) -> Any:
+        if self.instance is None:
+            self.instance = self.cls(self.parent)
+        return self.instance
+
+    def is_built(self) -> bool:
+        return self.instance is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+
 class View(QWidget):
 
     TITLE = 'RNAapp'
@@ -109,6 +96,7 @@ class View(QWidget):
     WIDTH, HEIGHT = 800, 1000
 
     edit_dict: Dict[str, Edit]
+    rna_keys: List[str]  # of the current form, which is rebuilt from the schema of the selected version
     button_dict: Dict[str, Button]
 
     question_layout: QVBoxLayout
@@ -117,8 +105,11 @@ class View(QWidget):
     scroll_contents: QWidget
     main_layout: QVBoxLayout
 
+    on_first_paint: Optional[Callable[[], None]]
+
     def __init__(self):
         super().__init__()
+        self.on_first_paint = None
         self.setWindowTitle(self.TITLE)
         self.setWindowIcon(QIcon(f'{dirname(dirname(__file__))}/{self.ICON_FILE}'))
         self.resize(self.WIDTH, self.HEIGHT)
@@ -133,23 +124,33 @@ class View(QWidget):
 
         self.__init_ui_methods()
 
+    def paintEvent(self, event: QPaintEvent):
+        super().paintEvent(event)
+        if self.on_first_paint is not None:
+            callback, self.on_first_paint = self.on_first_paint, None
+            callback()
+
     def __init_edit_dict(self):
         self.edit_dict = {}
+        self.rna_keys = list(RNA_KEYS)
         for key, values in EDIT_KEY_TO_VALUES.items():
-            qlabel = QLabel(f'{key}:', self)
+            self.edit_dict[key] = self.__new_edit(key=key, values=values, parent=self)
 
-            if type(values) is bool:
-                qedit = QCheckBox(self)
-                qedit.setChecked(values)
-            else:
-                qedit = QComboBox(self)
-                qedit.addItems(values)
-                qedit.setEditable(True)
+    def __new_edit(self, key: str, values: Union[List[str], bool], parent: QWidget) -> Edit:
+        qlabel = QLabel(f'{key}:', parent)
 
-            # qlabel.hide()
-            # qedit.hide()
+        if type(values) is bool:
+            qedit = QCheckBox(parent)
+            qedit.setChecked(values)
+        else:
+            qedit = QComboBox(parent)
+            qedit.addItems(values)
+            qedit.setEditable(True)
 
-            self.edit_dict[key] = Edit(key=key, qlabel=qlabel, qedit=qedit)
+        # qlabel.hide()
+        # qedit.hide()
+
+        return Edit(key=key, qlabel=qlabel, qedit=qedit)
 
     def __init_button_dict(self):
         self.button_dict = {}
@@ -184,21 +185,64 @@ class View(QWidget):
         self.setLayout(self.main_layout)
 
     def __init_ui_methods(self):
-        self.message_box_info = MessageBoxInfo(self)
-        self.message_box_error = MessageBoxError(self)
-        self.message_box_yes_no = MessageBoxYesNo(self)
-        self.file_dialog_open = FileDialogOpen(self)
-        self.file_dialog_save = FileDialogSave(self)
-        self.password_dialog = PasswordDialog(self)
+        self.message_box_info = Lazy(MessageBoxInfo, self)
+        self.message_box_error = Lazy(MessageBoxError, self)
+        self.message_box_yes_no = Lazy(MessageBoxYesNo, self)
+        self.file_dialog_open = Lazy(FileDialogOpen, self)
+        self.file_dialog_save = Lazy(FileDialogSave, self)
+        self.file_dialog_directory = Lazy(FileDialogDirectory, self)
+        self.item_dialog = Lazy(ItemDialog, self)
+        self.password_dialog = Lazy(PasswordDialog, self)
+        self.progress_dialog = Lazy(ProgressDialog, self)
+        self.job_monitor = Lazy(JobMonitor, self)
+        self.jobs_dialog = Lazy(JobsDialog, self)
+        self.notifier = Lazy(Notifier, self)
+
+    def set_rna_form(self, key_to_values: Dict[str, Union[List[str], bool]]):
+        """
+        Replaces the RNA part of the form, e.g. by the schema of another version
+        The values entered for keys which remain are kept
+        """
+        entered = self.get_rna_key_values()
+        for key in self.rna_keys:
+            edit = self.edit_dict.pop(key)
+            for widget in [edit.qlabel, edit.qedit]:
+                self.question_layout.removeWidget(widget)
+                widget.deleteLater()
+
+        self.rna_keys = list(key_to_values.keys())
+        index = self.question_layout.indexOf(self.edit_dict[SSH_KEYS[-1]].qedit) + 1
+        for key, values in key_to_values.items():
+            edit = self.__new_edit(key=key, values=values, parent=self.scroll_contents)
+            self.edit_dict[key] = edit
+            self.question_layout.insertWidget(index, edit.qlabel)
+            self.question_layout.insertWidget(index + 1, edit.qedit)
+            index += 2
+
+        self.set_parameters({
+            k: v for k, v in entered.items() if k in key_to_values and v is not False
+        }, reset_flags=False)
+
+    def set_programs(self, versions: List[str]):
+        """
+        The versions installed on the server, keeping the one selected if still there
+        """
+        qedit = self.edit_dict['RNA-Seq Analysis'].qedit
+        current = qedit.currentText()
+        qedit.blockSignals(True)
+        qedit.clear()
+        qedit.addItems(versions)
+        qedit.blockSignals(False)
+        qedit.setCurrentText(current if current in versions else versions[0])
 
     def get_key_values(self) -> Dict[str, Union[str, bool]]:
-        return self.__get_key_values(keys=SSH_KEYS + RNA_KEYS)
+        return self.__get_key_values(keys=SSH_KEYS + self.rna_keys)
 
     def get_ssh_key_values(self) -> Dict[str, Union[str, bool]]:
         return self.__get_key_values(keys=SSH_KEYS)
 
     def get_rna_key_values(self) -> Dict[str, Union[str, bool]]:
-        return self.__get_key_values(keys=RNA_KEYS)
+        return self.__get_key_values(keys=self.rna_keys)
 
     def __get_key_values(self, keys: List[str]) -> Dict[str, str]:
         ret = {}
@@ -218,12 +262,12 @@ class View(QWidget):
 
         return ret
 
-    def set_parameters(self, parameters: Dict[str, Union[str, bool]]):
+    def set_parameters(self, parameters: Dict[str, Union[str, bool]], reset_flags: bool = True):
         # Reset all visible flags to False because
         #   when a flag is not present in parameters, it should be False
         for edit in self.edit_dict.values():
             e = edit.qedit
-            if e.isHidden():
+            if e.isHidden() or not reset_flags:
                 continue
             if type(e) is QCheckBox:
                 e.setChecked(False)
@@ -313,6 +357,7 @@ class FileDialogOpen(FileDialog):
             'TSV Files (*.tsv)',
             'Tab-Delimited Files (*.tab)',
             'Text Files (*.txt)',
+            'Gzipped Files (*.gz)',
         ])
         d.selectNameFilter('All Files (*.*)')
         d.setOptions(QFileDialog.DontUseNativeDialog)
@@ -357,6 +402,36 @@ class FileDialogSave(FileDialog):
         return ''
 
 
+class FileDialogDirectory(FileDialog):
+
+    def __call__(self, title: str) -> str:
+        d = QFileDialog(self.parent)
+        d.resize(1200, 800)
+        d.setWindowTitle(title)
+        d.setOptions(QFileDialog.DontUseNativeDialog | QFileDialog.ShowDirsOnly)
+        d.setFileMode(QFileDialog.Directory)
+        if d.exec_() == QFileDialog.Accepted:
+            selected = d.selectedFiles()
+            if len(selected) > 0:
+                return selected[0]
+        return ''
+
+
+class ItemDialog:
+    """
+    Picks one of the items, e.g. a library entry or a local file
+    """
+
+    parent: QWidget
+
+    def __init__(self, parent: QWidget):
+        self.parent = parent
+
+    def __call__(self, title: str, label: str, items: List[str]) -> str:
+        item, ok = QInputDialog.getItem(self.parent, title, label, items, 0, False)
+        return item if ok else ''
+
+
 #
 
 
@@ -402,3 +477,261 @@ class PasswordDialog:
             return self.line_edit.text()
         else:
             return ''
+
+
+#
+
+
+class ProgressDialog:
+    """
+    Non-blocking, the worker thread drives it through signals
+    """
+
+    parent: QWidget
+    dialog: QProgressDialog
+    on_cancel: Callable[[], None]
+
+    def __init__(self, parent: QWidget):
+        self.parent = parent
+        self.on_cancel = lambda: None
+        self.dialog = QProgressDialog(parent=self.parent)
+        self.dialog.setWindowModality(Qt.WindowModal)
+        self.dialog.setMinimumWidth(500)
+        self.dialog.setMinimumDuration(0)
+        self.dialog.setAutoClose(False)
+        self.dialog.setAutoReset(False)
+        self.dialog.setRange(0, 100)
+        self.dialog.canceled.connect(self.__cancel)
+        self.dialog.reset()  # a new QProgressDialog pops up by itself after minimumDuration
+
+    def open(self, title: str, on_cancel: Callable[[], None]):
+        self.on_cancel = on_cancel
+        self.dialog.setWindowTitle(title)
+        self.dialog.setLabelText('Connecting...')
+        self.dialog.setCancelButtonText('Cancel')
+        self.dialog.setValue(0)
+        self.dialog.show()
+
+    def set_message(self, msg: str):
+        self.dialog.setLabelText(msg)
+
+    def set_file_progress(self, name: str, done: int, total: int, mb_per_sec: float):
+        percent = 100 if total == 0 else int(done / total * 100)
+        self.dialog.setLabelText(
+            f'"{name}"\n'
+            f'{done / 1e6:,.1f} / {total / 1e6:,.1f} MB ({mb_per_sec:.1f} MB/s)'
+        )
+        self.dialog.setValue(percent)
+
+    def close(self):
+        self.on_cancel = lambda: None
+        self.dialog.reset()
+
+    def __cancel(self):
+        self.dialog.setLabelText('Cancelling...')
+        self.on_cancel()
+
+
+#
+
+
+class JobMonitor:
+    """
+    Non-modal, one tab of live log per job
+
+    Each log keeps at most MAX_LINES lines, the oldest are dropped, so memory stays flat for long runs
+    """
+
+    TITLE = 'Job Monitor'
+    WIDTH, HEIGHT = 900, 600
+    MAX_LINES = 5000
+
+    parent: QWidget
+    dialog: QDialog
+    layout: QVBoxLayout
+    tab_widget: QTabWidget
+    logs: Dict[str, QPlainTextEdit]
+    on_close: Callable[[], None]
+
+    def __init__(self, parent: QWidget):
+        self.parent = parent
+        self.logs = {}
+        self.on_close = lambda: None
+        self.__init_dialog()
+        self.__init_tab_widget()
+
+    def __init_dialog(self):
+        self.dialog = QDialog(parent=self.parent)
+        self.dialog.setWindowTitle(self.TITLE)
+        self.dialog.resize(self.WIDTH, self.HEIGHT)
+        self.dialog.finished.connect(self.__close)
+        self.layout = QVBoxLayout(self.dialog)
+
+    def __init_tab_widget(self):
+        self.tab_widget = QTabWidget(parent=self.dialog)
+        self.tab_widget.setTabsClosable(True)
+        self.tab_widget.tabCloseRequested.connect(self.__close_tab)
+        self.layout.addWidget(self.tab_widget)
+
+    def open(self, on_close: Callable[[], None]):
+        self.on_close = on_close
+        self.dialog.show()
+        self.dialog.raise_()
+
+    def add_job(self, key: str, title: str):
+        if key in self.logs:
+            self.tab_widget.setCurrentWidget(self.logs[key])
+            return
+        log = QPlainTextEdit(parent=self.tab_widget)
+        log.setReadOnly(True)
+        log.setMaximumBlockCount(self.MAX_LINES)
+        log.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.logs[key] = log
+        self.tab_widget.addTab(log, title)
+        self.tab_widget.setCurrentWidget(log)
+
+    def append(self, key_to_text: Dict[str, str]):
+        for key, text in key_to_text.items():
+            log = self.logs.get(key)
+            if log is None:
+                continue
+            bar = log.verticalScrollBar()
+            at_bottom = bar.value() == bar.maximum()
+            log.moveCursor(log.textCursor().End)
+            log.insertPlainText(text)
+            if at_bottom:  # follow the tail unless the user scrolled up
+                bar.setValue(bar.maximum())
+
+    def __close_tab(self, index: int):
+        log = self.tab_widget.widget(index)
+        self.tab_widget.removeTab(index)
+        self.logs = {k: v for k, v in self.logs.items() if v is not log}
+        log.deleteLater()
+
+    def __close(self):
+        for i in reversed(range(self.tab_widget.count())):
+            self.__close_tab(i)
+        self.on_close()
+        self.on_close = lambda: None
+
+
+#
+
+
+class JobTableModel(QAbstractTableModel):
+    """
+    Rows are only formatted when Qt paints them, so thousands of jobs open instantly
+    """
+
+    HEADERS = ['Submitted', 'Host', 'Job', 'Status', 'Progress (KB)', 'Last Output', 'Outdir']
+
+    jobs: List[Dict[str, Any]]
+
+    def __init__(self, parent: QWidget):
+        super().__init__(parent)
+        self.jobs = []
+
+    def set_jobs(self, jobs: List[Dict[str, Any]]):
+        self.beginResetModel()
+        self.jobs = jobs
+        self.endResetModel()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(self.jobs)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        job = self.jobs[index.row()]
+        return [
+            format_time(job['submitted_at']),
+            job['host'],
+            job['job_name'],
+            job['status'],
+            f'{job["progress_size"] / 1e3:,.1f}',
+            format_time(job['progress_mtime']),
+            job['outdir'],
+        ][index.column()]
+
+
+class JobsDialog:
+    """
+    Non-modal table of the submitted jobs in the local registry
+    """
+
+    TITLE = 'Jobs'
+    WIDTH, HEIGHT = 1100, 600
+
+    parent: QWidget
+    dialog: QDialog
+    layout: QVBoxLayout
+    model: JobTableModel
+    table: QTableView
+    refresh_button: QPushButton
+    on_refresh: Callable[[], None]
+
+    def __init__(self, parent: QWidget):
+        self.parent = parent
+        self.on_refresh = lambda: None
+        self.__init_dialog()
+        self.__init_table()
+        self.__init_refresh_button()
+
+    def __init_dialog(self):
+        self.dialog = QDialog(parent=self.parent)
+        self.dialog.setWindowTitle(self.TITLE)
+        self.dialog.resize(self.WIDTH, self.HEIGHT)
+        self.layout = QVBoxLayout(self.dialog)
+
+    def __init_table(self):
+        self.model = JobTableModel(self.dialog)
+        self.table = QTableView(parent=self.dialog)
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.layout.addWidget(self.table)
+
+    def __init_refresh_button(self):
+        self.refresh_button = QPushButton('Refresh Status', parent=self.dialog)
+        self.refresh_button.clicked.connect(lambda: self.on_refresh())
+        self.layout.addWidget(self.refresh_button)
+
+    def open(self, jobs: List[Dict[str, Any]], on_refresh: Callable[[], None]):
+        self.on_refresh = on_refresh
+        self.set_jobs(jobs)
+        self.dialog.show()
+        self.dialog.raise_()
+
+    def set_jobs(self, jobs: List[Dict[str, Any]]):
+        self.model.set_jobs(jobs)
+
+
+class Notifier:
+    """
+    Desktop notification from the system tray, silently skipped where there is no tray
+    """
+
+    tray: QSystemTrayIcon
+
+    def __init__(self, parent: QWidget):
+        self.tray = QSystemTrayIcon(parent.windowIcon(), parent)
+        if QSystemTrayIcon.isSystemTrayAvailable():
+            self.tray.show()
+
+    def __call__(self, title: str, msg: str):
+        if QSystemTrayIcon.isSystemTrayAvailable():
+            self.tray.showMessage(title, msg, QSystemTrayIcon.Information)
+
+
+def format_time(seconds: float) -> str:
+    return '' if seconds == 0 else time.strftime('%Y-%m-%d %H:%M', time.localtime(seconds))
@@ -0,0 +1,101 @@
+import json
+import shlex
+import socket
+from typing import List, Tuple, Optional
+from .reporter import Reporter
+from .registry import JobRegistry
+from .helper import HELPER
+from .constants import remote_root_of
+from .pool import POOL
+
+
+FINAL_STATUSES = ['finished', 'failed', 'missing']
+
+
+class CompletionWatcher:
+    """
+    Watches the active jobs of one host through one long-lived SSH channel,
+    on which the helper `watch` pushes a line of JSON whenever the status of a job changes
+
+    The helper wakes up by inotify on the queue dirs, or polls with backoff on servers without inotify
+    A dropped channel is reopened with exponential backoff
+    """
+
+    RECONNECT_MIN, RECONNECT_MAX = 5., 300.  # seconds
+    RECV_TIMEOUT = 1.  # seconds, how often cancellation is checked
+
+    host: str
+    user: str
+    port: int
+    password: str
+    registry: JobRegistry
+
+    def __init__(
+            self,
+            host: str,
+            user: str,
+            port: int,
+            password: str = '',
+            registry: Optional[JobRegistry] = None):
+
+        self.host = host
+        self.user = user
+        self.port = int(port)
+        self.password = password
+        self.registry = JobRegistry() if registry is None else registry
+
+    def run(self, reporter: Reporter):
+        """
+        Emits each status change {outdir, status, progress_size, progress_mtime, outputs} by reporter.data(),
+        until no job is active or cancelled
+        """
+        backoff = self.RECONNECT_MIN
+        while not reporter.is_cancelled():
+            jobs = self.registry.active_jobs(host=self.host, user=self.user, port=self.port)
+            if len(jobs) == 0:
+                return
+            try:
+                self.watch(jobs=jobs, reporter=reporter)
+                backoff = self.RECONNECT_MIN
+            except Exception as e:
+                reporter.message(f'Lost the job watcher of {self.host} ({e!r}), retrying in {backoff:.0f} s')
+                reporter.wait(backoff)
+                backoff = min(backoff * 2, self.RECONNECT_MAX)
+
+    def watch(self, jobs: List[Tuple[str, str]], reporter: Reporter):
+        with POOL.connection(host=self.host, user=self.user, port=self.port, password=self.password) as con:
+            channel = con.client.get_transport().open_session()
+            try:
+                channel.exec_command(f'python3 -c {shlex.quote(HELPER)} watch')
+                channel.sendall(json.dumps({'root': remote_root_of(self.user), 'jobs': jobs}).encode())
+                channel.shutdown_write()
+                channel.settimeout(self.RECV_TIMEOUT)
+
+                buf = b''
+                while not reporter.is_cancelled():
+                    try:
+                        data = channel.recv(65536)
+                    except socket.timeout:
+                        continue
+                    if len(data) == 0:
+                        break  # the helper has exited
+                    buf += data
+                    *lines, buf = buf.split(b'\n')
+                    for line in lines:
+                        self.on_line(line=line, reporter=reporter)
+
+                if channel.exit_status_ready() and channel.recv_exit_status() != 0:
+                    raise IOError(channel.recv_stderr(65536).decode(errors='replace'))
+            finally:
+                channel.close()
+
+    def on_line(self, line: bytes, reporter: Reporter):
+        line = line.strip()
+        if not line.startswith(b'{'):
+            return  # heartbeat
+        event = json.loads(line)
+        if 'outdir' not in event:
+            return
+        self.registry.update(
+            host=self.host, user=self.user, port=self.port, outdir_to_status={event['outdir']: event})
+        reporter.data(event)
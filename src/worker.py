@@ -0,0 +1,113 @@
+import threading
+from typing import Callable, Any, Optional
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from .reporter import Reporter, Cancelled
+
+
+class WorkerSignals(QObject):
+    """
+    Signals are the only thread-safe way to talk to the View from a worker thread,
+    Qt queues them into the GUI event loop
+    """
+
+    message = pyqtSignal(str)
+    file_progress = pyqtSignal(str, int, int, float)  # name, bytes done, bytes total, MB/s
+    data = pyqtSignal(object)
+    question = pyqtSignal(str)
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class SignalReporter(Reporter):
+
+    ANSWER_POLL = 0.1  # seconds, how often cancellation is checked while waiting for an answer
+
+    signals: WorkerSignals
+    cancel_event: threading.Event
+    answer_event: threading.Event
+    answer_value: bool
+
+    def __init__(self, signals: WorkerSignals):
+        self.signals = signals
+        self.cancel_event = threading.Event()
+        self.answer_event = threading.Event()
+        self.answer_value = False
+
+    def message(self, msg: str):
+        super().message(msg)
+        self.signals.message.emit(msg)
+
+    def file_progress(self, name: str, done: int, total: int, mb_per_sec: float):
+        self.signals.file_progress.emit(name, done, total, mb_per_sec)
+
+    def data(self, obj: Any):
+        self.signals.data.emit(obj)
+
+    def ask(self, question: str) -> bool:
+        """
+        Blocks the worker thread until the GUI thread calls answer()
+        """
+        self.answer_event.clear()
+        self.signals.question.emit(question)
+        while not self.answer_event.wait(self.ANSWER_POLL):
+            self.check_cancelled()
+        return self.answer_value
+
+    def answer(self, value: bool):
+        self.answer_value = value
+        self.answer_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def wait(self, seconds: float):
+        self.cancel_event.wait(seconds)
+
+
+class Worker(QRunnable):
+    """
+    Runs fn(reporter) in the global QThreadPool, or in the long-running pool if long_running
+
+    The global pool is sized to the CPU cores and kept for actions which end,
+    so loops running until cancelled, e.g. watchers and syncs, never starve a submission or a download
+    The return value of fn is emitted by the finished signal
+    """
+
+    LONG_RUNNING_MAX_THREADS = 64
+
+    long_running_pool: Optional[QThreadPool] = None  # created on first use, after the QApplication
+
+    fn: Callable[[Reporter], Any]
+    long_running: bool
+    signals: WorkerSignals
+    reporter: SignalReporter
+
+    def __init__(self, fn: Callable[[Reporter], Any], long_running: bool = False):
+        super().__init__()
+        self.fn = fn
+        self.long_running = long_running
+        self.signals = WorkerSignals()
+        self.reporter = SignalReporter(signals=self.signals)
+
+    def run(self):
+        try:
+            result = self.fn(self.reporter)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.error.emit(repr(e))
+        else:
+            self.signals.finished.emit(result)
+
+    def start(self):
+        if not self.long_running:
+            QThreadPool.globalInstance().start(self)
+            return
+        if Worker.long_running_pool is None:
+            Worker.long_running_pool = QThreadPool()
+            Worker.long_running_pool.setMaxThreadCount(self.LONG_RUNNING_MAX_THREADS)
+        Worker.long_running_pool.start(self)
+
+    def cancel(self):
+        self.reporter.cancel_event.set()
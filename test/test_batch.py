@@ -0,0 +1,56 @@
+from src.batch import expand_rows
+from .setup import TestCase
+
+
+class TestExpandRows(TestCase):
+
+    def setUp(self):
+        self.base_rna_key_values = {
+            'outdir': 'outdir',
+            'gene-q-threshold': '0.1',
+            'organism': 'human',
+            'skip-differential-analysis': False,
+        }
+        self.base_inputs = {
+            'count-table': 'count-table.csv',
+            'sample-info-table': 'sample-info-table.csv',
+            'gene-info-table': 'gene-info-table.csv',
+            'gene-sets-gmt': '',
+        }
+
+    def test_override(self):
+        jobs = expand_rows(
+            base_rna_key_values=self.base_rna_key_values,
+            base_inputs=self.base_inputs,
+            rows=[
+                {'outdir': 'q005', 'gene-q-threshold': '0.05', 'skip-differential-analysis': 'yes'},
+                {'outdir': 'mouse', 'organism': 'mouse', 'count-table': 'mouse.csv'},
+            ])
+        (rna_1, inputs_1), (rna_2, inputs_2) = jobs
+        self.assertEqual('0.05', rna_1['gene-q-threshold'])
+        self.assertEqual(True, rna_1['skip-differential-analysis'])
+        self.assertEqual('count-table.csv', inputs_1['count-table'])
+        self.assertEqual('mouse', rna_2['organism'])
+        self.assertEqual('0.1', rna_2['gene-q-threshold'])
+        self.assertEqual('mouse.csv', inputs_2['count-table'])
+
+    def test_default_outdir(self):
+        jobs = expand_rows(
+            base_rna_key_values=self.base_rna_key_values,
+            base_inputs=self.base_inputs,
+            rows=[{'organism': 'rat'}, {'organism': 'mouse'}])
+        self.assertEqual(['outdir_1', 'outdir_2'], [rna['outdir'] for rna, _ in jobs])
+
+    def test_duplicated_outdir(self):
+        with self.assertRaises(ValueError):
+            expand_rows(
+                base_rna_key_values=self.base_rna_key_values,
+                base_inputs=self.base_inputs,
+                rows=[{'outdir': 'a'}, {'outdir': 'a'}])
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(ValueError):
+            expand_rows(
+                base_rna_key_values=self.base_rna_key_values,
+                base_inputs=self.base_inputs,
+                rows=[{'typo-threshold': '1'}])
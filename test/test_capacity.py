@@ -0,0 +1,46 @@
+import gzip
+from src.hosts import HostProbe
+from src.capacity import Capacity, table_size
+from .setup import TestCase
+
+
+def probe(cpus: int, load: float, mem_available: int, disk_free: int) -> HostProbe:
+    return HostProbe(host='server', probe={
+        'cpus': cpus,
+        'load': load,
+        'mem_total': 64 * 10**9,
+        'mem_available': mem_available,
+        'disk_free': disk_free,
+        'running': 0,
+        'pending': 0,
+    })
+
+
+class TestCapacity(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.table = f'{self.workdir}/count-table.csv.gz'
+        with gzip.open(self.table, 'wt') as fh:
+            fh.write('gene,S1\n' + 'G,1\n' * 100000)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_table_size_of_gzip(self):
+        self.assertEqual(len('gene,S1\n') + 4 * 100000, table_size(self.table))
+
+    def test_auto_threads(self):
+        c = Capacity(probe=probe(cpus=32, load=20.5, mem_available=10**11, disk_free=10**12), local_paths=[self.table])
+        self.assertEqual(11, c.auto_threads())
+        c = Capacity(probe=probe(cpus=8, load=9., mem_available=10**11, disk_free=10**12), local_paths=[self.table])
+        self.assertEqual(1, c.auto_threads())
+
+    def test_not_enough_disk(self):
+        c = Capacity(probe=probe(cpus=8, load=0., mem_available=10**11, disk_free=10**8), local_paths=[self.table])
+        with self.assertRaisesRegex(OSError, 'GB free disk'):
+            c.check()
+
+    def test_warn_memory(self):
+        c = Capacity(probe=probe(cpus=8, load=0., mem_available=10**8, disk_free=10**12), local_paths=[self.table])
+        self.assertEqual(1, len(c.check()))
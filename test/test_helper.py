@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import subprocess
+from src.helper import HELPER, cdc_blocks
+from .setup import TestCase
+
+
+class TestCdcBlocks(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.rows = [f'gene{i},{i % 97},{i * 7 % 1013}\n' for i in range(200000)]
+
+    def tearDown(self):
+        self.tear_down()
+
+    def write(self, rows, name: str) -> str:
+        file = f'{self.workdir}/{name}'
+        with open(file, 'w') as fh:
+            fh.writelines(rows)
+        return file
+
+    def test_blocks_cover_the_file(self):
+        file = self.write(self.rows, 'count-table.csv')
+        blocks = cdc_blocks(file)
+        offset = 0
+        for o, length, _ in blocks:
+            self.assertEqual(offset, o)
+            offset += length
+        with open(file, 'rb') as fh:
+            self.assertEqual(len(fh.read()), offset)
+
+    def test_insertion_only_changes_nearby_blocks(self):
+        old = cdc_blocks(self.write(self.rows, 'old.csv'))
+        new_rows = self.rows[:100] + ['inserted,0,0\n'] + self.rows[100:]
+        new = cdc_blocks(self.write(new_rows, 'new.csv'))
+        old_hashes = {sha for _, _, sha in old}
+        changed = [sha for _, _, sha in new if sha not in old_hashes]
+        self.assertLessEqual(len(changed), 2)
+
+
+class TestWatch(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        root = os.path.abspath(self.workdir)
+        for d in ['.queue/pending', '.queue/running', 'finished', 'failed', 'killed']:
+            os.makedirs(f'{root}/{d}')
+        for name in ['finished', 'killed']:
+            with open(f'{root}/{name}/progress.txt', 'w') as fh:
+                fh.write('Done\n')
+        with open(f'{root}/finished/.exit_code', 'w') as fh:
+            fh.write('0\n')
+        with open(f'{root}/killed/.exit_code', 'w') as fh:
+            fh.write('137\n')
+        with open(f'{root}/failed/progress.txt', 'w') as fh:
+            fh.write('Traceback (most recent call last)\n')
+        self.request = {
+            'root': root,
+            'jobs': [[f'{root}/{name}', name] for name in ['finished', 'failed', 'killed', 'missing']],
+        }
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_exits_once_all_jobs_are_done(self):
+        stdout = subprocess.run(
+            [sys.executable, '-c', HELPER, 'watch'],
+            input=json.dumps(self.request),
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=30).stdout
+        events = [json.loads(line) for line in stdout.splitlines() if line.startswith('{"status"')]
+        actual = {os.path.basename(e['outdir']): e['status'] for e in events}
+        self.assertDictEqual(
+            {'finished': 'finished', 'failed': 'failed', 'killed': 'failed', 'missing': 'missing'}, actual)
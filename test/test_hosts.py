@@ -0,0 +1,45 @@
+from src.hosts import HostProbe, ProbeCache, split_hosts
+from .setup import TestCase
+
+
+def probe(host: str, cpus: int, load: float, running: int = 0, pending: int = 0) -> HostProbe:
+    return HostProbe(host=host, probe={
+        'cpus': cpus,
+        'load': load,
+        'mem_total': 64 * 10**9,
+        'mem_available': 32 * 10**9,
+        'disk_free': 10**12,
+        'running': running,
+        'pending': pending,
+    })
+
+
+class TestHosts(TestCase):
+
+    def test_split_hosts(self):
+        self.assertListEqual(['10.0.0.1', '10.0.0.2'], split_hosts(' 10.0.0.1, 10.0.0.2,'))
+
+    def test_rank(self):
+        probes = [
+            probe('busy', cpus=32, load=30.),
+            probe('idle', cpus=16, load=1.),
+            probe('queued', cpus=64, load=0., pending=2),
+        ]
+        best = min(probes, key=HostProbe.rank_key)
+        self.assertEqual('idle', best.host)
+
+    def test_rank_running_jobs(self):
+        probes = [
+            probe('just-started', cpus=16, load=0., running=1),  # the load average has not caught up yet
+            probe('idle', cpus=16, load=1.),
+        ]
+        best = min(probes, key=HostProbe.rank_key)
+        self.assertEqual('idle', best.host)
+
+    def test_probe_cache_expires(self):
+        cache = ProbeCache(ttl=60.)
+        p = probe('a', cpus=8, load=1.)
+        cache.put(user='me', port=22, probe=p)
+        self.assertIs(p, cache.get(host='a', user='me', port=22))
+        p.probed_at -= 61
+        self.assertIsNone(cache.get(host='a', user='me', port=22))
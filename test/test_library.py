@@ -0,0 +1,75 @@
+import os
+from src.library import parse_ref, library_path_of, scan_local_library, LibraryCache
+from src.submit import SubmitJob
+from .setup import TestCase
+
+
+GMT_REF = 'library:human/gene-sets-gmt/2024.1/h.all.gmt'
+
+
+class TestRef(TestCase):
+
+    def test_library_path(self):
+        self.assertEqual('.library/human/gene-sets-gmt/2024.1/h.all.gmt', library_path_of(GMT_REF))
+
+    def test_invalid(self):
+        for ref in [
+            'library:human/gene-sets-gmt/../../../.ssh/authorized_keys',
+            'library:human/count-table/1/c.csv',
+            'library:human/gene-sets-gmt/h.all.gmt',
+        ]:
+            with self.assertRaises(ValueError):
+                parse_ref(ref)
+
+
+class TestLocalLibrary(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_scan(self):
+        for path in [
+            'human/gene-info-table/2024.1/gene-info.csv.gz',
+            'human/gene-sets-gmt/2024.1/h.all.gmt',
+            'human/notes/readme.txt',
+        ]:
+            os.makedirs(os.path.dirname(f'{self.workdir}/{path}'), exist_ok=True)
+            with open(f'{self.workdir}/{path}', 'w') as fh:
+                fh.write(path)
+        actual = [entry for entry, _ in scan_local_library(self.workdir)]
+        self.assertEqual([
+            {'organism': 'human', 'kind': 'gene-info-table', 'version': '2024.1', 'name': 'gene-info.csv'},
+            {'organism': 'human', 'kind': 'gene-sets-gmt', 'version': '2024.1', 'name': 'h.all.gmt'},
+        ], actual)
+
+    def test_cache_refs_on_every_host(self):
+        def entry(version: str):
+            return {'organism': 'human', 'kind': 'gene-sets-gmt', 'version': version, 'name': 'h.all.gmt'}
+        cache = LibraryCache(file=f'{self.workdir}/library.json')
+        cache.put(host='a', entries=[entry('2023.2'), entry('2024.1'), entry('2024.10')])
+        cache.put(host='b', entries=[entry('2024.1'), entry('2024.10')])
+        self.assertEqual(
+            ['library:human/gene-sets-gmt/2024.10/h.all.gmt', GMT_REF],
+            LibraryCache(file=f'{self.workdir}/library.json').refs(hosts=['a', 'b'], organism='human', kind='gene-sets-gmt'))
+
+
+class TestSubmitWithLibrary(TestCase):
+
+    def test_library_input_is_not_uploaded(self):
+        job = SubmitJob(
+            ssh_key_values={'User': 'me', 'Host': '1.2.3.4', 'Port': '22', 'RNA-Seq Analysis': 'rna_seq_analysis'},
+            ssh_password='',
+            rna_key_values={'outdir': 'outdir'},
+            count_table_local_path='count-table.csv',
+            sample_info_table_local_path='sample-info-table.csv',
+            gene_info_table_local_path='gene-info-table.csv',
+            gene_sets_gmt_local_path=GMT_REF)
+        job.remote_root = '/home/me/RNAapp'
+        job.build_rna_cmd()
+        self.assertIn('--gene-sets-gmt=.library/human/gene-sets-gmt/2024.1/h.all.gmt', job.rna_cmd)
+        self.assertEqual(
+            ['count-table.csv', 'sample-info-table.csv', 'gene-info-table.csv'],
+            [local for local, _ in job.local_remote_paths()])
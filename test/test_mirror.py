@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import subprocess
+from src.helper import HELPER
+from src.mirror import to_pull_of, MirroredJob
+from .setup import TestCase
+
+
+class TestToPull(TestCase):
+
+    def test_running_job_waits_for_unchanged_files(self):
+        listed = {'pca.png': [100, 2.], 'heatmap.png': [50, 3.], 'progress.txt': [10, 1.]}
+        previous = {'pca.png': [100, 2.], 'heatmap.png': [40, 2.5]}  # heatmap.png is still being written
+        snapshot = {'progress.txt': [10, 1.]}
+        self.assertEqual(['pca.png'], to_pull_of(listed=listed, previous=previous, snapshot=snapshot, active=True))
+
+    def test_ended_job_pulls_everything_left(self):
+        listed = {'pca.png': [100, 2.], 'heatmap.png': [50, 3.], 'progress.txt': [12, 4.]}
+        snapshot = {'pca.png': [100, 2.], 'progress.txt': [10, 1.]}
+        self.assertEqual(
+            ['heatmap.png', 'progress.txt'], to_pull_of(listed=listed, previous={}, snapshot=snapshot, active=False))
+
+
+class TestListing(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.root = os.path.abspath(self.workdir)
+        os.makedirs(f'{self.root}/job/figures')
+        for name in ['progress.txt', 'figures/pca.png', 'table.csv']:
+            with open(f'{self.root}/job/{name}', 'w') as fh:
+                fh.write('Done\n')
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_listing(self):
+        stdout = subprocess.run(
+            [sys.executable, '-c', HELPER, 'listing'],
+            input=json.dumps({'root': self.root, 'jobs': [[f'{self.root}/job', 'job']], 'excludes': ['*.csv']}),
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True).stdout
+        job = json.loads(stdout)['jobs'][f'{self.root}/job']
+        self.assertEqual('finished', job['status'])
+        self.assertEqual(['figures/pca.png', 'progress.txt'], sorted(rel for rel, _, _ in job['files']))
+
+    def test_snapshot_persisted(self):
+        job = MirroredJob(outdir='/home/me/RNAapp/my job', local_dir=f'{self.outdir}/my job')
+        job.snapshot['pca.png'] = [100, 2.]
+        job.save_snapshot()
+        job = MirroredJob(outdir='/home/me/RNAapp/my job', local_dir=f'{self.outdir}/my job')
+        self.assertEqual('my_job', job.job_name)
+        self.assertEqual({'pca.png': [100, 2.]}, job.snapshot)
@@ -0,0 +1,20 @@
+from src.parameters import split_parameters
+from .setup import TestCase
+
+
+class TestSplitParameters(TestCase):
+
+    def test_defaults_and_flags(self):
+        ssh_key_values, rna_key_values = split_parameters({
+            'User': 'me',
+            'Host': '1.2.3.4',
+            'outdir': 'job_1',
+            'publication-figure': True,
+        })
+        self.assertEqual('me', ssh_key_values['User'])
+        self.assertEqual('22', ssh_key_values['Port'])
+        self.assertNotIn('outdir', ssh_key_values)
+        self.assertEqual('job_1', rna_key_values['outdir'])
+        self.assertEqual('human', rna_key_values['organism'])
+        self.assertEqual(True, rna_key_values['publication-figure'])
+        self.assertEqual(False, rna_key_values['invert-colors'])
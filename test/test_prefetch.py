@@ -0,0 +1,36 @@
+import os
+import subprocess
+from src.prefetch import Prefetcher, rollback_cmd
+from src.reporter import Reporter
+from .setup import TestCase
+
+
+class TestRollback(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.store_dir = os.path.abspath(f'{self.workdir}/.store')
+        os.makedirs(f'{self.store_dir}/bbb.partial.id1.blocks')
+        for name in ['aaa', 'aaa.partial.id1.gz', 'aaa.partial.id2', 'bbb.partial.id1.blocks/0', 'ccc', 'ddd']:
+            with open(f'{self.store_dir}/{name}', 'w') as fh:
+                fh.write(name)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_rollback(self):
+        cmd = rollback_cmd(store_dir=self.store_dir, upload_id='id1', hashes=['aaa', 'bbb'])
+        subprocess.run(['bash', '-c', cmd], check=True)
+        # not sent by this prefetch, or by another uploader of the same hash
+        self.assertEqual(['aaa.partial.id2', 'ccc', 'ddd'], sorted(os.listdir(self.store_dir)))
+
+
+class TestPrefetcher(TestCase):
+
+    def test_failed_prefetch_falls_back(self):
+        prefetcher = Prefetcher(
+            ssh_key_values={'User': 'me', 'Host': '127.0.0.1', 'Port': 'not a port'}, rna_key_values={}, password='')
+        prefetcher.run(reporter=Reporter())  # fails before connecting
+        self.assertIsNotNone(prefetcher.error)
+        self.assertIsNone(prefetcher.chosen_ssh_key_values(reporter=Reporter()))
+        prefetcher.wait(reporter=Reporter())
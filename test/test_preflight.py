@@ -0,0 +1,79 @@
+from src.preflight import Preflight
+from src.schema import parse_help, form_of
+from .setup import TestCase
+
+
+class TestPreflight(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.rna_key_values = {
+            'gene-length-column': 'gene_length',
+            'gene-name-column': 'gene_name',
+            'gene-description-column': 'None',
+            'sample-batch-column': 'None',
+            'sample-group-column': 'group',
+            'skip-differential-analysis': False,
+            'control-group-name': 'normal',
+            'experimental-group-name': 'tumor',
+        }
+        self.write('count-table.csv', ',S1,S2\nG1,10,0\nG2,3,7\n')
+        self.write('sample-info-table.csv', ',group\nS1,normal\nS2,tumor\n')
+        self.write('gene-info-table.tsv', '\tgene_name\tgene_length\nG1\tA\t1000\nG2\tB\t2000\n')
+
+    def tearDown(self):
+        self.tear_down()
+
+    def write(self, name: str, text: str):
+        with open(f'{self.workdir}/{name}', 'w') as fh:
+            fh.write(text)
+
+    def preflight(self) -> Preflight:
+        return Preflight(
+            rna_key_values=self.rna_key_values,
+            count_table_path=f'{self.workdir}/count-table.csv',
+            sample_info_table_path=f'{self.workdir}/sample-info-table.csv',
+            gene_info_table_path=f'{self.workdir}/gene-info-table.tsv')
+
+    def test_pass(self):
+        self.preflight().main()
+
+    def test_missing_gene_length_column(self):
+        self.rna_key_values['gene-length-column'] = 'length'
+        with self.assertRaisesRegex(ValueError, 'gene-length-column "length" not found'):
+            self.preflight().main()
+
+    def test_no_gene_length_column(self):
+        self.rna_key_values['gene-length-column'] = 'None'
+        self.preflight().main()
+
+    def test_schema_without_the_options(self):
+        options = parse_help(
+            'optional arguments:\n'
+            '  -o OUTDIR, --outdir OUTDIR  path to the output directory (default: rna_seq_analysis_outdir)\n'
+            '  --sample-group-column SAMPLE_GROUP_COLUMN  (default: group)\n')
+        self.rna_key_values = {key: values[0] for key, values in form_of(options).items()}
+        self.preflight().main()
+
+    def test_sample_not_in_count_table(self):
+        self.write('sample-info-table.csv', ',group\nS1,normal\nS3,tumor\n')
+        with self.assertRaisesRegex(ValueError, 'sample "S3" not found'):
+            self.preflight().main()
+
+    def test_control_group_not_found(self):
+        self.rna_key_values['control-group-name'] = 'Normal'
+        with self.assertRaisesRegex(ValueError, 'control-group-name "Normal" not found'):
+            self.preflight().main()
+
+    def test_non_numeric_count(self):
+        self.write('count-table.csv', ',S1,S2\nG1,10,0\nG2,3,NA\n')
+        with self.assertRaisesRegex(ValueError, 'line 3: non-numeric count "NA"'):
+            self.preflight().main()
+
+    def test_check_each_table_as_chosen(self):
+        preflight = Preflight(
+            rna_key_values=self.rna_key_values, count_table_path='', sample_info_table_path='', gene_info_table_path='')
+        preflight.check(key='count-table', path=f'{self.workdir}/count-table.csv')
+        self.write('sample-info-table.csv', ',group\nS1,normal\nS3,tumor\n')
+        with self.assertRaisesRegex(ValueError, 'sample "S3" not found'):
+            preflight.check(key='sample-info-table', path=f'{self.workdir}/sample-info-table.csv')
@@ -0,0 +1,37 @@
+from src.registry import JobRegistry
+from .setup import TestCase
+
+
+class TestJobRegistry(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.registry = JobRegistry(file=f'{self.workdir}/jobs.sqlite3')
+        for name, status in [('a', 'running'), ('b', 'queued'), ('c', 'finished')]:
+            self.registry.add(
+                host='1.2.3.4', user='me', port=22, job_name=name,
+                outdir=f'/home/me/RNAapp/{name}', program='rna_seq_analysis-1.2.0', status=status)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_jobs_latest_first(self):
+        self.assertEqual(['c', 'b', 'a'], [j['job_name'] for j in self.registry.jobs()])
+
+    def test_active_jobs(self):
+        actual = sorted(self.registry.active_jobs(host='1.2.3.4', user='me', port=22))
+        expected = [('/home/me/RNAapp/a', 'a'), ('/home/me/RNAapp/b', 'b')]
+        self.assertListEqual(expected, actual)
+
+    def test_update(self):
+        self.registry.update(host='1.2.3.4', user='me', port=22, outdir_to_status={
+            '/home/me/RNAapp/a': {'status': 'finished', 'progress_size': 100, 'progress_mtime': 1., 'outputs': 9},
+        })
+        actual = self.registry.active_jobs(host='1.2.3.4', user='me', port=22)
+        self.assertListEqual([('/home/me/RNAapp/b', 'b')], actual)
+
+    def test_resubmit_replaces(self):
+        self.registry.add(
+            host='1.2.3.4', user='me', port=22, job_name='a',
+            outdir='/home/me/RNAapp/a', program='rna_seq_analysis-1.2.0', status='queued')
+        self.assertEqual(3, len(self.registry.jobs()))
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import subprocess
+from src.helper import HELPER
+from src.reuse import fingerprint_of, index_cmd, materialize_cmd, REUSED_FILE
+from .setup import TestCase
+
+
+class TestFingerprint(TestCase):
+
+    def setUp(self):
+        self.rna_key_values = {'outdir': 'a', 'threads': '4', 'gene-q-threshold': '0.05', 'skip-gsea': False}
+        self.input_hashes = {'count-table': 'c' * 64, 'sample-info-table': 's' * 64}
+
+    def fingerprint(self, **rna_key_values) -> str:
+        return fingerprint_of(
+            program='rna_seq_analysis-1.2.0',
+            rna_key_values=dict(self.rna_key_values, **rna_key_values),
+            input_hashes=self.input_hashes)
+
+    def test_outdir_and_threads_excluded(self):
+        self.assertEqual(self.fingerprint(), self.fingerprint(outdir='b', threads='16'))
+
+    def test_numbers_normalized(self):
+        self.assertEqual(self.fingerprint(), self.fingerprint(**{'gene-q-threshold': ' .05'}))
+
+    def test_parameters_included(self):
+        self.assertNotEqual(self.fingerprint(), self.fingerprint(**{'skip-gsea': True}))
+
+
+class TestPreviousRun(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.root = os.path.abspath(self.workdir)
+        os.makedirs(f'{self.root}/previous')
+        with open(f'{self.root}/previous/progress.txt', 'w') as fh:
+            fh.write('Done\n')
+        with open(f'{self.root}/previous/.exit_code', 'w') as fh:
+            fh.write('0\n')
+        subprocess.run(['bash', '-c', index_cmd(
+            fingerprint='f' * 64, outdir=f'{self.root}/previous', job_name='previous')], cwd=self.root, check=True)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def previous_run(self, fingerprint: str, outdir: str = ''):
+        stdout = subprocess.run(
+            [sys.executable, '-c', HELPER, 'previous_run'],
+            input=json.dumps({'root': self.root, 'jobs': [[fingerprint, outdir]]}),
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True).stdout
+        return json.loads(stdout)['outdirs'][0]
+
+    def test_hit(self):
+        self.assertEqual(f'{self.root}/previous', self.previous_run('f' * 64))
+
+    def test_failed_resubmission_does_not_hide_finished_run(self):
+        os.makedirs(f'{self.root}/again')
+        subprocess.run(['bash', '-c', index_cmd(
+            fingerprint='f' * 64, outdir=f'{self.root}/again', job_name='again')], cwd=self.root, check=True)
+        self.assertEqual(f'{self.root}/previous', self.previous_run('f' * 64))
+
+    def test_run_in_the_outdir_itself_skipped(self):
+        self.assertIsNone(self.previous_run('f' * 64, outdir=f'{self.root}/previous'))
+
+    def test_miss(self):
+        self.assertIsNone(self.previous_run('0' * 64))
+
+    def test_failed_run_not_reused(self):
+        with open(f'{self.root}/previous/progress.txt', 'a') as fh:
+            fh.write('Traceback (most recent call last)\n')
+        self.assertIsNone(self.previous_run('f' * 64))
+
+    def test_killed_run_not_reused(self):
+        with open(f'{self.root}/previous/.exit_code', 'w') as fh:
+            fh.write('')  # emptied when the job started, never written since
+        self.assertIsNone(self.previous_run('f' * 64))
+
+    def test_run_without_exit_code_not_reused(self):
+        os.remove(f'{self.root}/previous/.exit_code')
+        self.assertIsNone(self.previous_run('f' * 64))
+
+    def test_materialize(self):
+        subprocess.run(
+            ['bash', '-c', materialize_cmd(previous=f'{self.root}/previous', outdir=f'{self.root}/new')], check=True)
+        self.assertFileEqual(f'{self.root}/previous/progress.txt', f'{self.root}/new/progress.txt')
+        with open(f'{self.root}/new/{REUSED_FILE}') as fh:
+            self.assertEqual(f'{self.root}/previous\n', fh.read())
@@ -0,0 +1,80 @@
+from src.schema import parse_help, form_of, SchemaCache
+from src.submit import SubmitJob
+from .setup import TestCase
+
+
+HELP = '''\
+usage: python rna_seq_analysis-1.3.0 [-h] -c COUNT_TABLE [--outdir OUTDIR]
+                                     [--organism {human,mouse,rat,dog}]
+                                     [--skip-differential-analysis]
+
+options:
+  -h, --help            show this help message and exit
+  -c COUNT_TABLE, --count-table COUNT_TABLE
+                        path-like (default: None)
+  --outdir OUTDIR       path-like (default: rna_seq_analysis_outdir)
+  --organism {human,mouse,rat,dog}
+                        a long help which wraps over the following line (default:
+                        human)
+  --skip-differential-analysis
+                        flag (default: False)
+  -t THREADS, --threads THREADS
+                        threads (default: 1)
+'''
+
+
+class TestParseHelp(TestCase):
+
+    def test_options(self):
+        actual = parse_help(HELP)
+        self.assertEqual(['outdir', 'organism', 'skip-differential-analysis', 'threads'], [o['key'] for o in actual])
+        organism = actual[1]
+        self.assertEqual(['human', 'mouse', 'rat', 'dog'], organism['choices'])
+        self.assertEqual('human', organism['default'])
+        self.assertTrue(actual[2]['flag'])
+
+    def test_form(self):
+        form = form_of(parse_help(HELP))
+        self.assertEqual(['human', 'mouse', 'rat', 'dog'], form['organism'])
+        self.assertEqual(['1', '2', '4', 'auto'], form['threads'])  # with the built-in suggestions
+        self.assertEqual(False, form['skip-differential-analysis'])
+
+    def test_choices_replace_the_suggestions(self):
+        help_ = HELP.replace('{human,mouse,rat,dog}', '{mouse,dog}').replace('human)', 'mouse)')
+        form = form_of(parse_help(help_))
+        self.assertEqual(['mouse', 'dog'], form['organism'])  # the built-in human and rat would be rejected
+
+
+class TestSchemaCache(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.file = f'{self.workdir}/schemas.json'
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_persisted_latest_first(self):
+        SchemaCache(file=self.file).put(host='1.2.3.4', schemas={
+            'rna_seq_analysis-1.9.0': parse_help(HELP),
+            'rna_seq_analysis-1.10.0': parse_help(HELP),
+        })
+        cache = SchemaCache(file=self.file)
+        self.assertEqual(
+            ['rna_seq_analysis-1.10.0', 'rna_seq_analysis-1.9.0'], cache.versions(host='1.2.3.4'))
+        self.assertIsNone(cache.get(host='5.6.7.8', version='rna_seq_analysis-1.9.0'))
+
+    def test_rna_cmd_only_passes_accepted_options(self):
+        cache = SchemaCache(file=self.file)
+        cache.put(host='1.2.3.4', schemas={'rna_seq_analysis-1.3.0': parse_help(HELP)})
+        job = SubmitJob(
+            ssh_key_values={'User': 'me', 'Host': '1.2.3.4', 'Port': '22', 'RNA-Seq Analysis': 'rna_seq_analysis-1.3.0'},
+            ssh_password='',
+            rna_key_values={'outdir': 'a', 'organism': 'mouse', 'colormap': 'Set1', 'threads': '2'},
+            count_table_local_path='count-table.csv',
+            sample_info_table_local_path='sample-info-table.csv',
+            gene_info_table_local_path='gene-info-table.csv',
+            gene_sets_gmt_local_path='')
+        job.build_rna_cmd(schema_cache=cache)
+        self.assertIn('--organism=mouse', job.rna_cmd)
+        self.assertNotIn('--colormap', job.rna_cmd)
@@ -0,0 +1,71 @@
+import os
+import hashlib
+import subprocess
+from src.store import HashCache, InputStore
+from .setup import TestCase
+
+
+class TestHashCache(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.table = f'{self.workdir}/count-table.csv'
+        with open(self.table, 'w') as fh:
+            fh.write('gene,s1,s2\nA,1,2\n')
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_sha256(self):
+        actual = HashCache(file=f'{self.workdir}/cache.json').sha256(self.table)
+        expected = hashlib.sha256(b'gene,s1,s2\nA,1,2\n').hexdigest()
+        self.assertEqual(expected, actual)
+
+    def test_cache_is_persisted(self):
+        cache = HashCache(file=f'{self.workdir}/cache.json')
+        cache.sha256(self.table)
+        self.assertFalse(os.path.exists(f'{self.workdir}/cache.json'))  # saved once per batch, not per file
+        cache.flush()
+        cache = HashCache(file=f'{self.workdir}/cache.json')
+        self.assertIn(os.path.abspath(self.table), cache.cache)
+
+    def test_rehash_when_modified(self):
+        cache = HashCache(file=f'{self.workdir}/cache.json')
+        first = cache.sha256(self.table)
+        with open(self.table, 'a') as fh:
+            fh.write('B,3,4\n')
+        second = cache.sha256(self.table)
+        self.assertNotEqual(first, second)
+
+
+class LocalConnection:
+
+    def run(self, cmd: str, hide: bool):
+        subprocess.run(['bash', '-c', cmd], check=True)
+
+
+class TestCommitAndLink(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.store = InputStore(con=LocalConnection(), remote_root=os.path.abspath(self.workdir))
+        os.makedirs(self.store.store_dir)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def write(self, name: str, text: str):
+        with open(f'{self.store.store_dir}/{name}', 'w') as fh:
+            fh.write(text)
+
+    def test_commit(self):
+        self.write(f'aaa.partial.{self.store.upload_id}', 'a')
+        self.store.commit_and_link(misses=['aaa'], remote_codecs={}, links=[])
+        self.assertEqual(['aaa'], os.listdir(self.store.store_dir))
+
+    def test_completed_by_another_uploader(self):
+        self.write('aaa', 'a')
+        self.write('aaa.partial.other', 'a')  # still being uploaded by another submission
+        self.write(f'aaa.partial.{self.store.upload_id}', 'a')
+        self.store.commit_and_link(misses=['aaa'], remote_codecs={}, links=[])
+        self.assertEqual(['aaa', 'aaa.partial.other'], sorted(os.listdir(self.store.store_dir)))
@@ -0,0 +1,54 @@
+import os
+import shlex
+from src.submit import SubmitJob
+from .setup import TestCase
+
+
+class LocalSFTP:
+    """
+    Opens remote paths as local files
+    """
+
+    def open(self, path: str, mode: str):
+        return open(path, mode)
+
+
+class TestWriteCommandTxt(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_byte_exact(self):
+        job = SubmitJob(
+            ssh_key_values={'User': 'me', 'Host': '1.2.3.4', 'Port': '22', 'RNA-Seq Analysis': 'rna_seq_analysis'},
+            ssh_password='',
+            rna_key_values={'outdir': 'outdir', 'control-group-name': 'say "hi" $HOME `x`'},
+            count_table_local_path='count-table.csv',
+            sample_info_table_local_path='sample-info-table.csv',
+            gene_info_table_local_path='gene-info-table.csv',
+            gene_sets_gmt_local_path='')
+        job.remote_root = self.workdir
+        os.makedirs(f'{self.workdir}/outdir')
+        job.build_rna_cmd()
+        job.write_command_txt(sftp=LocalSFTP())
+
+        with open(f'{self.workdir}/outdir/command.txt') as fh:
+            actual = fh.read()
+        self.assertIn('--control-group-name=\'say "hi" $HOME `x`\'', actual)
+        self.assertEqual(f'source .profile && {job.rna_cmd}\n', actual)
+
+    def test_single_quote_in_value(self):
+        job = SubmitJob(
+            ssh_key_values={'User': 'me', 'Host': '1.2.3.4', 'Port': '22', 'RNA-Seq Analysis': 'rna_seq_analysis'},
+            ssh_password='',
+            rna_key_values={'outdir': 'outdir', 'control-group-name': "patient's normal"},
+            count_table_local_path='count-table.csv',
+            sample_info_table_local_path='sample-info-table.csv',
+            gene_info_table_local_path='gene-info-table.csv',
+            gene_sets_gmt_local_path='')
+        job.remote_root = self.workdir
+        job.build_rna_cmd()
+        self.assertIn("--control-group-name=patient's normal", shlex.split(job.rna_cmd))
@@ -0,0 +1,53 @@
+from src.timing import TimingLog, read_log, host_summary
+from .setup import TestCase
+
+
+class TestTimingLog(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.file = f'{self.workdir}/timing.jsonl'
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_spans_written_as_json_lines(self):
+        timing = TimingLog(file=self.file, action='submit')
+        with timing.span('connect', kind='connect', host='1.2.3.4'):
+            pass
+        timing.record(name='count.csv', kind='transfer', start=0., seconds=2., bytes=10 * 10**6)
+
+        spans = read_log(file=self.file)
+        self.assertEqual(['connect', 'count.csv'], [s['span'] for s in spans])
+        self.assertEqual({timing.trace}, {s['trace'] for s in spans})
+        self.assertEqual('submit', spans[0]['action'])
+        self.assertEqual(5., spans[1]['mb_per_sec'])
+
+    def test_failed_span(self):
+        timing = TimingLog(file=self.file)
+        with self.assertRaises(IOError):
+            with timing.span('upload_inputs'):
+                raise IOError
+        self.assertEqual('OSError', read_log(file=self.file)[0]['error'])
+
+    def test_host_summary(self):
+        for host, seconds in [('a', 1.), ('a', 3.), ('b', 10.)]:
+            timing = TimingLog(file=self.file)
+            timing.record(name='connect', kind='connect', start=0., seconds=seconds, host=host)
+            timing.record(name='upload_inputs', kind='phase', start=0., seconds=seconds)
+        actual = host_summary(read_log(file=self.file))
+        expected = 'a (2 submissions): median connect s 2.00, upload_inputs s 2.00\n\n' \
+                   'b (1 submissions): median connect s 10.00, upload_inputs s 10.00'
+        self.assertEqual(expected, actual)
+
+    def test_host_pool_probes_not_attributed(self):
+        timing = TimingLog(file=self.file)
+        timing.record(name='preflight', kind='phase', start=0., seconds=1.)
+        timing.record(name='connect', kind='connect', start=0., seconds=4., host='a')
+        timing.record(name='connect', kind='connect', start=0., seconds=2., host='b')  # probed last
+        timing.tag(host='a')
+        timing.record(name='upload_inputs', kind='phase', start=0., seconds=3.)
+        actual = host_summary(read_log(file=self.file))
+        expected = 'a (1 submissions): median preflight s 1.00, connect s 4.00, upload_inputs s 3.00\n\n' \
+                   'b (0 submissions): median connect s 2.00'
+        self.assertEqual(expected, actual)